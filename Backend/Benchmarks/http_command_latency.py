@@ -0,0 +1,157 @@
+"""
+Measures how long CHANGE_DRONE_MODE commands take to be answered by the HTTP server while a large search area is being
+generated, with the single threaded BaseHTTPServer.HTTPServer and with the ThreadingHTTPServer that the backend uses.
+
+A local socket stands in for the Communication Script and drains the commands the backend sends to it. One thread
+generates search area paths back to back (PATH_GENERATION_SEARCH_AREA), another sends a mode change every
+MODE_CHANGE_INTERVAL and times the response. Paths are generated on the PathGenerationPool in both runs, so the single
+threaded run shows how long a command waits behind a request that is generating a path.
+
+Usage (from the Backend directory):
+    py -2.7 ./Benchmarks/http_command_latency.py [seconds]
+"""
+from __future__ import print_function, division
+import os
+import sys
+import json
+import time
+import socket
+import urllib2
+import threading
+from BaseHTTPServer import HTTPServer
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from path_generation_pool import PathGenerationPool
+from CommunicationScript.mission_planner_registry import MissionPlannerRegistry
+import DronelinkHTTPServer
+
+MP_PORT = 7768
+MODE_CHANGE_INTERVAL = 0.1  # s
+# A search area of about 4 km by 4 km with curves sampled every 20 cm, a few seconds of path generation
+SEARCH_AREA = [{"lat": -38.383944, "long": 144.880181}, {"lat": -38.417322, "long": 144.908826},
+               {"lat": -38.386840, "long": 144.937242}, {"lat": -38.354585, "long": 144.910813}]
+PARAMETERS = {
+    "command": "PLANE_PARAMETER_UPDATE",
+    "take_off_point": {"lat": -38.40, "long": 144.88},
+    "minimum_turn_radius": 40.0,
+    "curve_resolution": 5.0,
+    "altitude": 100.0,
+    "search_area": SEARCH_AREA,
+    "layer_distance": 20.0,
+    "paint_overlap": 0.1,
+}
+GENERATE = {"command": "PATH_GENERATION_SEARCH_AREA", "takeoff_alt": 50, "vtol_transition_mode": 4}
+
+
+def communication_script_stand_in(stop):
+    """Accepts the backend's connection and drains everything it sends."""
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind(("127.0.0.1", MP_PORT))
+    server.listen(1)
+
+    def drain():
+        connection, _ = server.accept()
+        connection.settimeout(0.5)
+        while not stop.is_set():
+            try:
+                if not connection.recv(65536):
+                    break
+            except socket.timeout:
+                pass
+        connection.close()
+        server.close()
+    thread = threading.Thread(target=drain)
+    thread.start()
+    return thread
+
+
+def post(port, data):
+    """Returns the HTTP status code and how long the response took (s)."""
+    start = time.time()
+    try:
+        status = urllib2.urlopen("http://127.0.0.1:%d/" % port, json.dumps(data)).getcode()
+    except urllib2.HTTPError as e:
+        status = e.code
+    return status, time.time() - start
+
+
+class Quiet:
+    """Hides what the request handlers print while a run is measured."""
+    def __enter__(self):
+        self.streams = sys.stdout, sys.stderr
+        sys.stdout = sys.stderr = open(os.devnull, "w")
+
+    def __exit__(self, *exc_info):
+        sys.stdout.close()
+        sys.stdout, sys.stderr = self.streams
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def run(server_class, seconds):
+    """Returns (mode change latencies, path generation times) in seconds."""
+    server = server_class(("127.0.0.1", 0), DronelinkHTTPServer.ServerHandler)
+    port = server.server_address[1]
+    serving_thread = threading.Thread(target=server.serve_forever)
+    serving_thread.start()
+    stop = threading.Event()
+    generation_times = []
+
+    def generate():
+        post(port, PARAMETERS)
+        while not stop.is_set():
+            status, elapsed = post(port, GENERATE)
+            generation_times.append(elapsed)
+    generating_thread = threading.Thread(target=generate)
+    generating_thread.start()
+    # Let the first path start generating
+    time.sleep(MODE_CHANGE_INTERVAL)
+
+    latencies = []
+    end = time.time() + seconds
+    while time.time() < end:
+        status, elapsed = post(port, {"command": "CHANGE_DRONE_MODE", "mode": "LOITER"})
+        latencies.append(elapsed)
+        time.sleep(max(0, MODE_CHANGE_INTERVAL - elapsed))
+    stop.set()
+    generating_thread.join()
+    server.shutdown()
+    serving_thread.join()
+    server.server_close()
+    return latencies, generation_times
+
+
+if __name__ == "__main__":
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+    # Started before any other thread, as in DronelinkServer
+    pool = PathGenerationPool()
+    stop = threading.Event()
+    stand_in = communication_script_stand_in(stop)
+    registry = MissionPlannerRegistry(MP_PORT)
+    if not registry.connect("127.0.0.1"):
+        sys.exit("Could not connect to the Communication Script stand-in.")
+    DronelinkHTTPServer.mp_reg = registry
+    DronelinkHTTPServer.path_pool = pool
+    DronelinkHTTPServer.recordings = None
+
+    print("[BENCHMARK] CHANGE_DRONE_MODE every %d ms while search areas are generated, %d s per run" % (
+        MODE_CHANGE_INTERVAL * 1000, seconds))
+    print("%-20s %10s %10s %10s %10s %12s %16s" % (
+        "server", "commands", "p50 ms", "p95 ms", "max ms", "paths", "ms per path"))
+    try:
+        for server_class in (HTTPServer, DronelinkHTTPServer.ThreadingHTTPServer):
+            with Quiet():
+                latencies, generation_times = run(server_class, seconds)
+            print("%-20s %10d %10.1f %10.1f %10.1f %12d %16.0f" % (
+                server_class.__name__, len(latencies), percentile(latencies, 0.5) * 1000,
+                percentile(latencies, 0.95) * 1000, max(latencies) * 1000, len(generation_times),
+                sum(generation_times) / max(len(generation_times), 1) * 1000))
+    finally:
+        registry.close()
+        stop.set()
+        stand_in.join()
+        pool.close()
@@ -0,0 +1,93 @@
+"""
+Measures the CPU used by the MissionPlannerSocket receive thread while the link to Mission Planner is idle.
+
+A local socket stands in for the Communication Script. The legacy non-blocking receive loop (setblocking(0) and
+retrying recv() on every EAGAIN) is compared against the select() based receive loop in MissionPlannerSocket.
+
+Usage (from the Backend directory):
+    py -2.7 ./Benchmarks/mp_socket_idle_cpu.py [seconds]
+"""
+from __future__ import print_function, division
+import os
+import sys
+import socket
+import threading
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from CommunicationScript.MissionPlannerSocket import MissionPlannerSocket
+
+PORT = 7767
+
+
+def cpu_time():
+    """Returns the user + system CPU time used by this process so far."""
+    t = os.times()
+    return t[0] + t[1]
+
+
+def listen():
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind(("127.0.0.1", PORT))
+    server.listen(1)
+    return server
+
+
+def legacy_receive(s, stop):
+    """The receive loop used before the select() change."""
+    s.setblocking(0)
+    while not stop.is_set():
+        try:
+            data = s.recv(8192)
+        except Exception:
+            continue
+
+
+def measure_legacy(seconds):
+    server = listen()
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    s.connect(("127.0.0.1", PORT))
+    connection, _ = server.accept()
+    stop = threading.Event()
+    thread = threading.Thread(target=legacy_receive, args=(s, stop))
+    start = cpu_time()
+    thread.start()
+    time.sleep(seconds)
+    stop.set()
+    thread.join()
+    used = cpu_time() - start
+    s.close()
+    connection.close()
+    server.close()
+    return used
+
+
+def measure_select(seconds):
+    server = listen()
+    mp_socket = MissionPlannerSocket(PORT)
+    mp_socket.chunk_size = 8192
+    mp_socket.s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    mp_socket.s.connect(("127.0.0.1", PORT))
+    connection, _ = server.accept()
+    # Only run the receive thread so that the measurement covers the same work as legacy_receive
+    thread = threading.Thread(target=mp_socket._MissionPlannerSocket__receive)
+    start = cpu_time()
+    thread.start()
+    time.sleep(seconds)
+    mp_socket.quit = True
+    thread.join()
+    used = cpu_time() - start
+    mp_socket.s.close()
+    connection.close()
+    server.close()
+    return used
+
+
+if __name__ == "__main__":
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+    print("[BENCHMARK] Idle Mission Planner link for " + str(seconds) + " s")
+    legacy = measure_legacy(seconds)
+    print("[BENCHMARK] non-blocking busy-spin: %.3f s CPU (%.1f%% of a core)" % (legacy, 100 * legacy / seconds))
+    selected = measure_select(seconds)
+    print("[BENCHMARK] select() receive loop:  %.3f s CPU (%.1f%% of a core)" % (selected, 100 * selected / seconds))
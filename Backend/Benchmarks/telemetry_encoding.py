@@ -0,0 +1,67 @@
+"""
+Compares the cost of encoding and decoding one LIVE_DRONE_DATA frame with the JSON encoding and the binary telemetry
+record (CommunicationScript/telemetry_codec.py), and what that cost adds up to at 10 Hz and 50 Hz.
+
+The JSON encode step mirrors send_live_data in the Communication Script (strftime + json.dumps) and the decode step
+mirrors MissionPlannerSocket (json.loads).
+
+Usage (from the Backend directory):
+    py -2.7 ./Benchmarks/telemetry_encoding.py [frames]
+"""
+from __future__ import print_function, division
+import os
+import sys
+import json
+import time
+import timeit
+import datetime
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from CommunicationScript.telemetry_codec import encode_telemetry, decode_telemetry
+
+RATES = [10, 50]  # Hz
+MESSAGES_PER_FRAME = 2
+
+DATA = {
+    "lat": -37.8238872, "lng": 145.0538635, "alt": 101.5,
+    "distTraveled": 1234.5, "DistToHome": 321.0,
+    "airspeed": 22.1, "groundspeed": 20.4, "verticalspeed": -0.3,
+    "battery_voltage": 24.8, "battery_remaining": 87.0, "propulsion_battery": 4.1, "avionics_battery": 12.3,
+    "armed": True, "drone_connected": True, "weather_vaning": False,
+    "sonarrange": 3.2,
+    "messages": [{"time": "18/10/2026 1:05:31 PM", "message": "Mission: 4 WP"}] * MESSAGES_PER_FRAME,
+    "lifeline_status": 200, "lifeline_distance": 0.0, "lifeline_velocity": 0.0,
+    "vision_geotag_gps": {"x": -37.82, "y": 145.05, "z": 15.0},
+    "vision_geotag_box": {"x": 0.4, "y": 0.6, "z": 0.1},
+}
+
+
+def json_encode():
+    data = dict(DATA)
+    data["timestamp"] = datetime.datetime.now().strftime("%m/%d/%Y, %I:%M:%S %p")
+    return json.dumps({"command": "LIVE_DRONE_DATA", "data": data})
+
+
+def binary_encode():
+    return encode_telemetry(DATA, time.time())
+
+
+def per_frame(function, frames):
+    """Returns the best average time (s) of one call over three runs of 'frames' calls."""
+    return min(timeit.repeat(function, number=frames, repeat=3)) / frames
+
+
+if __name__ == "__main__":
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    json_frame = json_encode()
+    binary_frame = binary_encode()
+    results = [
+        ("json", len(json_frame), per_frame(json_encode, frames), per_frame(lambda: json.loads(json_frame), frames)),
+        ("binary-v1", len(binary_frame), per_frame(binary_encode, frames), per_frame(lambda: decode_telemetry(binary_frame), frames)),
+    ]
+    print("[BENCHMARK] LIVE_DRONE_DATA with %d status messages per frame, %d frames per run" % (MESSAGES_PER_FRAME, frames))
+    print("%-10s %8s %12s %12s %s" % ("encoding", "bytes", "encode (us)", "decode (us)",
+                                      " ".join("%6d Hz (%% core)" % rate for rate in RATES)))
+    for name, size, encode, decode in results:
+        load = " ".join("%17.4f" % (100 * (encode + decode) * rate) for rate in RATES)
+        print("%-10s %8d %12.2f %12.2f %s" % (name, size, encode * 1e6, decode * 1e6, load))
@@ -0,0 +1,126 @@
+"""
+Measures broadcast latency (from SimpleWebSocketServer.broadcast to the frame arriving at a client) of the select
+based SimpleWebSocketServer and SimpleEpollWebSocketServer, with hundreds of connected clients.
+
+Idle clients are connected but never sent to, active clients receive every broadcast. Latency is measured on one
+active client while the others are drained by a reader thread.
+
+Usage (from the Backend directory, Linux only):
+    py -2.7 ./Benchmarks/websocket_broadcast_latency.py [broadcasts]
+"""
+from __future__ import print_function, division
+import os
+import sys
+import time
+import base64
+import socket
+import threading
+import select
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from SimpleWebSocketServer import SimpleWebSocketServer, SimpleEpollWebSocketServer, WebSocket
+
+# (idle clients, active clients). The benchmark's own client sockets share the process, so select (FD_SETSIZE 1024)
+# fails past ~500 clients and is only run up to SELECT_LIMIT.
+SCENARIOS = [(100, 10), (400, 10), (400, 50), (1000, 100)]
+SELECT_LIMIT = 500
+PAYLOAD_SIZE = 1000  # bytes
+SERVERS = [("select", SimpleWebSocketServer), ("epoll", SimpleEpollWebSocketServer)]
+
+HANDSHAKE = ("GET / HTTP/1.1\r\nHost: localhost\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+             "Sec-WebSocket-Key: %s\r\nSec-WebSocket-Version: 13\r\n\r\n")
+
+
+def connect(port):
+    sock = socket.create_connection(("127.0.0.1", port))
+    sock.sendall((HANDSHAKE % base64.b64encode(os.urandom(16)).decode("ascii")).encode("ascii"))
+    response = b""
+    while b"\r\n\r\n" not in response:
+        response += sock.recv(4096)
+    return sock
+
+
+def receive_frame(sock):
+    """Reads one unmasked server frame of at most 65535 bytes."""
+    header = b""
+    while len(header) < 4:
+        header += sock.recv(4 - len(header))
+    length = bytearray(header)[1] & 0x7F
+    if length == 126:
+        length = (bytearray(header)[2] << 8) | bytearray(header)[3]
+        received = 0
+    else:
+        received = 2
+    while received < length:
+        received += len(sock.recv(length - received))
+
+
+def drain(sockets, stop):
+    # poll, not select, the client sockets are numbered past FD_SETSIZE in the larger runs
+    poller = select.poll()
+    by_fileno = {}
+    for sock in sockets:
+        poller.register(sock, select.POLLIN)
+        by_fileno[sock.fileno()] = sock
+    while not stop.is_set():
+        for fileno, _ in poller.poll(100):
+            by_fileno[fileno].recv(65536)
+
+
+def run(server_class, idle_count, active_count, broadcasts):
+    """Returns the sorted broadcast latencies (s)."""
+    server = server_class("127.0.0.1", 0, WebSocket)
+    port = server.serversocket.getsockname()[1]
+    stop = threading.Event()
+
+    def serve():
+        while not stop.is_set():
+            server.serveonce()
+    serving_thread = threading.Thread(target=serve)
+    serving_thread.start()
+
+    sockets = [connect(port) for _ in range(idle_count + active_count)]
+    while len(server.connections) < len(sockets) or not all(c.handshaked for c in list(server.connections.values())):
+        time.sleep(0.01)
+    clients = sorted(server.connections.values(), key=lambda client: client.address[1])
+    by_port = dict((sock.getsockname()[1], sock) for sock in sockets)
+    active = clients[:active_count]
+    probe = by_port[active[0].address[1]]
+    others = [by_port[client.address[1]] for client in active[1:]]
+    drain_thread = threading.Thread(target=drain, args=(others, stop))
+    drain_thread.start()
+
+    payload = bytearray(os.urandom(PAYLOAD_SIZE))
+    latencies = []
+    try:
+        for _ in range(broadcasts):
+            start = time.time()
+            server.broadcast(payload, active)
+            receive_frame(probe)
+            latencies.append(time.time() - start)
+            time.sleep(0.005)
+    finally:
+        stop.set()
+        serving_thread.join()
+        drain_thread.join()
+        for sock in sockets:
+            sock.close()
+        server.close()
+    return sorted(latencies)
+
+
+if __name__ == "__main__":
+    broadcasts = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    print("[BENCHMARK] %d byte broadcast, %d broadcasts per run" % (PAYLOAD_SIZE, broadcasts))
+    print("%-8s %6s %7s %12s %12s %12s" % ("server", "idle", "active", "mean (ms)", "p50 (ms)", "p99 (ms)"))
+    for idle_count, active_count in SCENARIOS:
+        for name, server_class in SERVERS:
+            if server_class is SimpleWebSocketServer and idle_count + active_count > SELECT_LIMIT:
+                print("%-8s %6d %7d %12s" % (name, idle_count, active_count, "n/a"))
+                continue
+            latencies = run(server_class, idle_count, active_count, broadcasts)
+            print("%-8s %6d %7d %12.3f %12.3f %12.3f" % (
+                name, idle_count, active_count,
+                1e3 * sum(latencies) / len(latencies),
+                1e3 * latencies[len(latencies) // 2],
+                1e3 * latencies[int(len(latencies) * 0.99) - 1]))
@@ -0,0 +1,65 @@
+"""
+Compares the size and compression cost of one second of LIVE_DATA frames sent to a dashboard without
+permessage-deflate, with permessage-deflate without context takeover (each message compressed on its own, shared by
+every client) and with context takeover (one compressor per client).
+
+Usage (from the Backend directory):
+    py -2.7 ./Benchmarks/websocket_deflate.py [seconds]
+"""
+from __future__ import print_function, division
+import os
+import sys
+import json
+import time
+import zlib
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from SimpleWebSocketServer import _buildFrame, _deflate, DEFLATE_LEVEL, TEXT
+from telemetry_encoding import DATA
+
+RATE = 10  # Hz
+
+
+def live_data_frames(seconds):
+    """LIVE_DATA messages as LiveDataThread sends them, with a status message every second."""
+    frames = []
+    for index in range(seconds * RATE):
+        data = dict(DATA)
+        data["lat"] += index * 1e-6
+        data["alt"] += index * 0.1
+        data["battery_voltage"] -= index * 1e-4
+        data["messages"] = DATA["messages"][:1] if index % RATE == 0 else []
+        data["ip"] = "192.168.1.10"
+        data["vehicle_id"] = "default"
+        data["command"] = "LIVE_DATA"
+        frames.append(json.dumps(data))
+    return frames
+
+
+def plain(messages):
+    return [_buildFrame(False, TEXT, message) for message in messages]
+
+
+def no_context_takeover(messages):
+    return [_buildFrame(False, TEXT, _deflate(message, zlib.compressobj(DEFLATE_LEVEL, zlib.DEFLATED, -15)), True)
+            for message in messages]
+
+
+def context_takeover(messages):
+    compressor = zlib.compressobj(DEFLATE_LEVEL, zlib.DEFLATED, -15)
+    return [_buildFrame(False, TEXT, _deflate(message, compressor), True) for message in messages]
+
+
+if __name__ == "__main__":
+    seconds = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    messages = live_data_frames(seconds)
+    print("[BENCHMARK] %d s of LIVE_DATA at %d Hz" % (seconds, RATE))
+    print("%-22s %14s %14s %16s" % ("encoding", "bytes/frame", "kbit/s", "us/frame"))
+    for name, encode in (("plain", plain),
+                         ("deflate", no_context_takeover),
+                         ("deflate + takeover", context_takeover)):
+        start = time.time()
+        frames = encode(messages)
+        elapsed = time.time() - start
+        size = sum(len(frame) for frame in frames) / len(frames)
+        print("%-22s %14.1f %14.2f %16.2f" % (name, size, size * RATE * 8 / 1000, 1e6 * elapsed / len(frames)))
@@ -0,0 +1,88 @@
+"""
+Compares sending one VISION_CAM frame to 1, 10 and 50 WebSocket clients the old way (json.dumps and a new frame per
+client) with SimpleWebSocketServer.broadcast (json.dumps and the frame built once, the same buffer queued to every
+client).
+
+Only the cost of queueing is measured, the clients are never handshaked over a real connection and their send queues
+are emptied between runs. The "queued (KB)" column is the memory held by the send queues for one frame.
+
+Usage (from the Backend directory):
+    py -2.7 ./Benchmarks/websocket_fanout.py [frames]
+"""
+from __future__ import print_function, division
+import os
+import sys
+import json
+import base64
+import timeit
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from SimpleWebSocketServer import SimpleWebSocketServer, WebSocket
+
+CLIENT_COUNTS = [1, 10, 50]
+JPEG_SIZE = 40000  # bytes, a 640x480 frame at quality 50
+FPS = 10
+
+IMAGE = base64.b64encode(os.urandom(JPEG_SIZE))
+
+
+def make_clients(server, count):
+    clients = []
+    for index in range(count):
+        client = WebSocket(server, None, ("127.0.0.1", 50000 + index))
+        client.handshaked = True
+        server.connections[index] = client
+        clients.append(client)
+    return clients
+
+
+def per_client_send(clients):
+    data = {"command": "VISION_CAM", "image": "data:image/jpg;base64," + IMAGE}
+    for client in clients:
+        client.sendMessage(json.dumps(data))
+
+
+def broadcast_send(server, clients):
+    data = {"command": "VISION_CAM", "image": "data:image/jpg;base64," + IMAGE}
+    server.broadcast(json.dumps(data), clients)
+
+
+def queued_bytes(clients):
+    """Returns the number of bytes held by the send queues, a buffer shared by several clients is counted once."""
+    buffers = {}
+    for client in clients:
+        for _, payload in client.sendq:
+            buffers[id(payload)] = len(payload)
+    return sum(buffers.values())
+
+
+def measure(send, clients, frames):
+    """Returns (best average time (s) to send one frame, bytes queued for one frame)."""
+    def run():
+        send()
+        for client in clients:
+            client.sendq.clear()
+    best = min(timeit.repeat(run, number=frames, repeat=3)) / frames
+    send()
+    size = queued_bytes(clients)
+    for client in clients:
+        client.sendq.clear()
+    return best, size
+
+
+if __name__ == "__main__":
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    server = SimpleWebSocketServer("127.0.0.1", 0, WebSocket)
+    print("[BENCHMARK] VISION_CAM frame of %d KB (JPEG) to N clients, %d frames per run" % (JPEG_SIZE // 1000, frames))
+    print("%-10s %8s %14s %12s %16s" % ("method", "clients", "per frame (ms)", "queued (KB)", "%d fps (%% core)" % FPS))
+    try:
+        for count in CLIENT_COUNTS:
+            server.connections.clear()
+            clients = make_clients(server, count)
+            for name, send in (("per-client", lambda: per_client_send(clients)),
+                               ("broadcast", lambda: broadcast_send(server, clients))):
+                seconds, size = measure(send, clients, frames)
+                print("%-10s %8d %14.3f %12d %16.2f" % (name, count, seconds * 1e3, size // 1000, 100 * seconds * FPS))
+    finally:
+        server.connections.clear()
+        server.close()
@@ -0,0 +1,211 @@
+"""
+Measures the send path of SimpleWebSocketServer under load: system calls, bytes copied and partial sends per second,
+with and without write coalescing (several queued frames gathered into one sendmsg call, or copied into one buffer
+when sendmsg is not available).
+
+Fast clients read everything as soon as it arrives, slow clients have small socket buffers and read in small bursts
+so that their sends are often partial. Every client receives LIVE_DATA sized telemetry and status messages on the
+reliable queue and VISION_CAM sized video frames on a latest-wins stream. Every client parses the frames it receives
+and checks each one is a frame that was sent, a client whose stream is corrupt is counted in the corrupt column.
+
+Usage (from the Backend directory):
+    py -2.7 ./Benchmarks/websocket_send_path.py [seconds]
+"""
+from __future__ import print_function, division
+import os
+import sys
+import time
+import base64
+import struct
+import socket
+import threading
+import select
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import SimpleWebSocketServer as sws
+from SimpleWebSocketServer import SimpleWebSocketServer, WebSocket, HAS_EPOLL, TEXT, BINARY
+
+FAST_CLIENTS = 20
+SLOW_CLIENTS = 20
+SLOW_BUFFER = 16384  # bytes, receive buffer of a slow client and send buffer of its server side socket
+SLOW_READ_SIZE = 2048  # bytes read by a slow client every SLOW_READ_INTERVAL, well below the video rate
+SLOW_READ_INTERVAL = 0.005  # s
+TELEMETRY_SIZE, TELEMETRY_RATE = 1000, 100  # bytes, Hz
+STATUS_SIZE, STATUS_BURST = 120, 5  # bytes, messages sent with every telemetry message
+VIDEO_SIZE, VIDEO_RATE = 40000, 30  # bytes, Hz
+SERVER_CLASS = sws.SimpleEpollWebSocketServer if HAS_EPOLL else SimpleWebSocketServer
+
+HANDSHAKE = ("GET / HTTP/1.1\r\nHost: localhost\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+             "Sec-WebSocket-Key: %s\r\nSec-WebSocket-Version: 13\r\n\r\n")
+
+
+def connect(port, receive_buffer=None):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    if receive_buffer:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, receive_buffer)
+    sock.connect(("127.0.0.1", port))
+    sock.sendall((HANDSHAKE % base64.b64encode(os.urandom(16)).decode("ascii")).encode("ascii"))
+    response = b""
+    while b"\r\n\r\n" not in response:
+        response += sock.recv(4096)
+    return sock
+
+
+class StreamChecker:
+    """Parses the frames one client receives and checks that each is a whole frame the benchmark sent."""
+    def __init__(self, payloads):
+        """Constructor
+
+        Args:
+            payloads (dict): The opcode of every payload that is sent, by payload.
+        """
+        self.payloads = payloads
+        self.longest = max(len(payload) for payload in payloads)
+        self.buffer = bytearray()
+        self.frames = 0
+        self.error = None
+
+    def feed(self, data):
+        if self.error is not None:
+            return
+        self.buffer.extend(data)
+        while len(self.buffer) >= 2:
+            b1, b2 = self.buffer[0], self.buffer[1]
+            length, offset = b2 & 0x7F, 2
+            if length == 126:
+                if len(self.buffer) < 4:
+                    return
+                length, offset = struct.unpack("!H", bytes(self.buffer[2:4]))[0], 4
+            elif length == 127:
+                if len(self.buffer) < 10:
+                    return
+                length, offset = struct.unpack("!Q", bytes(self.buffer[2:10]))[0], 10
+            if b1 & 0x70 or b2 & 0x80 or length > self.longest:
+                self.error = "bad frame header %r after %d frames" % (bytes(self.buffer[:offset]), self.frames)
+                return
+            if len(self.buffer) < offset + length:
+                return
+            payload = bytes(self.buffer[offset:offset + length])
+            del self.buffer[:offset + length]
+            if b1 != 0x80 | self.payloads.get(payload, -1):
+                self.error = "unexpected %d byte payload after %d frames: %r" % (length, self.frames, payload[:40])
+                return
+            self.frames += 1
+
+
+def read_fast(sockets, checkers, stop):
+    poller = select.poll()
+    by_fileno = {}
+    for sock, checker in zip(sockets, checkers):
+        poller.register(sock, select.POLLIN)
+        by_fileno[sock.fileno()] = sock, checker
+    while not stop.is_set():
+        for fileno, _ in poller.poll(100):
+            sock, checker = by_fileno[fileno]
+            checker.feed(sock.recv(262144))
+
+
+def read_slow(sockets, checkers, stop):
+    for sock in sockets:
+        sock.setblocking(False)
+    while not stop.is_set():
+        for sock, checker in zip(sockets, checkers):
+            try:
+                checker.feed(sock.recv(SLOW_READ_SIZE))
+            except socket.error:
+                pass
+        time.sleep(SLOW_READ_INTERVAL)
+
+
+def produce(server, clients, seconds, telemetry, status, video):
+    ticks = int(seconds * TELEMETRY_RATE)
+    video_every = max(1, TELEMETRY_RATE // VIDEO_RATE)
+    start = time.time()
+    for tick in range(ticks):
+        server.broadcast(telemetry, clients, compress=False)
+        for _ in range(STATUS_BURST):
+            server.broadcast(status, clients, compress=False)
+        if tick % video_every == 0:
+            server.broadcast(video, clients, stream="video")
+        delay = start + (tick + 1) / TELEMETRY_RATE - time.time()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def run(seconds, coalesce):
+    """Returns the send path counters per second."""
+    server = SERVER_CLASS("127.0.0.1", 0, WebSocket)
+    server.deflate = False
+    port = server.serversocket.getsockname()[1]
+    telemetry = base64.b64encode(os.urandom(TELEMETRY_SIZE * 3 // 4)).decode("ascii")
+    status = base64.b64encode(os.urandom(STATUS_SIZE * 3 // 4)).decode("ascii")
+    video = bytearray(os.urandom(VIDEO_SIZE))
+    payloads = {telemetry.encode("ascii"): TEXT, status.encode("ascii"): TEXT, bytes(video): BINARY}
+    stop = threading.Event()
+    serving = threading.Event()
+
+    def serve():
+        while not serving.is_set():
+            server.serveonce()
+    serving_thread = threading.Thread(target=serve)
+    serving_thread.start()
+
+    fast = [connect(port) for _ in range(FAST_CLIENTS)]
+    slow = [connect(port, SLOW_BUFFER) for _ in range(SLOW_CLIENTS)]
+    while len(server.connections) < len(fast) + len(slow) or \
+            not all(c.handshaked for c in list(server.connections.values())):
+        time.sleep(0.01)
+    slow_ports = set(sock.getsockname()[1] for sock in slow)
+    for client in list(server.connections.values()):
+        if client.address[1] in slow_ports:
+            # otherwise the kernel send buffer grows to megabytes and the server never sees a slow client
+            client.client.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SLOW_BUFFER)
+    fast_checkers = [StreamChecker(payloads) for _ in fast]
+    slow_checkers = [StreamChecker(payloads) for _ in slow]
+    readers = [threading.Thread(target=read_fast, args=(fast, fast_checkers, stop)),
+               threading.Thread(target=read_slow, args=(slow, slow_checkers, stop))]
+    for reader in readers:
+        reader.start()
+
+    gather_frames, coalesce_bytes = sws.GATHER_FRAMES, sws.COALESCE_BYTES
+    has_sendmsg = sws._HAS_SENDMSG
+    if not coalesce:
+        # one frame per system call, as before write coalescing
+        sws.GATHER_FRAMES, sws.COALESCE_BYTES, sws._HAS_SENDMSG = 1, 0, False
+    try:
+        clients = list(server.connections.values())
+        before = server.statsSnapshot()
+        start = time.time()
+        produce(server, clients, seconds, telemetry, status, video)
+        elapsed = time.time() - start
+        after = server.statsSnapshot()
+    finally:
+        sws.GATHER_FRAMES, sws.COALESCE_BYTES, sws._HAS_SENDMSG = gather_frames, coalesce_bytes, has_sendmsg
+        stop.set()
+        serving.set()
+        for reader in readers:
+            reader.join()
+        serving_thread.join()
+        for sock in fast + slow:
+            sock.close()
+        server.close()
+    rates = dict((name, (after[name] - before[name]) / elapsed) for name in sws.STAT_NAMES)
+    errors = [checker.error for checker in fast_checkers + slow_checkers if checker.error is not None]
+    return rates, errors
+
+
+if __name__ == "__main__":
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+    print("[BENCHMARK] %s, %d fast and %d slow clients, %d s per run, sendmsg %s" % (
+        SERVER_CLASS.__name__, FAST_CLIENTS, SLOW_CLIENTS, seconds,
+        "available" if sws._HAS_SENDMSG else "not available"))
+    print("%-12s %10s %12s %14s %14s %14s %12s %10s" % (
+        "coalescing", "sends/s", "frames/s", "frames/send", "MB sent/s", "KB copied/s", "partial/s", "corrupt"))
+    for coalesce in (False, True):
+        rates, errors = run(seconds, coalesce)
+        print("%-12s %10d %12d %14.2f %14.2f %14.1f %12d %10d" % (
+            "on" if coalesce else "off", rates["sends"], rates["framesSent"],
+            rates["framesSent"] / max(rates["sends"], 1), rates["bytesSent"] / 1e6,
+            rates["bytesCopied"] / 1e3, rates["partialSends"], len(errors)))
+        if errors:
+            print("[ERROR] " + errors[0])
@@ -1,35 +1,61 @@
 import socket
+import select
 import threading
 import json
 import time
+import itertools
+from collections import namedtuple
 from mav_enums import *
+from framing import FrameBuffer, FramingError, encode_frame, FRAME_TELEMETRY
+from telemetry_codec import decode_telemetry, SUPPORTED_TELEMETRY_ENCODINGS, TELEMETRY_ENCODING_JSON
+from command_queue import CommandQueue
+from message_log import MessageLog
+
+MIN_TELEMETRY_RATE = 1 # Hz
+MAX_TELEMETRY_RATE = 50 # Hz
+BACKPRESSURE_INTERVAL = 1 # How often (s) the telemetry lane is checked for backpressure
+BACKPRESSURE_THRESHOLD = 5 # Coalesced telemetry frames per BACKPRESSURE_INTERVAL before Mission Planner is asked to slow down
+
+# The latest telemetry of a vehicle. A snapshot and its data are never changed once published, so readers share them
+# without a lock. Versions are unique across every link, a vehicle that reconnects never repeats one.
+TelemetrySnapshot = namedtuple("TelemetrySnapshot", ["version", "received", "data"])
+telemetry_versions = itertools.count(1)
 
 class MissionPlannerSocket():
     """MissionPlannerSocket maintains the connection between the Backend Server and the Mission Planner device.
     This class is run on the Backend Server and requires the IP address of the device running Mission Planner (With the Communication Script running).
     The main purpose of this class is to handle sending and receiving data asynchronously on the Backend Server from the Mission Planner Device.
     """
-    def __init__(self, port):
+    def __init__(self, port, vehicle_id=None, on_telemetry=None):
         """Constructor that sets up the Socket Connection.
 
         Args:
             host (str): The IP of the host to connect to.
             port (int): The port number of the application to connect to.
+            vehicle_id (str, optional): The id of the vehicle this link belongs to, see MissionPlannerRegistry.
+            on_telemetry (function, optional): Called with (vehicle_id, TelemetrySnapshot) on the command thread
+                whenever new telemetry is published.
         """
         # self.HOST = host
         self.PORT = port
+        self.vehicle_id = vehicle_id
         self.HOST = "CONNECT TO MISSION PLANNER"
         self.COMMANDS = Commands()
         
         # Attributes for Receive thread
-        self.command_queue = [] # A queue of commands that were received
-        self.command_queue_mutex = threading.Lock() # Mutex for command_queue
+        self.command_queue = CommandQueue() # A blocking queue of commands that were received, control commands before telemetry
         self.quit = False # Allows for threads to terminate correctly
-        self.live_data_mutex = threading.Lock()
-        self.live_data = {}
+        self.select_timeout = 0.5 # How long (s) the receive thread sleeps waiting for data before checking self.quit
+        self.telemetry = TelemetrySnapshot(0, 0, {}) # Replaced (never changed) by every telemetry frame received
+        self.on_telemetry = on_telemetry
         self.s = None
+        self.send_mutex = threading.Lock() # Only one thread may write a frame to the socket at a time
         self.connected = False
-        self.messages = [] # the list containing all messages from mission planner
+        self.messages = MessageLog() # ring buffer of the latest messages from mission planner, read with a cursor
+        self.telemetry_encoding = TELEMETRY_ENCODING_JSON # Negotiated with the HELLO command once connected
+        self.telemetry_rate = 1 # The live data rate (Hz) requested from Mission Planner
+        self.backpressure_check_time = 0 # When the telemetry lane was last checked for backpressure
+        self.backpressure_coalesced = 0 # The number of coalesced telemetry frames at the last check
 
     def initialise_dronelink(self, ip):
         if self.connected:
@@ -60,6 +86,7 @@ class MissionPlannerSocket():
             handle_command_thread = threading.Thread(target=self.handle_command, name="handle_command_thread")
             receive_thread.start()
             handle_command_thread.start()
+            self.hello()
         except Exception as e:
             print("[ERROR] " + str(e))
             self.close()
@@ -67,36 +94,44 @@ class MissionPlannerSocket():
     def __receive(self):
         """Performs the receiving of the data from mission planner.
         """
-        self.s.setblocking(0)
+        frame_buffer = FrameBuffer()
         while not self.quit:
             try:
-                data = ""
-                chunk_data = ""
-                # Receive until end of text sent
-                while not self.quit:
-                    chunk_data = self.s.recv(self.chunk_size)  # receive data in chunks
-                    if chunk_data:
-                        m = len(chunk_data)
-                        data += chunk_data
-                        # If the chunk is the end of a packet
-                        if chunk_data[m-2:m] == '\n\n': # Packets are delimited by double newline '\n\n'
-                            data = data.strip()
-                            break
-                    # print('[SOCKET STREAM]' + data)
-                # Check if data exists (polling due to non-blocking)
-                if data:
-                    if data == 'quit': break
+                # Sleep until data arrives, waking up every select_timeout to check if the thread should quit
+                readable, _, _ = select.select([self.s], [], [], self.select_timeout)
+                if not readable:
+                    continue
+                chunk_data = self.s.recv(self.chunk_size)  # receive data in chunks
+                if not chunk_data:
+                    break # Mission Planner closed the connection
+                frame_buffer.feed(chunk_data)
+            except Exception as e:
+                if not self.quit: # The socket is expected to fail once it has been closed
+                    print("[ERROR] " + str(e))
+                break
+            # Packets are length prefixed, handle every packet that has been fully received
+            try:
+                for frame_type, data in frame_buffer.frames():
+                    if frame_type == FRAME_TELEMETRY:
+                        self.command_queue.put_telemetry({"command": self.COMMANDS.LIVE_DRONE_DATA, "data": decode_telemetry(data)})
+                        continue
+                    if data == 'quit':
+                        self.quit = True
+                        break
                     decoded_data = json.loads(data)
-                    # Lock queue and insert new command
-                    if decoded_data['command'] != self.COMMANDS.LIVE_DRONE_DATA:
+                    # Insert new command, telemetry goes into its own lane so it never delays control responses
+                    if decoded_data['command'] == self.COMMANDS.LIVE_DRONE_DATA:
+                        self.command_queue.put_telemetry(decoded_data)
+                    else:
                         print('\n[INFO] Received Command: ' + decoded_data['command'])
-                    self.command_queue_mutex.acquire()
-                    self.command_queue.append(decoded_data)
-                    self.command_queue_mutex.release()
-                    # print('[INFO] command_queue', self.command_queue)
+                        self.command_queue.put_control(decoded_data)
+            except FramingError as e:
+                print("[ERROR] " + str(e))
+                break
             except Exception as e:
-                continue
+                print("[ERROR] Failed to decode packet from Mission Planner: " + str(e))
         self.quit = True
+        self.command_queue.close() # wake up handle_command_thread so that it can terminate
         print("\n[TERMINATION] receive_thread has successfully terminated.")
 
 
@@ -108,57 +143,98 @@ class MissionPlannerSocket():
         """
         # Handle commands received
         while not self.quit:
-            # If there is a command
-            if len(self.command_queue) > 0:
-                
-                self.command_queue_mutex.acquire()
-                decoded_data = self.command_queue.pop(0)
-                self.command_queue_mutex.release()
-
-                command = decoded_data["command"]
-                # run the command
-                try:
-                    if command == self.COMMANDS.GET_FLIGHTPLANNER_WAYPOINTS:
-                        print('\n[COMMAND] Received from get_flightplanner_waypoint: ' + str(decoded_data))
-                    elif command == self.COMMANDS.LIVE_DRONE_DATA:
-                        # print("[DATA] " + str(decoded_data["data"]))
+            # Block until there is a command, control commands are always returned before telemetry
+            decoded_data = self.command_queue.get()
+            if decoded_data is None:
+                continue
+
+            command = decoded_data["command"]
+            # run the command
+            try:
+                if command == self.COMMANDS.GET_FLIGHTPLANNER_WAYPOINTS:
+                    print('\n[COMMAND] Received from get_flightplanner_waypoint: ' + str(decoded_data))
+                elif command == self.COMMANDS.HELLO:
+                    self.telemetry_encoding = decoded_data["telemetry_encoding"]
+                    print('[INFO] Mission Planner will send telemetry encoded as: ' + self.telemetry_encoding)
+                elif command == self.COMMANDS.LIVE_DRONE_DATA:
+                    # print("[DATA] " + str(decoded_data["data"]))
+                    try:
+                        data = decoded_data["data"]
+                        self.messages.extend(data.pop('messages'))
                         try:
-                            self.live_data_mutex.acquire()
-                            data = decoded_data["data"]
-                            messages = data['messages']
-                            self.messages = self.messages + messages
-                            data['messages'] = []
-                            try:
-                                ll_status_key = str(int(data["lifeline_status"]))
-                                data["lifeline_status"] = LifelineState.LifeLineStateDict[ll_status_key]
-                                # print(data["lifeline_status"])
-
-                            except Exception as e:
-                                print("[MESSAGE] Encountered the following error when attempting to read lifeline status: " + str(e))
-                            self.live_data = data
-                            self.live_data_mutex.release()
+                            ll_status_key = str(int(data["lifeline_status"]))
+                            data["lifeline_status"] = LifelineState.LifeLineStateDict[ll_status_key]
+                            # print(data["lifeline_status"])
+
                         except Exception as e:
-                            pass
-                    else:
-                        print("[ERROR] Unknown Command Was Given.")
-                except Exception as e:
-                    print("[ERROR] " + str(e))
-                    print("[COMMAND] ERROR: Unknown Command Was Given.")
+                            print("[MESSAGE] Encountered the following error when attempting to read lifeline status: " + str(e))
+                        self.publish_telemetry(data)
+                    except Exception as e:
+                        pass
+                    self.check_telemetry_backpressure()
+                else:
+                    print("[ERROR] Unknown Command Was Given.")
+            except Exception as e:
+                print("[ERROR] " + str(e))
+                print("[COMMAND] ERROR: Unknown Command Was Given.")
         self.quit = True
         print("[TERMINATION] handle_command_thread has successfully terminated.")
         
 
+    def publish_telemetry(self, data):
+        """Makes a telemetry frame the vehicle's latest TelemetrySnapshot and tells the listener about it.
+        The data belongs to the snapshot from now on and must not be changed.
+
+        Args:
+            data (dict): The decoded telemetry, without its status messages.
+        """
+        self.telemetry = TelemetrySnapshot(next(telemetry_versions), time.time(), data)
+        if self.on_telemetry is not None:
+            self.on_telemetry(self.vehicle_id, self.telemetry)
+
+
+    def check_telemetry_backpressure(self):
+        """Asks Mission Planner to step down the telemetry rate when frames arrive faster than they can be handled,
+        i.e. when the telemetry lane of the command queue coalesced more than BACKPRESSURE_THRESHOLD frames within
+        the last BACKPRESSURE_INTERVAL seconds.
+        """
+        now = time.time()
+        if now - self.backpressure_check_time < BACKPRESSURE_INTERVAL:
+            return
+        coalesced = self.command_queue.coalesced
+        if coalesced - self.backpressure_coalesced >= BACKPRESSURE_THRESHOLD:
+            print("[INFO] Telemetry is arriving faster than it can be handled, asking Mission Planner to slow down.")
+            self.send(json.dumps({"command": self.COMMANDS.TELEMETRY_BACKPRESSURE, "coalesced": coalesced - self.backpressure_coalesced}))
+        self.backpressure_coalesced = coalesced
+        self.backpressure_check_time = now
+
+
     def close(self):
         """Safely closes the Socket.
         """
         if self.s is not None:
-            self.s.sendall(bytes("quit") + '\n\n')
+            self.send("quit")
+            self.quit = True
+            self.command_queue.close()
             self.s.shutdown(1)
             self.s.close()  # close socket
-            self.quit = True
             print("[INFO] Connection to (" + self.HOST + ":" + str(self.PORT) + ") was lost.")
 
-        
+
+
+    def send(self, data):
+        """Sends a packet to mission planner as a single frame.
+
+        Args:
+            data (str): The JSON encoded command to send.
+        """
+        frame = encode_frame(data)
+        self.send_mutex.acquire()
+        try:
+            self.s.sendall(frame)
+        finally:
+            self.send_mutex.release()
+
 
     def override_waypoints(self, waypoints, takeoff_alt=None, vtol_transition_mode=None, do_RTL=False, init_mode=None, end_mode=None):
         """Sends a command to overwrite all the waypoints in mission planner.
@@ -174,7 +250,7 @@ class MissionPlannerSocket():
                         "init_mode": init_mode,
                         "end_mode": end_mode,
                         })
-        self.s.sendall(data + '\n\n')
+        self.send(data)
     
     
     def override_flightplanner_waypoints(self, waypoints, takeoff_alt=None, vtol_transition_mode=None, do_RTL=False):
@@ -189,39 +265,56 @@ class MissionPlannerSocket():
                         "vtol_transition_mode": vtol_transition_mode,
                         "do_RTL": do_RTL,
                         })
-        self.s.sendall(data  + '\n\n')
+        self.send(data)
+
 
+    def hello(self):
+        """Sends the telemetry encodings supported by the backend, Mission Planner replies with the one it will use.
+        Communication Scripts that do not know this command keep sending JSON telemetry.
+        """
+        data = json.dumps({"command": self.COMMANDS.HELLO, "telemetry_encodings": SUPPORTED_TELEMETRY_ENCODINGS})
+        self.send(data)
+
+    def set_telemetry_rate(self, rate):
+        """Sends a command to change the rate that Mission Planner sends live data at.
+        Mission Planner may still step the rate down on its own when the link cannot keep up.
+        Args:
+            rate (int): The live data rate in Hz, between MIN_TELEMETRY_RATE and MAX_TELEMETRY_RATE.
+        """
+        self.telemetry_rate = rate
+        data = json.dumps({"command": self.COMMANDS.SET_TELEMETRY_RATE, "rate": rate})
+        self.send(data)
 
     def sync_script(self):
         """Sends a command to sync all the waypoints live on the drone to the mission planner script.
         """
         data = json.dumps({"command":self.COMMANDS.SYNC_SCRIPT})
-        self.s.sendall(data  + '\n\n')
+        self.send(data)
 
     def toggle_arm_aircraft(self):
         """Sends a command to toggle the arming state of the drone
         """
         data = json.dumps({"command":self.COMMANDS.TOGGLE_ARM})
-        self.s.sendall(data  + '\n\n')
+        self.send(data)
 
 
     def get_flightplanner_waypoints(self):
         """Sends a command to get all the waypoints in the flight planner.
         """
         data = json.dumps({"command":self.COMMANDS.GET_FLIGHTPLANNER_WAYPOINTS})
-        self.s.sendall(data  + '\n\n')
+        self.send(data)
 
     def toggle_weather_vaning(self):
         """Sends a command to toggle weather vaning on the drone
         """
         data = json.dumps({"command": self.COMMANDS.TOGGLE_WEATHER_VANING})
-        self.s.sendall(data  + '\n\n')
+        self.send(data)
 
     def change_drone_mode(self, mode):
         """Sends a command to change the plane's mode to return to launch (RTL)
         """
         data = json.dumps({"command": self.COMMANDS.CHANGE_DRONE_MODE, "mode": mode})
-        self.s.sendall(data  + '\n\n')
+        self.send(data)
     
 
     def set_cube_relay_pin(self, pin_num, pin_state):
@@ -231,7 +324,7 @@ class MissionPlannerSocket():
             pin_state: the state the the user wishes to set the pin to (0 for high, or 1 for low)
         """
         data = json.dumps({"command": self.COMMANDS.SET_CUBE_RELAY_PIN, "pin_num": pin_num, "pin_state": pin_state})
-        self.s.sendall(data + '\n\n')
+        self.send(data)
 
     def send_command_int(self, target_system, target_component, command_code, **kwargs):
         """Sends a custom command that is defined by the team and each project section.
@@ -261,7 +354,7 @@ class MissionPlannerSocket():
             "command_code": command_code,  
             "kwargs": kwargs
             })
-        self.s.sendall(data + '\n\n')
+        self.send(data)
         
 
 class Commands:
@@ -287,6 +380,9 @@ class Commands:
     PATIENT_LOCATION = "PATIENT_LOCATION"
     DROP_LOCATION = "DROP_LOCATION"
     ASCEND_AND_RTL = "ASCEND_AND_RTL"
+    HELLO = "HELLO"
+    SET_TELEMETRY_RATE = "SET_TELEMETRY_RATE"
+    TELEMETRY_BACKPRESSURE = "TELEMETRY_BACKPRESSURE"
 
 if __name__ == "__main__":
     host = raw_input("Enter IP to connect to: ")
@@ -0,0 +1,75 @@
+import threading
+from collections import deque
+
+
+class CommandQueue:
+    """A blocking queue for the commands received from Mission Planner with two lanes.
+
+    The control lane holds command responses (e.g. GET_FLIGHTPLANNER_WAYPOINTS) and is always emptied first, in the
+    order the commands were received. The telemetry lane only holds the latest LIVE_DRONE_DATA frame: a frame that
+    has not been handled yet is replaced by the next one (latest wins), carrying its status messages over so that
+    none are lost.
+    """
+    def __init__(self):
+        self.condition = threading.Condition() # Guards both lanes and wakes up threads blocked in get()
+        self.control = deque() # Control commands in the order they were received
+        self.telemetry = None # The latest telemetry frame that has not been handled yet
+        self.coalesced = 0 # Number of telemetry frames replaced before they could be handled
+        self.closed = False
+
+    def __len__(self):
+        with self.condition:
+            return len(self.control) + (self.telemetry is not None)
+
+    def put_control(self, decoded_data):
+        """Adds a control command to the end of the control lane.
+
+        Args:
+            decoded_data (dict): The decoded command received from Mission Planner.
+        """
+        with self.condition:
+            self.control.append(decoded_data)
+            self.condition.notify()
+
+    def put_telemetry(self, decoded_data):
+        """Stores a telemetry frame, replacing the previous frame if it has not been handled yet.
+
+        Args:
+            decoded_data (dict): The decoded LIVE_DRONE_DATA command received from Mission Planner.
+        """
+        with self.condition:
+            if self.telemetry is not None:
+                # Keep the status messages of the stale frame, they are only ever sent once by Mission Planner
+                stale_messages = self.telemetry["data"].get("messages", [])
+                if stale_messages:
+                    decoded_data["data"]["messages"] = stale_messages + decoded_data["data"].get("messages", [])
+                self.coalesced += 1
+            self.telemetry = decoded_data
+            self.condition.notify()
+
+    def get(self, timeout=None):
+        """Removes and returns the next command, control commands are returned before telemetry.
+
+        Args:
+            timeout (float, optional): The number of seconds to wait for a command. Defaults to None (wait forever).
+
+        Returns:
+            dict: The next command, or None if the queue was closed or the timeout expired.
+        """
+        with self.condition:
+            if not self.control and self.telemetry is None and not self.closed:
+                self.condition.wait(timeout)
+            if self.control:
+                return self.control.popleft()
+            if self.telemetry is not None:
+                decoded_data = self.telemetry
+                self.telemetry = None
+                return decoded_data
+            return None
+
+    def close(self):
+        """Wakes up every thread waiting in get() so that they can terminate.
+        """
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
@@ -69,6 +69,7 @@ print("[INFO] Importing Dependencies...")
 # import sys
 # sys.path.append(r"c:/python27/lib")
 import socket
+import select
 import json
 import clr
 import threading
@@ -76,6 +77,7 @@ import gc
 import time
 import datetime
 import traceback
+import struct
 
 # Importing MissionPlanner dependencies
 clr.AddReference("MissionPlanner")
@@ -92,6 +94,72 @@ from System import Func
 print("[INFO] Starting Script...")
 
 
+# Framing of packets sent over the socket (type, payload length) followed by the payload.
+# NOTE: This must match CommunicationScript/framing.py on the backend, this script cannot import it.
+FRAME_HEADER_FORMAT = "!BI"
+FRAME_HEADER_SIZE = struct.calcsize(FRAME_HEADER_FORMAT)
+FRAME_JSON = 1 # A JSON encoded command (or the 'quit' string)
+FRAME_TELEMETRY = 2 # A binary LIVE_DRONE_DATA record
+MAX_FRAME_SIZE = 64 * 1024 * 1024
+
+# Layout of the binary LIVE_DRONE_DATA record, a fixed section followed by the status messages.
+# NOTE: This must match CommunicationScript/telemetry_codec.py on the backend, this script cannot import it.
+TELEMETRY_VERSION = 1
+TELEMETRY_ENCODING_BINARY = "binary-v1"
+TELEMETRY_ENCODING_JSON = "json"
+TELEMETRY_FIXED_FORMAT = "!BdddfffffffffffBHffddffffH"
+TELEMETRY_MESSAGE_FORMAT = "!HH"
+TELEMETRY_FLAG_ARMED = 0x01
+TELEMETRY_FLAG_DRONE_CONNECTED = 0x02
+TELEMETRY_FLAG_WEATHER_VANING = 0x04
+
+# Live data rate limits (Hz), the backend requests a rate with SET_TELEMETRY_RATE.
+MIN_TELEMETRY_RATE = 1
+MAX_TELEMETRY_RATE = 50
+TELEMETRY_STEP_UP_TIME = 5 # Seconds of sends that did not block before a stepped down rate is raised again
+
+
+class FrameBuffer:
+    """Accumulates bytes received from the socket and splits them into complete frames.
+    """
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def feed(self, data):
+        """Appends received bytes to the end of the buffer.
+        """
+        self.buffer.extend(data)
+
+    def frames(self):
+        """Removes every complete frame from the buffer. Incomplete frames are kept until more data is fed.
+
+        Returns:
+            List[tuple]: A list of (frame_type, payload) tuples in the order they were received.
+        """
+        buffer = self.buffer
+        size = len(buffer)
+        offset = 0
+        frames = []
+        while size - offset >= FRAME_HEADER_SIZE:
+            frame_type, length = struct.unpack(FRAME_HEADER_FORMAT, str(buffer[offset:offset + FRAME_HEADER_SIZE]))
+            if length > MAX_FRAME_SIZE:
+                raise Exception("Frame of " + str(length) + " bytes exceeds the maximum frame size.")
+            end = offset + FRAME_HEADER_SIZE + length
+            if end > size:
+                break # Wait for the rest of the payload
+            frames.append((frame_type, str(buffer[offset + FRAME_HEADER_SIZE:end])))
+            offset = end
+        if offset:
+            del buffer[:offset]
+        return frames
+
+
+def encode_frame(payload, frame_type=FRAME_JSON):
+    """Creates a frame that is ready to be sent over the socket.
+    """
+    return struct.pack(FRAME_HEADER_FORMAT, frame_type, len(payload)) + payload
+
+
 class MissionManager:
     """The Mission Manager Class interfaces with Mission Planner/MAVLink to dynamically change waypoints during a mission.
     """
@@ -107,7 +175,10 @@ class MissionManager:
         self.id = int(MAVLink.MAV_CMD.WAYPOINT)  # id_mav_cmd for waypoints
         self.waypoint_count = 0  # The number of waypoints
         self.waypoints = []  # list of the waypoints
-        self.live_data_rate = 1000 # Data send rate from drone to backend (in ms)
+        self.uploaded_mission = None # hashes of each waypoint last uploaded to the vehicle, None if unknown
+        self.telemetry_rate = 1 # The live data rate (Hz) requested by the backend
+        self.live_data_rate = 1000 # Data send rate from drone to backend (in ms), stepped down when the link cannot keep up
+        self.fast_sends = 0 # The number of consecutive live data sends that did not block
         self.cs_drone = MAV.MAV.cs # current state of drone object
         self.drone_connected = False
         # Attributes for Socket connection.
@@ -118,10 +189,13 @@ class MissionManager:
         self.PORT = port  # The port number that the application is running on (default 7766)
         self.chunk_size = chunk_size  # The chunk size of the data sent a received (default 1024)
         self.messagesCount = 0 # The number of messages that have already been sent to the backend.
+        self.telemetry_encoding = TELEMETRY_ENCODING_JSON # Negotiated with the HELLO command sent by the backend
         # Attributes for Receive thread
         self.command_queue = [] # A queue of commands that were received
         self.command_queue_mutex = threading.Lock() # Mutex for command_queue
+        self.send_mutex = threading.Lock() # Only one thread may write a frame to the socket at a time
         self.quit = False # Allows for threads to terminate correctly
+        self.select_timeout = 0.5 # How long (s) the receive thread sleeps waiting for data before checking self.quit
 
         # Lifeline Data params
         self.lifeline_mutex = threading.Lock() # Mutex to only allow 1 thread to read and write to the following params
@@ -191,6 +265,7 @@ class MissionManager:
             print("[INFO] Syncing Live Waypoints...")
             self.waypoint_count = MAV.getWPCount()
             self.waypoints = [MAV.getWP(index) for index in range(MAV.getWPCount())]
+            self.uploaded_mission = None # the mission on the vehicle may have been changed elsewhere, next upload is a full upload
             self.cs_drone = cs  # update current state of drone object
             self.drone_connected = True
             print("[INFO] Syncing Live Waypoints Successful")
@@ -244,21 +319,82 @@ class MissionManager:
 
 
     def update(self):
-        """Updates Mission Planner on the modified waypoints
+        """Updates Mission Planner on the modified waypoints.
+        Only the range of waypoints that changed since the last upload is sent, unless the number of waypoints changed.
         """
+        start_time = time.time()
         self.waypoints.insert(0, self.create_wp(self.cs_drone.lat, self.cs_drone.lng, self.cs_drone.alt))
         # print("HELP", self.cs_drone.lat, self.cs_drone.lng, self.cs_drone.alt)
         # print(self.waypoints[0])
-        MAV.setWPTotal(len(self.waypoints))
-        
-        for i in range(len(self.waypoints)):
-            MAV.setWP(self.waypoints[i], i, MAVLink.MAV_FRAME.GLOBAL_RELATIVE_ALT)
+        mission = [self.hash_wp(wp) for wp in self.waypoints]
+        n = len(mission)
+
+        if self.uploaded_mission is not None and len(self.uploaded_mission) == n and hasattr(MAV, "setWPPartial"):
+            # The home waypoint (index 0) follows the vehicle's position so it is not compared
+            changed = [i for i in range(1, n) if mission[i] != self.uploaded_mission[i]]
+            if not changed:
+                print("[UPLOAD] AUTO MISSION UNCHANGED, NOTHING UPLOADED (" + str(round(time.time() - start_time, 3)) + " s)")
+                return
+            first, last = changed[0], changed[-1]
+            try:
+                self.__upload_partial(first, last)
+                self.uploaded_mission = mission
+                print("[UPLOAD] AUTO MISSION SUCCESSFULLY UPLOADED: waypoints " + str(first) + " to " + str(last) + " of " + str(n) + " in " + str(round(time.time() - start_time, 3)) + " s")
+                return
+            except Exception as e:
+                print(traceback.format_exc())
+                print("[UPLOAD] Partial upload failed, uploading the full mission instead.")
 
-        MAV.setWPACK()  # Send waypoint ACK
-        print("[UPLOAD] AUTO MISSION SUCCESSFULLY UPLOADED")
+        self.__upload(mission)
+        print("[UPLOAD] AUTO MISSION SUCCESSFULLY UPLOADED: all " + str(n) + " waypoints in " + str(round(time.time() - start_time, 3)) + " s")
         # self.__set_home(self.waypoints[0])  # Set the home waypoint as the first waypoint
         # self.__set_home(self.create_wp(self.cs_drone.lat, self.cs_drone.lng, self.cs_drone.alt))  # Set the home waypoint as the vehicle's current location
         
+
+    def __upload(self, mission):
+        """Uploads every waypoint, replacing the mission on the vehicle. This is a private function.
+
+        Args:
+            mission (List[int]): The hash of every waypoint, see hash_wp.
+        """
+        self.uploaded_mission = None # unknown until the full upload finishes
+        MAV.setWPTotal(len(mission))
+
+        for i in range(len(mission)):
+            MAV.setWP(self.waypoints[i], i, MAVLink.MAV_FRAME.GLOBAL_RELATIVE_ALT)
+
+        MAV.setWPACK()  # Send waypoint ACK
+        self.uploaded_mission = mission
+
+
+    def __upload_partial(self, first, last):
+        """Uploads the waypoints from index first to last (inclusive) using a MAVLink partial mission write.
+        This is a private function. update falls back to a full upload if it raises, the vehicle then discards the
+        partial write when it receives the new mission count.
+
+        Args:
+            first (int): The index of the first waypoint to upload.
+            last (int): The index of the last waypoint to upload.
+        """
+        # MAVLinkInterface.setWPPartial(ushort startwp, ushort endwp) in Mission Planner's
+        # ExtLibs/ArduPilot/Mavlink/MAVLinkInterface.cs sends MISSION_WRITE_PARTIAL_LIST, after which setWP is called
+        # for every index in the range. update only calls this when MAV has setWPPartial.
+        MAV.setWPPartial(first, last)
+        for i in range(first, last + 1):
+            MAV.setWP(self.waypoints[i], i, MAVLink.MAV_FRAME.GLOBAL_RELATIVE_ALT)
+        MAV.setWPACK()  # Send waypoint ACK
+
+
+    def hash_wp(self, waypoint):
+        """Hashes the fields of a waypoint that are uploaded to the vehicle.
+
+        Args:
+            waypoint (Locationwp): The waypoint to hash.
+
+        Returns:
+            int: The hash of the waypoint.
+        """
+        return hash((waypoint.id, waypoint.p1, waypoint.p2, waypoint.p3, waypoint.p4, waypoint.lat, waypoint.lng, waypoint.alt))
     
 
     def create_wp(self, lat, lng, alt, **kwargs):
@@ -429,24 +565,21 @@ class MissionManager:
     def __receive(self):
         """Performs the receiving of the data from the backend.
         """
-        self.s.setblocking(0)
+        frame_buffer = FrameBuffer()
         while not self.quit:
             try:
-                data = ""
-                chunk_data = ""
-                # Receive until end of text sent
-                while not self.quit:
-                    chunk_data = self.connection.recv(self.chunk_size).decode()  # receive data in 1024 bit chunks
-                    m = len(chunk_data)
-                    # print('end: ' + chunk_data[m-2:m])
-                    data += chunk_data
-                    if chunk_data[m-2:m] == '\n\n':
-                        data = data.strip()
-                        break
-                    # print('[SOCKET STREAM]' + data)
-                # Check if data exists (polling due to non-blocking)
-                if data:
-                    if data == 'quit': 
+                # Sleep until data arrives, waking up every select_timeout to check if the script should quit
+                readable, _, _ = select.select([self.connection], [], [], self.select_timeout)
+                if not readable:
+                    continue
+                chunk_data = self.connection.recv(self.chunk_size)  # receive data in chunks
+                if not chunk_data:
+                    break # The backend closed the connection
+                frame_buffer.feed(chunk_data)
+                # Packets are length prefixed, handle every packet that has been fully received
+                for frame_type, data in frame_buffer.frames():
+                    if data == 'quit':
+                        self.quit = True
                         break
                     decoded_data = json.loads(data)
                     # Lock queue and insert new command
@@ -479,6 +612,9 @@ class MissionManager:
                         Commands.SEND_COMMAND_INT: Commands.send_command_int,
                         Commands.TOGGLE_WEATHER_VANING: Commands.toggle_weather_vaning,
                         Commands.CHANGE_DRONE_MODE: Commands.change_drone_mode,
+                        Commands.HELLO: Commands.hello,
+                        Commands.SET_TELEMETRY_RATE: Commands.set_telemetry_rate,
+                        Commands.TELEMETRY_BACKPRESSURE: Commands.telemetry_backpressure,
                         }  
         
         # run the command
@@ -502,6 +638,28 @@ class MissionManager:
         print("[TERMINATION] Connection to " + str(self.addr) + " was lost.")
     
 
+    def send(self, data):
+        """Sends a packet to the backend as a single frame.
+
+        Args:
+            data (str): The JSON encoded command to send.
+        """
+        self.send_frame(encode_frame(data.encode()))
+
+
+    def send_frame(self, frame):
+        """Sends an encoded frame to the backend.
+
+        Args:
+            frame (str): The frame created by encode_frame.
+        """
+        self.send_mutex.acquire()
+        try:
+            self.connection.sendall(frame)
+        finally:
+            self.send_mutex.release()
+
+
     def convert_to_locationwp(self, waypoints):
         """Converts a list of dictionaries to the waypoints that mission planner uses.
 
@@ -525,50 +683,139 @@ class MissionManager:
         while not self.quit:
             if self.cs_drone:
                 try:
+                    tick_start = time.time()
                     messages_to_send = []
                     for message in self.cs_drone.messages[self.messagesCount:]:
                         messages_to_send.append({'time': str(message[0]), 'message': message[1]})
                         self.messagesCount += 1
                     self.lifeline_mutex.acquire()
                     self.vision_mutex.acquire()
-                    data = json.dumps({
-                        "command":Commands.LIVE_DRONE_DATA,
-                        "data":{
-                            "timestamp": datetime.datetime.now().strftime("%m/%d/%Y, %I:%M:%S %p"),
-                            "lat": float(self.cs_drone.lat),
-                            "lng": float(self.cs_drone.lng),
-                            "alt": float(self.cs_drone.alt),
-                            "distTraveled": float(self.cs_drone.distTraveled),
-                            "DistToHome": float(self.cs_drone.DistToHome),
-                            "airspeed": float(self.cs_drone.airspeed),
-                            "groundspeed": float(self.cs_drone.groundspeed),
-                            "verticalspeed": float(self.cs_drone.verticalspeed),
-                            "battery_voltage": float(self.cs_drone.battery_voltage),
-                            "battery_remaining": float(self.cs_drone.battery_remaining),
-                            "propulsion_battery":float(self.cs_drone.battery_cell1),
-                            "avionics_battery":float(self.cs_drone.battery_voltage2),
-                            "armed": self.cs_drone.armed,
-                            "drone_connected": self.drone_connected,
-                            "weather_vaning": bool(Script.GetParam("Q_WVANE_ENABLE")),
-                            "sonarrange": float(self.cs_drone.sonarrange),
-                            "messages": messages_to_send,
-                            "lifeline_status": self.lifeline_status,
-                            "lifeline_distance": self.lifeline_distance,
-                            "lifeline_velocity": self.lifeline_velocity,
-                            "vision_geotag_gps": self.vision_geotag_gps,
-                            "vision_geotag_box": self.vision_geotag_box
-                            },
-                        })
-                    self.vision_mutex.release()
-                    self.lifeline_mutex.release()
+                    try:
+                        if self.telemetry_encoding == TELEMETRY_ENCODING_BINARY:
+                            frame = encode_frame(self.encode_live_data(messages_to_send), FRAME_TELEMETRY)
+                        else:
+                            frame = encode_frame(json.dumps({
+                                "command":Commands.LIVE_DRONE_DATA,
+                                "data":{
+                                    "timestamp": datetime.datetime.now().strftime("%m/%d/%Y, %I:%M:%S %p"),
+                                    "lat": float(self.cs_drone.lat),
+                                    "lng": float(self.cs_drone.lng),
+                                    "alt": float(self.cs_drone.alt),
+                                    "distTraveled": float(self.cs_drone.distTraveled),
+                                    "DistToHome": float(self.cs_drone.DistToHome),
+                                    "airspeed": float(self.cs_drone.airspeed),
+                                    "groundspeed": float(self.cs_drone.groundspeed),
+                                    "verticalspeed": float(self.cs_drone.verticalspeed),
+                                    "battery_voltage": float(self.cs_drone.battery_voltage),
+                                    "battery_remaining": float(self.cs_drone.battery_remaining),
+                                    "propulsion_battery":float(self.cs_drone.battery_cell1),
+                                    "avionics_battery":float(self.cs_drone.battery_voltage2),
+                                    "armed": self.cs_drone.armed,
+                                    "drone_connected": self.drone_connected,
+                                    "weather_vaning": bool(Script.GetParam("Q_WVANE_ENABLE")),
+                                    "sonarrange": float(self.cs_drone.sonarrange),
+                                    "messages": messages_to_send,
+                                    "lifeline_status": self.lifeline_status,
+                                    "lifeline_distance": self.lifeline_distance,
+                                    "lifeline_velocity": self.lifeline_velocity,
+                                    "vision_geotag_gps": self.vision_geotag_gps,
+                                    "vision_geotag_box": self.vision_geotag_box
+                                    },
+                                }).encode())
+                    finally:
+                        self.vision_mutex.release()
+                        self.lifeline_mutex.release()
                     # print('[MESSAGES TO SEND]', messages_to_send)
-                    self.connection.sendall((data + '\n\n').encode())
-                    Script.Sleep(self.live_data_rate)
+                    send_start = time.time()
+                    self.send_frame(frame)
+                    send_time = (time.time() - send_start) * 1000
+                    # sendall blocks once the socket buffer is full, i.e. the link or the backend cannot keep up
+                    if send_time > self.live_data_rate / 2:
+                        self.step_down_telemetry_rate("sending live data blocked for " + str(int(send_time)) + " ms")
+                    else:
+                        self.fast_sends += 1
+                        if self.fast_sends * self.live_data_rate >= TELEMETRY_STEP_UP_TIME * 1000:
+                            self.step_up_telemetry_rate()
+                    # Sleep for the rest of the interval so that the rate does not drift by the time spent encoding
+                    elapsed = int((time.time() - tick_start) * 1000)
+                    Script.Sleep(max(1, self.live_data_rate - elapsed))
                 except Exception as e:
                     print(traceback.format_exc())
         print("[TERMINATION] send_live_data_thread has successfully terminated")
 
 
+    def set_telemetry_rate(self, rate):
+        """Sets the rate that live data is sent to the backend at.
+
+        Args:
+            rate (int): The rate in Hz, clamped between MIN_TELEMETRY_RATE and MAX_TELEMETRY_RATE.
+        """
+        self.telemetry_rate = min(max(int(rate), MIN_TELEMETRY_RATE), MAX_TELEMETRY_RATE)
+        self.live_data_rate = 1000 // self.telemetry_rate
+        self.fast_sends = 0
+        print("[INFO] Sending live data at " + str(self.telemetry_rate) + " Hz")
+
+
+    def step_down_telemetry_rate(self, reason):
+        """Halves the rate that live data is sent at (down to MIN_TELEMETRY_RATE) when the link cannot keep up.
+
+        Args:
+            reason (str): Why the rate was stepped down, for the log.
+        """
+        self.fast_sends = 0
+        rate = max(MIN_TELEMETRY_RATE, (1000 // self.live_data_rate) // 2)
+        if 1000 // rate != self.live_data_rate:
+            self.live_data_rate = 1000 // rate
+            print("[INFO] Stepped live data down to " + str(rate) + " Hz: " + reason)
+
+
+    def step_up_telemetry_rate(self):
+        """Doubles the rate that live data is sent at, up to the rate requested by the backend.
+        """
+        self.fast_sends = 0
+        rate = min(self.telemetry_rate, (1000 // self.live_data_rate) * 2)
+        if 1000 // rate != self.live_data_rate:
+            self.live_data_rate = 1000 // rate
+            print("[INFO] Stepped live data up to " + str(rate) + " Hz")
+
+
+    def encode_live_data(self, messages):
+        """Packs the live data into the binary telemetry record (TELEMETRY_FIXED_FORMAT followed by the messages).
+        Must be called with lifeline_mutex and vision_mutex held.
+
+        Args:
+            messages (list[dict]): The new status messages, each with keys: time and message.
+
+        Returns:
+            str: The encoded record.
+        """
+        flags = 0
+        if self.cs_drone.armed:
+            flags |= TELEMETRY_FLAG_ARMED
+        if self.drone_connected:
+            flags |= TELEMETRY_FLAG_DRONE_CONNECTED
+        if bool(Script.GetParam("Q_WVANE_ENABLE")):
+            flags |= TELEMETRY_FLAG_WEATHER_VANING
+        parts = [struct.pack(TELEMETRY_FIXED_FORMAT, TELEMETRY_VERSION, time.time(),
+                             float(self.cs_drone.lat), float(self.cs_drone.lng), float(self.cs_drone.alt),
+                             float(self.cs_drone.distTraveled), float(self.cs_drone.DistToHome),
+                             float(self.cs_drone.airspeed), float(self.cs_drone.groundspeed), float(self.cs_drone.verticalspeed),
+                             float(self.cs_drone.battery_voltage), float(self.cs_drone.battery_remaining),
+                             float(self.cs_drone.battery_cell1), float(self.cs_drone.battery_voltage2),
+                             float(self.cs_drone.sonarrange), flags,
+                             int(self.lifeline_status), float(self.lifeline_distance), float(self.lifeline_velocity),
+                             self.vision_geotag_gps['x'], self.vision_geotag_gps['y'], self.vision_geotag_gps['z'],
+                             self.vision_geotag_box['x'], self.vision_geotag_box['y'], self.vision_geotag_box['z'],
+                             len(messages))]
+        for message in messages:
+            time_bytes = message['time'].encode('utf-8')
+            message_bytes = message['message'].encode('utf-8')
+            parts.append(struct.pack(TELEMETRY_MESSAGE_FORMAT, len(time_bytes), len(message_bytes)))
+            parts.append(time_bytes)
+            parts.append(message_bytes)
+        return ''.join(parts)
+
+
     def set_cube_relay_pin(self, pin_num, pin_state):
         """Sets a chosen relay pin on the cube to either high (0V) or low (5V)
         """
@@ -733,6 +980,9 @@ class Commands:
     SEND_COMMAND_INT = "SEND_COMMAND_INT"
     TOGGLE_WEATHER_VANING = "TOGGLE_WEATHER_VANING"
     CHANGE_DRONE_MODE = "CHANGE_DRONE_MODE"
+    HELLO = "HELLO"
+    SET_TELEMETRY_RATE = "SET_TELEMETRY_RATE"
+    TELEMETRY_BACKPRESSURE = "TELEMETRY_BACKPRESSURE"
 
 
     def override(self, mission_manager, decoded_data):
@@ -859,7 +1109,7 @@ class Commands:
                     "alt": float(FlightPlanner.Commands.Rows[i].Cells[7].Value), # Alt
                 })
             # print('Command List', res)
-            mission_manager.connection.sendall((json.dumps(res) + '\n\n').encode())
+            mission_manager.send(json.dumps(res))
             print("[COMMAND] GET_FLIGHTPLANNER_WAYPOINTS Command Executed.")
         except Exception as e:
             print(traceback.format_exc())
@@ -926,6 +1176,55 @@ class Commands:
         except Exception as e:
             print(traceback.format_exc())
             print("[ERROR] Error handling CHANGE DRONE MODE COMMAND")
+
+
+    def hello(self, mission_manager, decoded_data):
+        """Picks the first telemetry encoding offered by the backend that this script supports and replies with it.
+
+        Args:
+            mission_manager MissionManager: The mission manager class connected to the mission planner.
+            decoded_data (Dict): The data required to execute the command. Usually received from the backend
+        """
+        try:
+            encoding = TELEMETRY_ENCODING_JSON
+            for offered in decoded_data["telemetry_encodings"]:
+                if offered in (TELEMETRY_ENCODING_BINARY, TELEMETRY_ENCODING_JSON):
+                    encoding = offered
+                    break
+            mission_manager.telemetry_encoding = encoding
+            mission_manager.send(json.dumps({"command": Commands.HELLO, "telemetry_encoding": encoding}))
+            print("[COMMAND] HELLO Command Executed, sending telemetry as: " + encoding)
+        except Exception as e:
+            print(traceback.format_exc())
+            print("[ERROR] Error handling HELLO COMMAND")
+
+
+    def set_telemetry_rate(self, mission_manager, decoded_data):
+        """Sets the rate (Hz) that live data is sent to the backend at.
+
+        Args:
+            mission_manager MissionManager: The mission manager class connected to the mission planner.
+            decoded_data (Dict): The data required to execute the command. Usually received from the backend
+        """
+        try:
+            mission_manager.set_telemetry_rate(decoded_data["rate"])
+        except Exception as e:
+            print(traceback.format_exc())
+            print("[ERROR] Error handling SET_TELEMETRY_RATE COMMAND")
+
+
+    def telemetry_backpressure(self, mission_manager, decoded_data):
+        """Steps the live data rate down because the backend is receiving telemetry faster than it can handle it.
+
+        Args:
+            mission_manager MissionManager: The mission manager class connected to the mission planner.
+            decoded_data (Dict): The data required to execute the command. Usually received from the backend
+        """
+        try:
+            mission_manager.step_down_telemetry_rate("the backend coalesced " + str(decoded_data["coalesced"]) + " frames")
+        except Exception as e:
+            print(traceback.format_exc())
+            print("[ERROR] Error handling TELEMETRY_BACKPRESSURE COMMAND")
     
 
 # ------------------------------------ End Classes ------------------------------------
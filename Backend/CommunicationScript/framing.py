@@ -0,0 +1,89 @@
+"""
+Framing for the link between the Backend Server and the Mission Planner Communication Script (port 7766).
+
+Every packet sent over the socket is a frame made of a fixed size header followed by the payload:
+    +------------+----------------+-------------------+
+    | type (1 B) | length (4 B)   | payload (length B) |
+    +------------+----------------+-------------------+
+The header is packed in network byte order. Frames are parsed out of a single reusable buffer, so a payload that
+arrives over many recv() calls is only copied once and a header split across two chunks is handled naturally.
+
+NOTE: communication_script.py runs standalone inside Mission Planner and cannot import this module,
+      it keeps its own copy of the header format. Both files must be changed together.
+"""
+import struct
+
+HEADER_FORMAT = "!BI"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+MAX_FRAME_SIZE = 64 * 1024 * 1024  # Refuse frames larger than 64MB, the stream is corrupt at that point.
+
+# Frame types
+FRAME_JSON = 1  # A JSON encoded command (or the 'quit' string)
+FRAME_TELEMETRY = 2  # A binary LIVE_DRONE_DATA record, see telemetry_codec.py
+
+
+class FramingError(Exception):
+    """Raised when the byte stream can no longer be parsed into frames.
+    """
+    pass
+
+
+def encode_frame(payload, frame_type=FRAME_JSON):
+    """Creates a frame that is ready to be sent over the socket.
+
+    Args:
+        payload (str): The bytes to send.
+        frame_type (int, optional): The type of the payload. Defaults to FRAME_JSON.
+
+    Returns:
+        str: The header followed by the payload.
+    """
+    return struct.pack(HEADER_FORMAT, frame_type, len(payload)) + payload
+
+
+class FrameBuffer:
+    """Accumulates bytes received from the socket and splits them into complete frames.
+    """
+    def __init__(self, max_frame_size=MAX_FRAME_SIZE):
+        """Constructor
+
+        Args:
+            max_frame_size (int, optional): The largest payload that will be accepted. Defaults to MAX_FRAME_SIZE.
+        """
+        self.buffer = bytearray()
+        self.max_frame_size = max_frame_size
+
+    def feed(self, data):
+        """Appends received bytes to the end of the buffer.
+
+        Args:
+            data (str): The bytes returned by recv().
+        """
+        self.buffer.extend(data)
+
+    def frames(self):
+        """Removes every complete frame from the buffer. Incomplete frames are kept until more data is fed.
+
+        Raises:
+            FramingError: If a header announces a payload larger than max_frame_size.
+
+        Returns:
+            List[tuple]: A list of (frame_type, payload) tuples in the order they were received.
+        """
+        buffer = self.buffer
+        size = len(buffer)
+        offset = 0
+        frames = []
+        while size - offset >= HEADER_SIZE:
+            frame_type, length = struct.unpack_from(HEADER_FORMAT, buffer, offset)
+            if length > self.max_frame_size:
+                raise FramingError("Frame of " + str(length) + " bytes exceeds the maximum frame size.")
+            end = offset + HEADER_SIZE + length
+            if end > size:
+                break  # Wait for the rest of the payload
+            frames.append((frame_type, bytes(buffer[offset + HEADER_SIZE:end])))
+            offset = end
+        # Discard consumed bytes once per call, so a large payload is never shifted more than once per recv()
+        if offset:
+            del buffer[:offset]
+        return frames
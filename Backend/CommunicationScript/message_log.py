@@ -0,0 +1,58 @@
+import threading
+from collections import deque
+from itertools import islice
+
+DEFAULT_CAPACITY = 1000 # The number of status messages kept, older messages are dropped
+
+
+class MessageLog:
+    """A fixed capacity ring buffer of the status messages received from Mission Planner.
+
+    Every message is given a monotonic sequence number. Readers hold a cursor (the sequence number of the next
+    message they have not seen) instead of an index into a list, so memory stays flat over long flights and reading
+    only costs as much as the number of new messages.
+    """
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        """Constructor
+
+        Args:
+            capacity (int, optional): The number of messages kept. Defaults to DEFAULT_CAPACITY.
+        """
+        self.messages = deque(maxlen=capacity)
+        self.next_seq = 0 # The sequence number that the next message will be given
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.messages)
+
+    def extend(self, messages):
+        """Appends new messages, dropping the oldest messages once the log is full.
+
+        Args:
+            messages (List[dict]): The messages in the order they were received.
+        """
+        with self.lock:
+            self.messages.extend(messages)
+            self.next_seq += len(messages)
+
+    def since(self, cursor, limit=None):
+        """Gets the messages from a cursor onwards.
+
+        Args:
+            cursor (int): The sequence number of the first message wanted.
+            limit (int, optional): Only return the latest 'limit' messages. Defaults to None (no limit).
+
+        Returns:
+            tuple: (List[dict] of messages, the cursor to pass in next time).
+        """
+        with self.lock:
+            start = max(cursor, self.next_seq - len(self.messages))
+            if limit is not None:
+                start = max(start, self.next_seq - limit)
+            count = self.next_seq - start
+            if count <= 0:
+                return [], self.next_seq
+            # Walk from the newest message so that only the new messages are visited
+            messages = list(islice(reversed(self.messages), count))
+            messages.reverse()
+            return messages, self.next_seq
@@ -0,0 +1,104 @@
+import threading
+from MissionPlannerSocket import MissionPlannerSocket
+
+DEFAULT_VEHICLE_ID = "default" # The vehicle used when a command or client does not name one
+
+
+class MissionPlannerRegistry:
+    """Keeps one MissionPlannerSocket per vehicle so that a single backend can run several Mission Planner links at once.
+    Each link has its own receive thread, telemetry snapshot and message log. Commands and WebSocket streams are
+    routed to a link by its vehicle id, the default vehicle is used when no vehicle id is given.
+    """
+    def __init__(self, port):
+        """Constructor
+
+        Args:
+            port (int): The port number that the Communication Script listens on.
+        """
+        self.PORT = port
+        self.lock = threading.Lock() # Guards self.links
+        self.telemetry_listeners = []
+        self.links = {DEFAULT_VEHICLE_ID: MissionPlannerSocket(port, DEFAULT_VEHICLE_ID, self.publish_telemetry)}
+
+    def add_telemetry_listener(self, callback):
+        """Calls callback(vehicle_id, snapshot) whenever any vehicle publishes a TelemetrySnapshot.
+        The callback runs on the vehicle's command thread, so it should only hand the snapshot over.
+
+        Args:
+            callback (function): The function to call.
+        """
+        self.telemetry_listeners.append(callback)
+
+    def publish_telemetry(self, vehicle_id, snapshot):
+        """Passes a vehicle's new TelemetrySnapshot to every telemetry listener.
+
+        Args:
+            vehicle_id (str): The id of the vehicle.
+            snapshot (TelemetrySnapshot): The snapshot that was published.
+        """
+        for callback in self.telemetry_listeners:
+            try:
+                callback(vehicle_id, snapshot)
+            except Exception as e:
+                print("[ERROR] Telemetry listener failed: " + str(e))
+
+    def get(self, vehicle_id=None):
+        """Gets the link of a vehicle.
+
+        Args:
+            vehicle_id (str, optional): The id of the vehicle. Defaults to None (the default vehicle).
+
+        Returns:
+            MissionPlannerSocket: The link, or None if there is no vehicle with that id.
+        """
+        with self.lock:
+            return self.links.get(vehicle_id or DEFAULT_VEHICLE_ID)
+
+    def snapshot(self):
+        """Gets every link, safe to iterate while vehicles are being added.
+
+        Returns:
+            List[tuple]: A list of (vehicle_id, MissionPlannerSocket) tuples.
+        """
+        with self.lock:
+            return list(self.links.items())
+
+    def connect(self, ip, vehicle_id=None, port=None):
+        """Connects a vehicle to the Mission Planner running on the given IP.
+        A vehicle that is already connected has to be closed before it can be connected again.
+
+        Args:
+            ip (str): The IP of the device running Mission Planner (with the Communication Script running).
+            vehicle_id (str, optional): The id to register the vehicle under. Defaults to None (the default vehicle).
+            port (int, optional): The port that the Communication Script listens on. Defaults to the registry's port.
+
+        Returns:
+            bool: True if the connection was made.
+        """
+        vehicle_id = vehicle_id or DEFAULT_VEHICLE_ID
+        with self.lock:
+            link = self.links.get(vehicle_id)
+            if link is not None and link.connected and not link.quit:
+                print("[ERROR] Vehicle " + vehicle_id + " is already connected to (" + link.HOST + ":" + str(link.PORT) + ").")
+                return False
+            # A link that was closed or failed to connect cannot be reused, so every attempt gets a new one
+            link = MissionPlannerSocket(port or self.PORT, vehicle_id, self.publish_telemetry)
+            self.links[vehicle_id] = link
+        connected = link.initialise_dronelink(ip)
+        if not connected and vehicle_id != DEFAULT_VEHICLE_ID:
+            # Only the default vehicle is kept while disconnected, other vehicles exist once they have connected
+            with self.lock:
+                if self.links.get(vehicle_id) is link:
+                    del self.links[vehicle_id]
+        return connected
+
+    def close(self):
+        """Closes the link of every vehicle.
+        """
+        for vehicle_id, link in self.snapshot():
+            if not link.connected:
+                continue
+            try:
+                link.close()
+            except Exception as e:
+                print("[ERROR] Failed to close the link of vehicle " + vehicle_id + ": " + str(e))
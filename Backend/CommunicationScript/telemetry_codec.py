@@ -0,0 +1,164 @@
+"""
+Binary encoding of the LIVE_DRONE_DATA telemetry record sent by the Communication Script.
+
+A record is a fixed layout section of struct packed numeric fields followed by a variable section holding the
+status messages:
+    +-----------------------------+--------------------------------------------------------------+
+    | fixed section (FIXED_SIZE)  | per message: time length (H), message length (H), time, message |
+    +-----------------------------+--------------------------------------------------------------+
+The first byte of the fixed section is the layout version. The encoding is negotiated with the HELLO command
+when the backend connects, the JSON encoding is used when the Communication Script does not support it.
+
+NOTE: communication_script.py runs standalone inside Mission Planner and cannot import this module,
+      it keeps its own copy of the layout. Both files must be changed together.
+"""
+import struct
+import datetime
+
+TELEMETRY_VERSION = 1
+TELEMETRY_ENCODING_BINARY = "binary-v1"
+TELEMETRY_ENCODING_JSON = "json"
+SUPPORTED_TELEMETRY_ENCODINGS = [TELEMETRY_ENCODING_BINARY, TELEMETRY_ENCODING_JSON] # In order of preference
+
+FIXED_FORMAT = (
+    "!"
+    "B"     # version
+    "d"     # timestamp (seconds since epoch)
+    "dd"    # lat, lng
+    "f"     # alt
+    "fffff" # distTraveled, DistToHome, airspeed, groundspeed, verticalspeed
+    "ffff"  # battery_voltage, battery_remaining, propulsion_battery, avionics_battery
+    "f"     # sonarrange
+    "B"     # flags (FLAG_ARMED | FLAG_DRONE_CONNECTED | FLAG_WEATHER_VANING)
+    "Hff"   # lifeline_status, lifeline_distance, lifeline_velocity
+    "ddf"   # vision_geotag_gps x, y, z
+    "fff"   # vision_geotag_box x, y, z
+    "H"     # number of messages in the variable section
+)
+FIXED_SIZE = struct.calcsize(FIXED_FORMAT)
+MESSAGE_FORMAT = "!HH"
+MESSAGE_HEADER_SIZE = struct.calcsize(MESSAGE_FORMAT)
+
+FLAG_ARMED = 0x01
+FLAG_DRONE_CONNECTED = 0x02
+FLAG_WEATHER_VANING = 0x04
+
+TIMESTAMP_FORMAT = "%m/%d/%Y, %I:%M:%S %p" # The format of the "timestamp" key in the JSON encoding
+
+# The timestamp only changes once a second, so the formatted string is cached between records.
+_last_timestamp = [None, None]
+
+
+def format_timestamp(timestamp):
+    """Formats a timestamp the same way as the JSON encoding, reusing the previous result within the same second.
+
+    Args:
+        timestamp (float): Seconds since epoch.
+
+    Returns:
+        str: The local time formatted with TIMESTAMP_FORMAT.
+    """
+    second = int(timestamp)
+    if _last_timestamp[0] != second:
+        _last_timestamp[0] = second
+        _last_timestamp[1] = datetime.datetime.fromtimestamp(second).strftime(TIMESTAMP_FORMAT)
+    return _last_timestamp[1]
+
+
+def encode_telemetry(data, timestamp):
+    """Encodes a telemetry record. Mirrors the encoder in communication_script.py.
+
+    Args:
+        data (dict): The telemetry with the same keys as the JSON encoding (the "timestamp" key is ignored).
+        timestamp (float): Seconds since epoch of when the record was taken.
+
+    Returns:
+        str: The encoded record.
+    """
+    flags = 0
+    if data["armed"]:
+        flags |= FLAG_ARMED
+    if data["drone_connected"]:
+        flags |= FLAG_DRONE_CONNECTED
+    if data["weather_vaning"]:
+        flags |= FLAG_WEATHER_VANING
+    gps = data["vision_geotag_gps"]
+    box = data["vision_geotag_box"]
+    messages = data["messages"]
+    parts = [struct.pack(FIXED_FORMAT, TELEMETRY_VERSION, timestamp,
+                         data["lat"], data["lng"], data["alt"],
+                         data["distTraveled"], data["DistToHome"], data["airspeed"], data["groundspeed"], data["verticalspeed"],
+                         data["battery_voltage"], data["battery_remaining"], data["propulsion_battery"], data["avionics_battery"],
+                         data["sonarrange"], flags,
+                         data["lifeline_status"], data["lifeline_distance"], data["lifeline_velocity"],
+                         gps["x"], gps["y"], gps["z"],
+                         box["x"], box["y"], box["z"],
+                         len(messages))]
+    for message in messages:
+        time_bytes = message["time"].encode("utf-8")
+        message_bytes = message["message"].encode("utf-8")
+        parts.append(struct.pack(MESSAGE_FORMAT, len(time_bytes), len(message_bytes)))
+        parts.append(time_bytes)
+        parts.append(message_bytes)
+    return b"".join(parts)
+
+
+def decode_telemetry(payload):
+    """Decodes a telemetry record into the same dictionary the JSON encoding produces.
+
+    Args:
+        payload (str): The encoded record.
+
+    Raises:
+        ValueError: If the record was encoded with an unknown layout version.
+
+    Returns:
+        dict: The telemetry.
+    """
+    fields = struct.unpack_from(FIXED_FORMAT, payload)
+    if fields[0] != TELEMETRY_VERSION:
+        raise ValueError("Unknown telemetry record version " + str(fields[0]))
+    (_, timestamp, lat, lng, alt,
+     dist_traveled, dist_to_home, airspeed, groundspeed, verticalspeed,
+     battery_voltage, battery_remaining, propulsion_battery, avionics_battery,
+     sonarrange, flags,
+     lifeline_status, lifeline_distance, lifeline_velocity,
+     gps_x, gps_y, gps_z, box_x, box_y, box_z,
+     message_count) = fields
+
+    messages = []
+    offset = FIXED_SIZE
+    for _ in range(message_count):
+        time_length, message_length = struct.unpack_from(MESSAGE_FORMAT, payload, offset)
+        offset += MESSAGE_HEADER_SIZE
+        message_time = payload[offset:offset + time_length].decode("utf-8")
+        offset += time_length
+        message = payload[offset:offset + message_length].decode("utf-8")
+        offset += message_length
+        messages.append({"time": message_time, "message": message})
+
+    return {
+        "timestamp": format_timestamp(timestamp),
+        "lat": lat,
+        "lng": lng,
+        "alt": alt,
+        "distTraveled": dist_traveled,
+        "DistToHome": dist_to_home,
+        "airspeed": airspeed,
+        "groundspeed": groundspeed,
+        "verticalspeed": verticalspeed,
+        "battery_voltage": battery_voltage,
+        "battery_remaining": battery_remaining,
+        "propulsion_battery": propulsion_battery,
+        "avionics_battery": avionics_battery,
+        "armed": bool(flags & FLAG_ARMED),
+        "drone_connected": bool(flags & FLAG_DRONE_CONNECTED),
+        "weather_vaning": bool(flags & FLAG_WEATHER_VANING),
+        "sonarrange": sonarrange,
+        "messages": messages,
+        "lifeline_status": lifeline_status,
+        "lifeline_distance": lifeline_distance,
+        "lifeline_velocity": lifeline_velocity,
+        "vision_geotag_gps": {"x": gps_x, "y": gps_y, "z": gps_z},
+        "vision_geotag_box": {"x": box_x, "y": box_y, "z": box_z},
+    }
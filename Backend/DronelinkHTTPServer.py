@@ -1,42 +1,69 @@
 from __future__ import division
 import math
+import copy
 import threading
+import multiprocessing
 import json
 import time
+from SocketServer import ThreadingMixIn
+from urlparse import urlparse, parse_qs
 from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
-from CommunicationScript.MissionPlannerSocket import Commands
+from frame_recorder import RecordingReader
+from path_generation_pool import PathGenerationPool, PathGenerationBusy, generate_path, generate_search_area_waypoints
+from CommunicationScript.MissionPlannerSocket import Commands, MIN_TELEMETRY_RATE, MAX_TELEMETRY_RATE
 from SplineGenerator.SearchPathGenerator import Coord, Polygon
 import SplineGenerator.PointToPointPathGenerator as ptpPG
 import SplineGenerator.PathGenerator as path_generator
 import SplineGenerator.SearchPathGenerator as spliner
 from mav_enums import *
 
+HTTP_PORT = 8000
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    # Every request is handled on a thread of its own, so commands such as TOGGLE_ARM and CHANGE_DRONE_MODE are sent
+    # while a path is being generated instead of waiting behind it
+    daemon_threads = True
+
+
 class HTTPServerThread(threading.Thread):
-    def __init__(self, host, mp_socket, vision_websocket_url):
+    def __init__(self, host, mp_registry, vision_websocket_url, recording_directory=None, path_generation_pool=None):
         # host: IP of the host to run the server on.
-        # mp_socket: The MissionPlannerSocket that talks to Mission Planner.
+        # mp_registry: The MissionPlannerRegistry holding the MissionPlannerSocket of each vehicle.
         # vision_websocket_url: The WebSocket URL for Vision's Server for video feed.
+        # recording_directory: The directory the video feeds are recorded into, None if they are not recorded.
+        # path_generation_pool: The PathGenerationPool paths are generated on, created here if not given (it is best
+        #                       created before any thread is started, see PathGenerationPool).
         threading.Thread.__init__(self)
         self.server = None
         self.host = host
-        self.mp_socket = mp_socket
+        self.mp_registry = mp_registry
         self.vision_websocket_url = vision_websocket_url
-        global mp_sock
-        mp_sock = mp_socket
+        self.path_generation_pool = path_generation_pool if path_generation_pool is not None else PathGenerationPool()
+        global mp_reg
+        mp_reg = mp_registry
+        global path_pool
+        path_pool = self.path_generation_pool
+        global recordings
+        recordings = RecordingReader(recording_directory) if recording_directory is not None else None
 
     def run(self):
-        server_address = (self.host, 8000)
-        self.server = HTTPServer(server_address, ServerHandler)
+        server_address = (self.host, HTTP_PORT)
+        self.server = ThreadingHTTPServer(server_address, ServerHandler)
         self.server.serve_forever()
         print("[TERMINATION] Closed HTTPServerThread")
 
     def close(self):
         self.server.shutdown()
+        self.path_generation_pool.close()
 
 
 class ServerHandler(BaseHTTPRequestHandler):
     # Path generator class instance only instantiated once
     path_gen = path_generator.PathGenerator()
+    # Requests are handled on threads of their own, the path generator's parameters are only changed and copied with
+    # this held
+    path_gen_lock = threading.Lock()
 
     def do_HEAD(self):
         self.send_response(200)
@@ -60,7 +87,74 @@ class ServerHandler(BaseHTTPRequestHandler):
             "Origin, X-Requested-With, Content-Type, Accept",
         )
         self.end_headers()
+
+    def generate_path(self, path_generation_type):
+        # Generates a path on the path generation pool. The pool is sent a copy of the path generator, parameters that
+        # are updated while the path is being generated apply to the next path.
+        with self.path_gen_lock:
+            self.path_gen.path_generation_type = path_generation_type
+            path_gen = copy.deepcopy(self.path_gen)
+        return path_pool.run(generate_path, path_gen)
+
+    def do_GET(self):
+        # Plays back the recorded video feeds:
+        # GET /recordings                               The time span of each stream's recording, as JSON
+        # GET /recordings/<STREAM>?t=<ms since epoch>   The frame of a stream that was showing at a time, as a JPEG
+        # GET /recordings/<STREAM>?lat=<lat>&lng=<lng>  The frame of a stream captured closest to a position
+        url = urlparse(self.path)
+        parts = [part for part in url.path.split("/") if part]
+        if not parts or parts[0] != "recordings" or len(parts) > 2:
+            self.send_RESPONSE(404, message="Not found.")
+            return
+        if recordings is None:
+            self.send_RESPONSE(404, message="Recording is not enabled, start the server with --record DIRECTORY.")
+            return
+        if len(parts) == 1:
+            body = json.dumps(dict((stream, recordings.summary(stream)) for stream in recordings.streams()))
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("Access-Control-Allow-Origin", "*")
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        query = parse_qs(url.query)
+        try:
+            if "lat" in query and "lng" in query:
+                frame = recordings.nearest(parts[1], float(query["lat"][0]), float(query["lng"][0]))
+            else:
+                frame = recordings.frame_at(parts[1], int(query["t"][0]) if "t" in query else int(time.time() * 1000))
+        except ValueError:
+            self.send_RESPONSE(400, message="t, lat and lng must be numbers.")
+            return
+        if frame is None:
+            self.send_RESPONSE(404, message="No frames of " + parts[1] + " have been recorded.")
+            return
+        capture_time, latitude, longitude, jpeg = frame
+        self.send_response(200)
+        self.send_header("Content-Type", "image/jpeg")
+        self.send_header("Content-Length", str(len(jpeg)))
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Access-Control-Expose-Headers", "X-Frame-Time, X-Frame-Lat, X-Frame-Lng")
+        self.send_header("X-Frame-Time", str(capture_time))
+        if latitude is not None and longitude is not None:
+            self.send_header("X-Frame-Lat", repr(latitude))
+            self.send_header("X-Frame-Lng", repr(longitude))
+        self.end_headers()
+        self.wfile.write(jpeg)
+
     def do_POST(self):
+        # Path generation runs on the path generation pool, the request fails if the pool is full or the path takes
+        # too long
+        try:
+            self.handle_POST()
+        except PathGenerationBusy as e:
+            self.send_RESPONSE(503, message=str(e))
+        except multiprocessing.TimeoutError:
+            self.send_RESPONSE(504, message="Path generation did not finish in time.")
+
+    def handle_POST(self):
         # Get the message from API client
         content_length = int(self.headers.getheader("content-length", 0))
         post_message = self.rfile.read(content_length)
@@ -71,6 +165,12 @@ class ServerHandler(BaseHTTPRequestHandler):
 
         # Run command
         command = parsed_content["command"]
+        # Route the command to the vehicle it names, or the default vehicle
+        vehicle_id = parsed_content.get("vehicle_id")
+        mp_sock = mp_reg.get(vehicle_id)
+        if mp_sock is None and command != "CONNECTIP":
+            self.send_RESPONSE(400, message="Vehicle " + str(vehicle_id) + " is not connected.")
+            return
 
         if command == Commands.PLANE_PARAMETER_UPDATE:
             # Go through each parameter and update it if it is not None
@@ -96,114 +196,112 @@ class ServerHandler(BaseHTTPRequestHandler):
             target_circle_radius_key = "target_circle_radius"               # float in metres
             minimum_distance_to_start_key = "minimum_distance_to_start"     # float in metres
             times_to_circle_key = "times_to_circle"                         # float
+            cross_track_error_ratio_key = "cross_track_error_ratio"         # float, fraction of minimum_turn_radius
+
+            # Parameters are never changed while a path generation request is copying them
+            with self.path_gen_lock:
+                # Common data
+                if take_off_point_key in parsed_content:
+                    self.path_gen.take_off_point = Coord(lat=parsed_content[take_off_point_key]["lat"], lon=parsed_content[take_off_point_key]["long"])
+                if do_plot_key in parsed_content:
+                    self.path_gen.do_plot = parsed_content[do_plot_key]
+
+                # Common parameters
+                if minimum_turn_radius_key in parsed_content:
+                    self.path_gen.minimum_turn_radius = parsed_content[minimum_turn_radius_key]  # Metres
+                if curve_resolution_key in parsed_content:
+                    self.path_gen.curve_resolution = parsed_content[curve_resolution_key]  # Waypoints per metre on a curve
+                if altitude_key in parsed_content:
+                    self.path_gen.alt = parsed_content[altitude_key]  # Altitude to print plots at
+                if cross_track_error_ratio_key in parsed_content:
+                    self.path_gen.cross_track_error_ratio = parsed_content[cross_track_error_ratio_key]
+
+                # Search area specific data
+                if search_area_key in parsed_content:
+                    coord_list = []
+                    for point in parsed_content[search_area_key]:
+                        coord_list.append(Coord(lat=point["lat"], lon=point["long"]))
+                    self.path_gen.search_area = Polygon(coord_list)
+
+                # Search area specific parameters
+                if sensor_size_key in parsed_content:
+                    width = parsed_content[sensor_size_key]["width"]
+                    height = parsed_content[sensor_size_key]["height"]
+                    self.path_gen.sensor_size = (width, height)
+                if focal_length_key in parsed_content:
+                    self.path_gen.focal_length = parsed_content[focal_length_key]
+                if paint_overlap_key in parsed_content:
+                    self.path_gen.paint_overlap = parsed_content[paint_overlap_key]
+                if paint_radius_key in parsed_content:
+                    self.path_gen.paint_radius = parsed_content[paint_radius_key]
+                if layer_distance_key in parsed_content:
+                    self.path_gen.layer_distance = parsed_content[layer_distance_key]
+                if orientation_key in parsed_content:
+                    self.path_gen.orientation = parsed_content[orientation_key]
 
-            # Common data
-            if take_off_point_key in parsed_content:
-                self.path_gen.take_off_point = Coord(lat=parsed_content[take_off_point_key]["lat"], lon=parsed_content[take_off_point_key]["long"])
-            if do_plot_key in parsed_content:
-                self.path_gen.do_plot = parsed_content[do_plot_key]
-
-            # Common parameters
-            if minimum_turn_radius_key in parsed_content:
-                self.path_gen.minimum_turn_radius = parsed_content[minimum_turn_radius_key]  # Metres
-            if curve_resolution_key in parsed_content:
-                self.path_gen.curve_resolution = parsed_content[curve_resolution_key]  # Waypoints per metre on a curve
-            if altitude_key in parsed_content:
-                self.path_gen.alt = parsed_content[altitude_key]  # Altitude to print plots at
-
-            # Search area specific data
-            if search_area_key in parsed_content:
-                coord_list = []
-                for point in parsed_content[search_area_key]:
-                    coord_list.append(Coord(lat=point["lat"], lon=point["long"]))
-                self.path_gen.search_area = Polygon(coord_list)
-
-            # Search area specific parameters
-            if sensor_size_key in parsed_content:
-                width = parsed_content[sensor_size_key]["width"]
-                height = parsed_content[sensor_size_key]["height"]
-                self.path_gen.sensor_size = (width, height)
-            if focal_length_key in parsed_content:
-                self.path_gen.focal_length = parsed_content[focal_length_key]
-            if paint_overlap_key in parsed_content:
-                self.path_gen.paint_overlap = parsed_content[paint_overlap_key]
-            if paint_radius_key in parsed_content:
-                self.path_gen.paint_radius = parsed_content[paint_radius_key]
-            if layer_distance_key in parsed_content:
-                self.path_gen.layer_distance = parsed_content[layer_distance_key]
-            if orientation_key in parsed_content:
-                self.path_gen.orientation = parsed_content[orientation_key]
-
-            # Point-to-point specific data
-            if waypoints_key in parsed_content:
-                waypoints = []
-                for point in parsed_content[waypoints_key]:
-                    waypoints.append(ptpPG.Waypoint(x=point["lat"], y=point["long"]))
-                self.path_gen.waypoints = waypoints
-            if boundary_points_key in parsed_content:
-                waypoints = []
-                for point in parsed_content[boundary_points_key]:
-                    waypoints.append(Coord(lat=point["lat"], lon=point["long"]))
-                self.path_gen.boundary_points = waypoints
-
-            # Point-to-point specific parameters
-            if boundary_resolution_key in parsed_content:
-                self.path_gen.boundary_resolution = parsed_content[boundary_resolution_key]
-            if boundary_tolerance_key in parsed_content:
-                self.path_gen.boundary_tolerance = parsed_content[boundary_tolerance_key]
-
-            # Target specific parameters
-            if plane_location_key in parsed_content:
-                self.path_gen.plane_location = Coord(lat=parsed_content[plane_location_key]["lat"], lon=parsed_content[plane_location_key]["long"])
-            if plane_bearing_key in parsed_content:
-                self.path_gen.plane_bearing = parsed_content[plane_bearing_key]
-            if target_location_key in parsed_content:
-                self.path_gen.target_location = Coord(lat=parsed_content[target_location_key]["lat"], lon=parsed_content[target_location_key]["long"])
-            if target_circle_radius_key in parsed_content:
-                self.path_gen.target_circle_radius = parsed_content[target_circle_radius_key]
-            if minimum_distance_to_start_key in parsed_content:
-                self.path_gen.minimum_distance_to_start = parsed_content[minimum_distance_to_start_key]
-            if times_to_circle_key in parsed_content:
-                self.path_gen.times_to_circle = parsed_content[times_to_circle_key]
+                # Point-to-point specific data
+                if waypoints_key in parsed_content:
+                    waypoints = []
+                    for point in parsed_content[waypoints_key]:
+                        waypoints.append(ptpPG.Waypoint(x=point["lat"], y=point["long"]))
+                    self.path_gen.waypoints = waypoints
+                if boundary_points_key in parsed_content:
+                    waypoints = []
+                    for point in parsed_content[boundary_points_key]:
+                        waypoints.append(Coord(lat=point["lat"], lon=point["long"]))
+                    self.path_gen.boundary_points = waypoints
+
+                # Point-to-point specific parameters
+                if boundary_resolution_key in parsed_content:
+                    self.path_gen.boundary_resolution = parsed_content[boundary_resolution_key]
+                if boundary_tolerance_key in parsed_content:
+                    self.path_gen.boundary_tolerance = parsed_content[boundary_tolerance_key]
+
+                # Target specific parameters
+                if plane_location_key in parsed_content:
+                    self.path_gen.plane_location = Coord(lat=parsed_content[plane_location_key]["lat"], lon=parsed_content[plane_location_key]["long"])
+                if plane_bearing_key in parsed_content:
+                    self.path_gen.plane_bearing = parsed_content[plane_bearing_key]
+                if target_location_key in parsed_content:
+                    self.path_gen.target_location = Coord(lat=parsed_content[target_location_key]["lat"], lon=parsed_content[target_location_key]["long"])
+                if target_circle_radius_key in parsed_content:
+                    self.path_gen.target_circle_radius = parsed_content[target_circle_radius_key]
+                if minimum_distance_to_start_key in parsed_content:
+                    self.path_gen.minimum_distance_to_start = parsed_content[minimum_distance_to_start_key]
+                if times_to_circle_key in parsed_content:
+                    self.path_gen.times_to_circle = parsed_content[times_to_circle_key]
 
         """Handle the different path generation types"""
         if command == Commands.PATH_GENERATION_SEARCH_AREA:
-            self.path_gen.path_generation_type = path_generator.PathGenerationType.SEARCH_AREA
-            path_points = self.path_gen.generate_path()
+            path_points = self.generate_path(path_generator.PathGenerationType.SEARCH_AREA)
             if path_points is not None:
                 mp_sock.override_flightplanner_waypoints(path_points, takeoff_alt=parsed_content['takeoff_alt'], vtol_transition_mode=parsed_content['vtol_transition_mode'])
             else:
                 print("Path points are None, no solution found...")
         if command == Commands.PATH_GENERATION_POINT_TO_POINT:
-            self.path_gen.path_generation_type = path_generator.PathGenerationType.POINT_TO_POINT
-            path_points = self.path_gen.generate_path()
+            path_points = self.generate_path(path_generator.PathGenerationType.POINT_TO_POINT)
             if path_points is not None:
                 mp_sock.override_flightplanner_waypoints(path_points, takeoff_alt=parsed_content['takeoff_alt'], vtol_transition_mode=parsed_content['vtol_transition_mode'])
             else:
                 print("Path points are None, no solution found...")
         if command == Commands.PATH_GENERATION_FLY_TO_CIRCLE_TARGET:
-            self.path_gen.path_generation_type = path_generator.PathGenerationType.FLY_TO_CIRCLE_TARGET
-            path_points = self.path_gen.generate_path()
+            path_points = self.generate_path(path_generator.PathGenerationType.FLY_TO_CIRCLE_TARGET)
             if path_points is not None:
                 mp_sock.override_flightplanner_waypoints(path_points, takeoff_alt=parsed_content['takeoff_alt'])
             else:
                 print("Path points are None, no solution found...")
         if command == Commands.PATH_GENERATION_FLY_TO_TARGET_PAYLOAD:
-            self.path_gen.path_generation_type = path_generator.PathGenerationType.FLY_TO_TARGET_PAYLOAD
-            path_points = self.path_gen.generate_path()
+            path_points = self.generate_path(path_generator.PathGenerationType.FLY_TO_TARGET_PAYLOAD)
             if path_points is not None:
                 mp_sock.override_flightplanner_waypoints(path_points, do_RTL=True)
             else:
                 print("Path points are None, no solution found...")
 
         if command == Commands.OVERRIDE_FLIGHTPLANNER:
-            # Make instance of SearchPathGenerator
-            waypoint_spliner = spliner.SearchPathGenerator()
+            # The search path starts from where the drone is
             drone_lat = parsed_content['drone_location']['lat']
             drone_lng= parsed_content['drone_location']['long']
             start_pt =spliner.Coord(drone_lat, drone_lng) or spliner.Coord(-38.60999173825976, 143.0401757724082)
-            # Give arguments
-            waypoint_spliner.set_search_area(parsed_content['waypoints'])
             
 
             #USE THESE IF YOU WANT TO TEST USING METRES
@@ -218,30 +316,21 @@ class ServerHandler(BaseHTTPRequestHandler):
             scaled_curve_resolution = curve_resolution * scale_factor
             print("stuff we give to waypoint algo: start_drone_lat: ", drone_lat, "start_drone_long: ", drone_lng, "turn_radius: ", turn_radius, "waypoints:", parsed_content['waypoints'], "scaled_turn_radius:",scaled_turn_radius,"scaled_layer_distance:",scaled_layer_distance, "scaled_curve_resolution=", scaled_curve_resolution)
 
-            waypoint_spliner.set_parameters(minimum_turn_radius=scaled_turn_radius,     # The minimum turn radius of the plane
-                                            layer_distance=scaled_layer_distance,           # Distance between layers on map. Use this or both focal length and sensor size, not all three
-                                            curve_resolution=1000,             # How many waypoints per metre for curves
-                                            start_point=start_pt,               # Where the plane takes off from. Leave as None if not known
-                                            focal_length=None,              # Focal length of the camera on board the plane in mm
-                                            sensor_size=None,               # Sensor size of the camera on board the plane as (width, height) in mm
-                                            paint_overlap=0.2,               # The percentage of overlap desired for the camera to see on consecutive layers
-                                            alt=parsed_content['cruise_alt']                          # Default Alt to set waypoints to
-                                            )             
-
-            # Generate and save spline
-            waypoint_spliner.generate_search_area_path(do_plot=False)
-            splined_waypoints = waypoint_spliner.get_waypoints()  # A list of dictionaries with keys "long", "lat", and "alt" in order of flight
+            # Generate and save spline on the path generation pool, a list of dictionaries with keys "long", "lat", and "alt" in order of flight
+            splined_waypoints = path_pool.run(generate_search_area_waypoints, parsed_content['waypoints'], start_pt,
+                                              scaled_turn_radius, scaled_layer_distance, parsed_content['cruise_alt'],
+                                              self.path_gen.cross_track_error_ratio * turn_radius)
             mp_sock.override_flightplanner_waypoints(splined_waypoints, takeoff_alt=parsed_content['takeoff_alt'], vtol_transition_mode=parsed_content['vtol_transition_mode'], do_RTL=True)
             # mp_socket.override_flightplanner_waypoints(parsed_content['waypoints'], parsed_content['takeoff_alt'])
             print("Executed OVERRIDE FLIGHTPLANNER WAYPOINTS")
         elif command == Commands.DIRECT_WAYPOINTS:
             mp_sock.override_flightplanner_waypoints(parsed_content['waypoints'], takeoff_alt=parsed_content['takeoff_alt'],  vtol_transition_mode=parsed_content['vtol_transition_mode'], do_RTL=True)
         elif command == Commands.PATIENT_LOCATION:
-            HTTPCommand().patient_location(parsed_content['patient_location'])
+            HTTPCommand(mp_sock).patient_location(parsed_content['patient_location'])
         elif command == Commands.DROP_LOCATION:
-            HTTPCommand().drop_location(parsed_content['dropoff_coordinates'], parsed_content['cruise_alt'], parsed_content['transition_alt'], parsed_content['cardinal_approach'])
+            HTTPCommand(mp_sock).drop_location(parsed_content['dropoff_coordinates'], parsed_content['cruise_alt'], parsed_content['transition_alt'], parsed_content['cardinal_approach'])
         elif command == Commands.ASCEND_AND_RTL:
-            HTTPCommand().ascend_and_rtl(parsed_content['dropoff_coordinates'], parsed_content['cruise_alt'], parsed_content['transition_alt'], parsed_content['cardinal_direction'])
+            HTTPCommand(mp_sock).ascend_and_rtl(parsed_content['dropoff_coordinates'], parsed_content['cruise_alt'], parsed_content['transition_alt'], parsed_content['cardinal_direction'])
         elif command == Commands.SYNC_SCRIPT:
             mp_sock.sync_script()
             print("Executed SYNC SCRIPT")
@@ -256,8 +345,18 @@ class ServerHandler(BaseHTTPRequestHandler):
         elif command == Commands.CHANGE_DRONE_MODE:
             mp_sock.change_drone_mode(parsed_content['mode'])
             print("Executed CHANGE DRONE MODE TO: " + parsed_content['mode'])
+        elif command == Commands.SET_TELEMETRY_RATE:
+            rate = parsed_content.get('rate')
+            # A bool is an int, and Python 2 orders strings and lists after every number instead of raising
+            is_number = isinstance(rate, (int, long, float)) and not isinstance(rate, bool)
+            if is_number and MIN_TELEMETRY_RATE <= rate <= MAX_TELEMETRY_RATE:
+                mp_sock.set_telemetry_rate(rate)
+                print("Executed SET TELEMETRY RATE TO: " + str(rate) + " Hz")
+            else:
+                statusCode = 400
+                message = "Telemetry rate must be a number between " + str(MIN_TELEMETRY_RATE) + " and " + str(MAX_TELEMETRY_RATE) + " Hz."
         elif command == "CONNECTIP":
-            result = mp_sock.initialise_dronelink(parsed_content['ip'])
+            result = mp_reg.connect(parsed_content['ip'], vehicle_id=vehicle_id, port=parsed_content.get('port'))
             message = "Successfully connected to Mission Planner."
             if not result:
                 statusCode = 400
@@ -281,6 +380,10 @@ class ServerHandler(BaseHTTPRequestHandler):
         print("Request finished at:", time.ctime())
 
 class HTTPCommand():
+    def __init__(self, mp_sock):
+        # mp_sock: The MissionPlannerSocket of the vehicle that the command is for.
+        self.mp_sock = mp_sock
+
     def patient_location(self, patient_location):
         """PATIENT_LOCATION command which causes the plane to loiter around the given location
 
@@ -288,7 +391,7 @@ class HTTPCommand():
         :type patient_location: Dict
         """
         patient_location["id"] = 17
-        mp_sock.override_waypoints([patient_location], init_mode="LOITER", end_mode="AUTO")
+        self.mp_sock.override_waypoints([patient_location], init_mode="LOITER", end_mode="AUTO")
 
 
     def drop_location(self, dropoff_coordinates, cruise_alt, transition_alt, cardinal_approach):
@@ -316,7 +419,7 @@ class HTTPCommand():
         waypoints.append({"lat": dropoff_coordinates["lat"], "long": dropoff_coordinates["long"], "alt": transition_alt, "id": 16})
         # Dropoff location at deployment alt (given by user)
         waypoints.append(dropoff_coordinates)  
-        mp_sock.override_waypoints(waypoints, init_mode="LOITER", end_mode="AUTO")
+        self.mp_sock.override_waypoints(waypoints, init_mode="LOITER", end_mode="AUTO")
     
     def ascend_and_rtl(self, dropoff_coordinates, cruise_alt, transition_alt, cardinal_direction):
         """ASCEND_AND_RTL command which ascends the plane to the transition altitude, then transition into cruise, finally return to launch.
@@ -340,6 +443,6 @@ class HTTPCommand():
         waypoints.append({"lat": dropoff_coordinates["lat"] + cardinal_shift[cardinal_direction][0] * 0.005, "long":  dropoff_coordinates["long"] + cardinal_shift[cardinal_direction][1] * 0.005, "alt": cruise_alt, "id": 16})
         # RTL waypoint
         waypoints.append({"lat": 0, "long": 0, "alt": 0, "id": 20})
-        mp_sock.override_waypoints(waypoints, init_mode="LOITER", end_mode="AUTO")
+        self.mp_sock.override_waypoints(waypoints, init_mode="LOITER", end_mode="AUTO")
         
 
@@ -1,8 +1,11 @@
 from __future__ import print_function, division
 import socket
-from CommunicationScript.MissionPlannerSocket import MissionPlannerSocket
-from DronelinkHTTPServer import HTTPServerThread
+import sys
+from CommunicationScript.mission_planner_registry import MissionPlannerRegistry
+from DronelinkHTTPServer import HTTPServerThread, HTTP_PORT
 from DronelinkWebSocketServer import WebSocketThread
+from frame_recorder import FrameRecorder
+from path_generation_pool import PathGenerationPool
         
 
 def get_ip():
@@ -20,10 +23,13 @@ def get_ip():
 
 if __name__ == "__main__":
 
-    # Initialise Mission Planner Socket.
+    # Start the processes that paths are generated on before any thread is started, see PathGenerationPool.
+    path_generation_pool = PathGenerationPool()
+
+    # Initialise the Mission Planner Sockets, one per connected vehicle.
     MP_PORT = 7766
-    global mp_socket
-    mp_socket = MissionPlannerSocket(MP_PORT)
+    global mp_registry
+    mp_registry = MissionPlannerRegistry(MP_PORT)
     print("[INFO] Mission Planner Socket Initialised")
 
     # Get the IP of the device running the backend.
@@ -36,16 +42,35 @@ if __name__ == "__main__":
     IP = addr
     global vision_websocket_url
     vision_websocket_url = "wss://relay.uas.unexceptional.dev/relay/images/outbound"
+    # --vision-url ws://127.0.0.1:8090 receives the vision feed from another relay, e.g. vision_relay_standin.py
+    if "--vision-url" in sys.argv:
+        vision_websocket_url = sys.argv[sys.argv.index("--vision-url") + 1]
+
+    # With --record DIRECTORY the vision and FPV feeds are recorded, the HTTP server plays them back from /recordings
+    recording_directory = None
+    recorder = None
+    if "--record" in sys.argv:
+        recording_directory = sys.argv[sys.argv.index("--record") + 1]
+        def default_vehicle_position():
+            # Frames are recorded with the position of the default vehicle, when one is connected
+            mp_sock = mp_registry.get()
+            data = mp_sock.telemetry.data if mp_sock is not None else {}
+            return data.get("lat"), data.get("lng")
+        recorder = FrameRecorder(recording_directory, default_vehicle_position)
+        recorder.start()
 
     # Initialise Web Socket Server for real time data transfer.
-    web_socket_server = WebSocketThread(IP, mp_socket, vision_websocket_url)
+    # With --single-loop live data is sent from the WebSocket server's loop and vision frames are queued on it, the vision
+    # relay is still received and encoded on threads.
+    single_loop = "--single-loop" in sys.argv
+    web_socket_server = WebSocketThread(IP, mp_registry, vision_websocket_url, single_loop=single_loop, recorder=recorder)
     web_socket_server.start()
     print("[INFO] WebSocket Initialised on:", IP + ":" + str(8081))
 
     # HTTP Server
-    http_server = HTTPServerThread(IP, mp_socket, vision_websocket_url)
+    http_server = HTTPServerThread(IP, mp_registry, vision_websocket_url, recording_directory, path_generation_pool)
     http_server.start()
-    print("[INFO] HTTP Server Initialised on:", IP + ":" + str(8000))
+    print("[INFO] HTTP Server Initialised on:", IP + ":" + str(HTTP_PORT))
 
     try:
         a = raw_input("PRESS ENTER TO STOP SERVERS\n")
@@ -60,12 +85,16 @@ if __name__ == "__main__":
         except:
             pass
         try:
-            mp_socket.close()
+            mp_registry.close()
         except:
             pass
+        if recorder is not None:
+            recorder.close()
     
     # Wait until all threads are closed.
     web_socket_server.join()
     http_server.join()
+    if recorder is not None:
+        recorder.join()
     
     print("[TERMINATION] Dronelink Server Successfully Closed!")
\ No newline at end of file
@@ -1,38 +1,224 @@
 import threading
 import json
 import time
-import cv2
 import base64
-from SimpleWebSocketServer import SimpleWebSocketServer, WebSocket
-from sys import platform
+import struct
+import random
+from collections import deque
+from SimpleWebSocketServer import SimpleWebSocketServer, SimpleEpollWebSocketServer, WebSocket, HAS_EPOLL
+from client_registry import ClientRegistry
+from CommunicationScript.MissionPlannerSocket import MAX_TELEMETRY_RATE
+from frame_sources import CameraSource
+from rendition_pool import RenditionPool, encode_frame, reencode_jpeg
 import websocket
 import rel
 
+# Video and LIVE_DATA frames are queued per stream with SimpleWebSocketServer.broadcast, a slow client only gets the
+# newest frame of each stream. Chat messages are always delivered.
+# Binary video frames (opcode 2) are a header followed by the raw JPEG, sent to clients that asked for them with
+# {"command": "BINARY_VIDEO"}. Other clients keep receiving base64 JPEGs in FPV_CAM / VISION_CAM JSON messages.
+VIDEO_FRAME_HEADER_FORMAT = "!BIQ" # stream id, sequence number, capture timestamp (ms since epoch)
+VIDEO_FRAME_HEADER_SIZE = struct.calcsize(VIDEO_FRAME_HEADER_FORMAT)
+VIDEO_STREAM_FPV = 1
+VIDEO_STREAM_VISION = 2
+VIDEO_STREAM_COMMANDS = {VIDEO_STREAM_FPV: "FPV_CAM", VIDEO_STREAM_VISION: "VISION_CAM"} # The JSON command of each stream
+
+# Clients only receive the topics they are subscribed to, every topic by default. They change their subscriptions with
+# {"command": "SUBSCRIBE", "topics": [...], "rate": 2} and {"command": "UNSUBSCRIBE", "topics": [...]}, where the
+# optional rate (Hz) downsamples LIVE_DATA for that client.
+TOPIC_LIVE_DATA = "LIVE_DATA"
+TOPIC_FPV_CAM = "FPV_CAM"
+TOPIC_VISION_CAM = "VISION_CAM"
+TOPICS = [TOPIC_LIVE_DATA, TOPIC_FPV_CAM, TOPIC_VISION_CAM]
+VIDEO_STREAM_TOPICS = {VIDEO_STREAM_FPV: TOPIC_FPV_CAM, VIDEO_STREAM_VISION: TOPIC_VISION_CAM}
+MIN_LIVE_DATA_RATE = 0.1 # Hz, the slowest LIVE_DATA rate a client can ask for
+MAX_LIVE_DATA_RATE = MAX_TELEMETRY_RATE # Hz, Mission Planner never sends live data faster
+
+# Video is sent to each client in the rendition it subscribed to with {"command": "SUBSCRIBE", "topics": ["VISION_CAM"],
+# "rendition": "thumb"}, full size by default. Only the renditions that some client receives are encoded, once per
+# frame and side by side on a RenditionPool.
+RENDITION_FULL = "full"
+RENDITION_HALF = "half"
+RENDITION_THUMB = "thumb"
+RENDITIONS = [RENDITION_FULL, RENDITION_HALF, RENDITION_THUMB]
+# The scale and highest JPEG quality of each rendition, the full rendition is the feed's own frame
+RENDITION_SIZES = {RENDITION_FULL: (1, 100), RENDITION_HALF: (0.5, 60), RENDITION_THUMB: (0.25, 50)}
+
+VISION_RELAY_TIMEOUT = 5 # Seconds to wait for the vision relay to accept a connection
+VISION_RECONNECT_MIN = 1 # Seconds before the first reconnection attempt, doubled after every failed attempt
+VISION_RECONNECT_MAX = 30 # The longest wait (s) between reconnection attempts
+VISION_HEALTH_INTERVAL = 2 # Seconds between VISION_HEALTH messages
+VISION_STALL_TIMEOUT = 10 # Seconds without a frame before a connected relay is reported as stalled
+# The states of the vision relay sent in VISION_HEALTH messages
+VISION_CONNECTING = "CONNECTING"
+VISION_CONNECTED = "CONNECTED"
+VISION_STALLED = "STALLED"
+VISION_BACKOFF = "BACKOFF"
+VISION_CLOSED = "CLOSED"
+LIVE_DATA_HEARTBEAT = 1 # Seconds between LIVE_DATA frames of a vehicle that is not publishing telemetry
+
+# The FPV feed is captured at FPV_FPS. While the slowest client is sent fewer than FPV_DRAIN_LOW of the frames queued to
+# it, the JPEG quality and then the scale is stepped down the lists below, once every FPV_ADAPT_INTERVAL seconds. It is
+# stepped back up after every client was sent at least FPV_DRAIN_HIGH of its frames for FPV_STEP_UP_INTERVALS in a row.
+FPV_FPS = 10
+FPV_QUALITIES = [70, 60, 50, 40, 30, 20]
+FPV_SCALES = [1, 0.75, 0.5]
+FPV_ADAPT_INTERVAL = 1
+FPV_DRAIN_LOW = 0.8
+FPV_DRAIN_HIGH = 0.95
+FPV_STEP_UP_INTERVALS = 3
+FRAME_TIMINGS_KEPT = 100 # The timings kept of the latest frames of each video stream, sent with STREAM_STATS
+
+frame_timings = dict((stream_id, deque(maxlen=FRAME_TIMINGS_KEPT)) for stream_id in VIDEO_STREAM_COMMANDS)
+
+
+def subscribed_renditions(stream_id):
+    """Gets the renditions of a video stream that its subscribers receive.
+
+    Args:
+        stream_id (int): VIDEO_STREAM_FPV or VIDEO_STREAM_VISION.
+
+    Returns:
+        List[str]: The renditions, in the order of RENDITIONS.
+    """
+    topic = VIDEO_STREAM_TOPICS[stream_id]
+    subscribed = set(state.renditions.get(topic, RENDITION_FULL) for state in client_registry.subscribers(topic))
+    return [rendition for rendition in RENDITIONS if rendition in subscribed]
+
+
+def subscription_error(command, parsed_content):
+    """Validates a SUBSCRIBE or UNSUBSCRIBE message.
+
+    Args:
+        command (str): SUBSCRIBE or UNSUBSCRIBE.
+        parsed_content (dict): The message.
+
+    Returns:
+        str: Why the message is invalid, or None if it is valid.
+    """
+    topics = parsed_content.get("topics") or TOPICS
+    if not isinstance(topics, list):
+        return "topics must be a list of topics."
+    unknown = [topic for topic in topics if topic not in TOPICS]
+    if unknown:
+        return "Unknown topics: " + ", ".join(map(str, unknown))
+    if command != "SUBSCRIBE":
+        return None
+    rendition = parsed_content.get("rendition")
+    if rendition is not None and rendition not in RENDITIONS:
+        return "rendition must be one of: " + ", ".join(RENDITIONS)
+    rate = parsed_content.get("rate")
+    # A bool is an int, and Python 2 orders strings and lists after every number instead of raising
+    if rate is not None and (not isinstance(rate, (int, long, float)) or isinstance(rate, bool) or
+                             not MIN_LIVE_DATA_RATE <= rate <= MAX_LIVE_DATA_RATE):
+        return "rate must be a number of Hz between " + str(MIN_LIVE_DATA_RATE) + " and " + str(MAX_LIVE_DATA_RATE) + "."
+    return None
+
+
+def broadcast_video_frame(server, stream_id, sequence, capture_time, renditions, onsend=None):
+    """Sends a video frame to every subscribed client in the rendition it subscribed to, as a binary frame or as JSON
+    depending on what the client asked for. Each encoding is only built if a client wants it.
+
+    Args:
+        server (SimpleWebSocketServer): The server the clients are connected to.
+        stream_id (int): VIDEO_STREAM_FPV or VIDEO_STREAM_VISION.
+        sequence (int): The sequence number of the frame in its stream.
+        capture_time (float): Seconds since epoch of when the frame was captured.
+        renditions (dict): The JPEG of each rendition that was encoded. Clients that subscribed to another rendition
+            since the frame was encoded are sent the next frame.
+        onsend (function, optional): Called with each client once the frame is being sent to it. Defaults to None.
+
+    Returns:
+        List[WebSocket]: The clients the frame was queued to.
+    """
+    binary_clients = dict((rendition, []) for rendition in renditions)
+    text_clients = dict((rendition, []) for rendition in renditions)
+    topic = VIDEO_STREAM_TOPICS[stream_id]
+    for state in client_registry.subscribers(topic):
+        rendition = state.renditions.get(topic, RENDITION_FULL)
+        if rendition not in renditions:
+            continue
+        state.frames_queued[topic] += 1
+        if state.binary_video:
+            binary_clients[rendition].append(state.client)
+        else:
+            text_clients[rendition].append(state.client)
+    header = None
+    queued = []
+    for rendition, jpeg in renditions.items():
+        # A client only receives one rendition of a stream, so every rendition is queued on the same stream
+        if binary_clients[rendition]:
+            if header is None:
+                header = struct.pack(VIDEO_FRAME_HEADER_FORMAT, stream_id, sequence & 0xFFFFFFFF, int(capture_time * 1000))
+            server.broadcast((header, jpeg), binary_clients[rendition], stream=VIDEO_STREAM_COMMANDS[stream_id],
+                             onsend=onsend)
+        if text_clients[rendition]:
+            # convert image to base64 before sending
+            data = {"command": VIDEO_STREAM_COMMANDS[stream_id], "rendition": rendition,
+                    "image": "data:image/jpg;base64," + base64.b64encode(jpeg)}
+            # base64 JPEGs barely compress, so they are not deflated
+            server.broadcast(json.dumps(data), text_clients[rendition], stream=VIDEO_STREAM_COMMANDS[stream_id],
+                             onsend=onsend, compress=False)
+        queued.extend(binary_clients[rendition])
+        queued.extend(text_clients[rendition])
+    return queued
+
+
+def reconnect_delay(failures):
+    """Gets how long to wait before reconnecting, doubling with every failed attempt up to VISION_RECONNECT_MAX.
+    The delay is randomised between half and all of that so that reconnections do not happen in lockstep.
+
+    Args:
+        failures (int): The number of failed attempts in a row.
+
+    Returns:
+        float: The delay in seconds.
+    """
+    delay = min(VISION_RECONNECT_MAX, VISION_RECONNECT_MIN * 2 ** max(0, failures - 1))
+    return random.uniform(delay / 2.0, delay)
+
+
 class WebSocketThread(threading.Thread):
-    def __init__(self, host, mp_socket, vision_websocket_url):
+    def __init__(self, host, mp_registry, vision_websocket_url, single_loop=False, recorder=None):
         # host: IP of the host to run the server on.
-        # mp_socket: The MissionPlannerSocket that talks to Mission Planner.
+        # mp_registry: The MissionPlannerRegistry holding the MissionPlannerSocket of each vehicle.
         # vision_websocket_url: The WebSocket URL for Vision's Server for video feed.
+        # single_loop: Run the live data and vision feeds as tasks on the WebSocket server's loop instead of threads.
+        # recorder: The FrameRecorder that the video feeds are recorded with, None to not record them.
         threading.Thread.__init__(self)
         self.server = None
         self.live_data_thread = None
         self.host = host
-        self.mp_socket = mp_socket
+        self.mp_registry = mp_registry
         self.vision_websocket_url = vision_websocket_url
-        global clients
-        clients = []
-        global clientData
-        clientData = []
+        self.single_loop = single_loop
+        self.recorder = recorder
+        self.rendition_pool = None
+        global client_registry
+        client_registry = ClientRegistry(TOPICS)
 
 
     def run(self):
-        self.server = SimpleWebSocketServer(self.host, 8081, WebSocketServer)
-        self.live_data_thread = LiveDataThread(self.mp_socket)
-        self.fpv_feed_thread = FPVFeedThread()
-        self.vision_feed_thread = VisionFeedThread(self.vision_websocket_url)
-        self.live_data_thread.start()
-        # self.fpv_feed_thread.start()
-        self.vision_feed_thread.start()
+        # epoll only visits busy clients and sends frames as soon as they are queued, select is used on Windows
+        if HAS_EPOLL:
+            self.server = SimpleEpollWebSocketServer(self.host, 8081, WebSocketServer)
+        else:
+            self.server = SimpleWebSocketServer(self.host, 8081, WebSocketServer)
+        self.live_data_thread = LiveDataThread(self.server, self.mp_registry)
+        # The video feeds share the threads that encode their renditions
+        self.rendition_pool = RenditionPool()
+        self.fpv_feed_thread = FPVFeedThread(self.server, recorder=self.recorder, rendition_pool=self.rendition_pool)
+        self.vision_feed_thread = VisionFeedThread(self.server, self.vision_websocket_url, recorder=self.recorder,
+                                                   rendition_pool=self.rendition_pool)
+        if self.single_loop:
+            # Every frame is queued on the thread that sends it, so the clients' queues are never contended. The
+            # vision relay is still received and encoded on threads, which only hand finished frames to the loop
+            self.live_data_thread.run_on_loop()
+            self.vision_feed_thread.run_on_loop()
+        else:
+            self.live_data_thread.start()
+            # self.fpv_feed_thread.start()
+            self.vision_feed_thread.start()
         try:
             self.server.serveforever()
         except:
@@ -45,159 +231,631 @@ class WebSocketThread(threading.Thread):
         if self.server is not None:
             self.server.close()
         try:
-            self.live_data_thread.close()
-            self.camera_feed_thread.close()
-            self.vision_feed_thread.close()
-            self.live_data_thread.join()
-            self.camera_feed_thread.join()
-            self.vision_feed_thread.join()
+            threads = [self.live_data_thread, self.fpv_feed_thread, self.vision_feed_thread]
+            for thread in threads:
+                thread.close()
+            for thread in threads:
+                if thread.is_alive():
+                    thread.join()
+            self.rendition_pool.close()
         except:
             pass
         
 
 class WebSocketServer(WebSocket):
     def handleMessage(self):
-        for client in clients:
-            if client != self:
-                client.sendMessage(self.address[0] + u' - ' + self.data)
+        # Clients set their options with JSON commands, anything else is relayed to the other clients
+        try:
+            parsed_content = json.loads(self.data)
+        except ValueError:
+            parsed_content = None
+        if isinstance(parsed_content, dict):
+            command = parsed_content.get("command")
+            if command == "SELECT_VEHICLES":
+                # Choose which vehicles live data is received for with {"command": "SELECT_VEHICLES", "vehicle_ids": [...]}
+                client_registry.get(self).vehicle_ids = [str(vehicle_id) for vehicle_id in parsed_content.get("vehicle_ids", [])]
+                return
+            if command == "BINARY_VIDEO":
+                # Receive video as binary frames instead of base64 in JSON with {"command": "BINARY_VIDEO"}
+                client_registry.get(self).binary_video = parsed_content.get("enabled", True)
+                return
+            if command == "SUBSCRIBE" or command == "UNSUBSCRIBE":
+                self.update_subscriptions(command, parsed_content)
+                return
+            if command == "GET_STREAM_STATS":
+                # Frames of each topic queued to this client, of each stream dropped because it could not keep up
+                # and the capture, encode and send times of the latest video frames
+                self.sendMessage(json.dumps({"command": "STREAM_STATS", "dropped": dict(self.dropped),
+                                             "queued": dict(client_registry.get(self).frames_queued),
+                                             "frame_timings": dict((VIDEO_STREAM_COMMANDS[stream_id], list(timings))
+                                                                   for stream_id, timings in frame_timings.items())}))
+                return
+        for state in client_registry.snapshot():
+            if state.client != self:
+                state.client.sendMessage(self.address[0] + u' - ' + self.data)
+
+    def update_subscriptions(self, command, parsed_content):
+        # Subscribes to or unsubscribes from the given topics (every topic if none are given). Every field is validated
+        # before any is applied, a message with an error changes nothing
+        error = subscription_error(command, parsed_content)
+        if error is not None:
+            self.sendMessage(json.dumps({"command": "ERROR", "message": error}))
+            return
+        topics = parsed_content.get("topics") or TOPICS
+        state = client_registry.get(self)
+        if command == "SUBSCRIBE":
+            state.topics.update(topics)
+            rendition = parsed_content.get("rendition")
+            if rendition is not None:
+                # The rendition applies to the video topics subscribed to
+                for topic in topics:
+                    if topic in VIDEO_STREAM_TOPICS.values():
+                        state.renditions[topic] = rendition
+            if TOPIC_LIVE_DATA in topics:
+                # None sends LIVE_DATA at the full rate
+                state.live_data_rate = parsed_content.get("rate")
+        else:
+            state.topics.difference_update(topics)
 
     def handleConnected(self):
         print('[WEBSOCKET] ' + str(self.address) + ' connected')
-        for client in clients:
-            client.sendMessage(self.address[0] + u' - connected')
-        clients.append(self)
-        clientData.append({'messagesCount': 0})
+        for state in client_registry.snapshot():
+            state.client.sendMessage(self.address[0] + u' - connected')
+        client_registry.join(self)
 
     def handleClose(self):
-        index = clients.index(self)
-        clients.pop(index)
-        clientData.pop(index)
+        client_registry.leave(self)
         print('[WEBSOCKET] ' + str(self.address) + ' closed')
-        for client in clients:
-            client.sendMessage(self.address[0] + u' - disconnected')
+        for state in client_registry.snapshot():
+            state.client.sendMessage(self.address[0] + u' - disconnected')
 
 
 class LiveDataThread(threading.Thread):
     # Sends Live data taken from Mission Planner to all self.clients connected via WebSockets.
-    def __init__(self, mp_socket):
-        # clients: The WebSocket clients list
-        # mp_socket: The MissionPlannerSocket that talks to Mission Planner.
+    # Every telemetry snapshot a vehicle publishes wakes this thread up to send it, the snapshot of every vehicle is
+    # also sent every LIVE_DATA_HEARTBEAT seconds so that new clients and links that are not receiving telemetry are
+    # kept up to date.
+    def __init__(self, server, mp_registry):
+        # server: The SimpleWebSocketServer the clients are connected to.
+        # mp_registry: The MissionPlannerRegistry holding the MissionPlannerSocket of each vehicle.
         threading.Thread.__init__(self)
         self.quit = False
-        self.data_interval = 1 # second
-        self.mp_socket = mp_socket
+        self.server = server
+        self.mp_registry = mp_registry
+        self.wakeup = threading.Event()
+        self.wake = self.wakeup.set # Replaced in single loop mode
+        self.tick_scheduled = False
+        self.heartbeat_due = False
+        self.sent_versions = {} # The version of the last snapshot sent for each vehicle
+        mp_registry.add_telemetry_listener(self.published)
 
     def run(self):
+        self.server.callSoon(self.heartbeat)
         while not self.quit:
-            self.mp_socket.live_data_mutex.acquire()
-            data = self.mp_socket.live_data
-            data["ip"] = self.mp_socket.HOST
-            # print("live_data:", data)
-            for index, client in enumerate(clients):
-                messages_to_send = []
-                # print(self.clientData[index]['messagesCount'])
-                # Send messages to keep client up to date. If the difference is more than 200, send the latest 200 only
-                if len(self.mp_socket.messages) - clientData[index]['messagesCount'] > 200:
-                    message_index_to_send_from = len(self.mp_socket.messages) - 200
-                else:
-                    message_index_to_send_from = clientData[index]['messagesCount']
-                messages_to_send = self.mp_socket.messages[message_index_to_send_from:]
-                clientData[index]['messagesCount'] = len(self.mp_socket.messages)
-                # for message in self.mp_socket.messages[clientData[index]['messagesCount']:]:
-                #     clientData[index]['messagesCount'] = clientData[index]['messagesCount'] + 1
-                #     messages_to_send.append(message)
-                data['messages'] = messages_to_send
-                data['command'] = "LIVE_DATA"
-                client.sendMessage(json.dumps(data))
-                # print('data:',data)
-            self.mp_socket.live_data_mutex.release()
-            time.sleep(self.data_interval)
+            # Waiting without a timeout blocks on a lock, a timed wait would poll on Python 2
+            self.wakeup.wait()
+            self.wakeup.clear()
+            self.tick()
         print("[TERMINATION] Closed LiveDataThread")
 
+    def run_on_loop(self):
+        # Single loop mode: sends live data from callbacks on the WebSocket server's loop instead of this thread
+        def tick():
+            self.tick_scheduled = False
+            if not self.quit:
+                self.tick()
+        def wake():
+            # Telemetry published while a tick is waiting to run is sent by that tick
+            if not self.tick_scheduled:
+                self.tick_scheduled = True
+                self.server.callSoon(tick)
+        self.wake = wake
+        self.server.callSoon(self.heartbeat)
+
+    def published(self, vehicle_id, snapshot):
+        # Called on a vehicle's command thread whenever it publishes telemetry
+        self.wake()
+
+    def heartbeat(self):
+        # Runs on the WebSocket server's loop every LIVE_DATA_HEARTBEAT seconds
+        if self.quit:
+            return
+        self.heartbeat_due = True
+        self.wake()
+        self.server.callLater(LIVE_DATA_HEARTBEAT, self.heartbeat)
+
+    def tick(self):
+        # Sends the snapshots published since the last tick to the clients that are due them, every snapshot on a
+        # heartbeat
+        heartbeat = self.heartbeat_due
+        self.heartbeat_due = False
+        now = time.time()
+        for vehicle_id, mp_socket in self.mp_registry.snapshot():
+            snapshot = mp_socket.telemetry
+            if not heartbeat and self.sent_versions.get(vehicle_id) == snapshot.version:
+                continue
+            self.sent_versions[vehicle_id] = snapshot.version
+            self.send_snapshot(vehicle_id, mp_socket, snapshot, self.due_clients(now, vehicle_id))
+
+    def send_snapshot(self, vehicle_id, mp_socket, snapshot, due):
+        # Clients at the same message cursor get the same frame, so it is only encoded once per cursor. The frames are
+        # encoded without any lock held, the snapshot is never changed.
+        cursor_groups = {}
+        for state in due:
+            cursor_groups.setdefault(state.messages_cursors.get(vehicle_id, 0), []).append(state)
+        frames = [(cursor, group) + self.encode(vehicle_id, mp_socket, snapshot, cursor)
+                  for cursor, group in cursor_groups.items()]
+        # A LIVE_DATA frame that is replaced before it is sent is dropped, so a client's cursor only moves on once its
+        # frame is being sent. The server lock keeps that from happening while the frames are queued.
+        with self.server.lock:
+            for cursor, group, message, next_cursor in frames:
+                queued = []
+                for state in group:
+                    client_cursor = state.messages_cursors.get(vehicle_id, 0)
+                    if client_cursor == cursor:
+                        queued.append(state)
+                    else:
+                        # The client's previous frame was sent while this one was being encoded
+                        self.queue(vehicle_id, [state], *self.encode(vehicle_id, mp_socket, snapshot, client_cursor))
+                self.queue(vehicle_id, queued, message, next_cursor)
+
+    @staticmethod
+    def encode(vehicle_id, mp_socket, snapshot, cursor):
+        # Returns (the LIVE_DATA message for clients at a message cursor, the cursor they move on to)
+        # Send messages to keep client up to date. If the client is more than 200 behind, send the latest 200 only
+        messages_to_send, next_cursor = mp_socket.messages.since(cursor, limit=200)
+        data = dict(snapshot.data)
+        data["ip"] = mp_socket.HOST
+        data["vehicle_id"] = vehicle_id
+        data['messages'] = messages_to_send
+        data['command'] = "LIVE_DATA"
+        return json.dumps(data), next_cursor
+
+    def queue(self, vehicle_id, group, message, next_cursor):
+        # Queues a LIVE_DATA message to a group of ClientState
+        if group:
+            for state in group:
+                state.frames_queued[TOPIC_LIVE_DATA] += 1
+            self.server.broadcast(message, [state.client for state in group], stream="LIVE_DATA " + vehicle_id,
+                                  onsend=self.advance_cursor(dict((state.client, state) for state in group),
+                                                             vehicle_id, next_cursor))
+
+    @staticmethod
+    def due_clients(now, vehicle_id):
+        # Returns the ClientState of the LIVE_DATA subscribers of a vehicle that are due a frame, following the rate
+        # each client asked for.
+        due = []
+        for state in client_registry.subscribers(TOPIC_LIVE_DATA):
+            if vehicle_id not in state.vehicle_ids:
+                continue
+            rate = state.live_data_rate
+            next_live_data = state.next_live_data.get(vehicle_id, 0)
+            if rate is None:
+                due.append(state)
+            elif now >= next_live_data:
+                # Keep to the rate on average, without bursting to catch up after a pause
+                period = 1.0 / rate
+                next_live_data += period
+                if next_live_data <= now:
+                    next_live_data = now + period
+                state.next_live_data[vehicle_id] = next_live_data
+                due.append(state)
+        return due
+
+    @staticmethod
+    def advance_cursor(group_states, vehicle_id, next_cursor):
+        # Returns the onsend callback that moves a client's message cursor on once its LIVE_DATA frame is sent.
+        # group_states: The ClientState of each client the frame was sent to, keyed by client.
+        def onsend(client):
+            group_states[client].messages_cursors[vehicle_id] = next_cursor
+        return onsend
+
     def close(self):
         self.quit = True
+        self.wakeup.set()
 
-class FPVFeedThread(threading.Thread):
-    # Sends Camera Feed Data taken from the onboard camera and other projects to all self.clients connected via WebSockets.
+class FrameSlot:
+    # A one frame buffer between two threads. A frame that is put before the previous one was taken replaces it, so
+    # the consumer always gets the newest frame and a slow consumer lowers the frame rate instead of adding latency.
     def __init__(self):
+        self.condition = threading.Condition()
+        self.frame = None
+        self.closed = False
+        self.replaced = 0 # Frames replaced before they were taken
+
+    def put(self, frame):
+        with self.condition:
+            if self.frame is not None:
+                self.replaced += 1
+            self.frame = frame
+            self.condition.notify()
+
+    def take(self):
+        # Blocks until there is a frame, returns None once the slot is closed
+        with self.condition:
+            while self.frame is None and not self.closed:
+                self.condition.wait()
+            frame, self.frame = self.frame, None
+            return frame
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+class FPVFeedThread(threading.Thread):
+    # Captures frames from the onboard camera (or another frame source, see frame_sources.py) at self.fps and hands
+    # them to an FPVEncoderThread through a FrameSlot, which encodes and sends them to all self.clients connected via
+    # WebSockets.
+    def __init__(self, server, source=None, fps=FPV_FPS, recorder=None, rendition_pool=None):
+        # server: The SimpleWebSocketServer the clients are connected to.
+        # source: Where frames are read from, defaults to the camera.
+        # fps: The capture frame rate.
+        # recorder: The FrameRecorder that frames are recorded with, None to not record them.
+        # rendition_pool: The RenditionPool that renditions are encoded on, defaults to a pool of the feed's own.
         threading.Thread.__init__(self)
         self.quit = False
-        self.camera = None
-        self.fps = 5
-        
+        self.server = server
+        self.source = source if source is not None else CameraSource()
+        self.fps = fps
+        self.slot = FrameSlot()
+        self.encoder = FPVEncoderThread(server, self.slot, recorder, rendition_pool)
 
     def run(self):
+        self.encoder.start()
+        period = 1.0 / self.fps
+        next_capture = time.time()
         while not self.quit:
-            # If is no camera, try to connect.
-            if not self.camera:
-                try:
-                    if platform == "win32":
-                            self.camera = cv2.VideoCapture(0, cv2.CAP_DSHOW)
-                    else:
-                            self.camera = cv2.VideoCapture(0)
-                    # Set camera resolution
-                    self.camera.set(cv2.CAP_PROP_FRAME_WIDTH, 640) # 1920 / 1280
-                    self.camera.set(cv2.CAP_PROP_FRAME_HEIGHT, 480) # 1080 / 720
-                    self.camera.set(cv2.CAP_PROP_FPS, 10)
-                except:
-                    self.camera = None
-                time.sleep(2)
+            capture_time = time.time()
+            try:
+                frame = self.source.read()
+            except Exception as e:
+                print("[ERROR] Failed to capture an FPV frame: " + str(e))
+                frame = None
+            if frame is not None:
+                self.slot.put((frame, capture_time, time.time() - capture_time))
+            # Capture on a fixed schedule, after falling behind the schedule restarts instead of bursting to catch up
+            next_capture += period
+            delay = next_capture - time.time()
+            if delay > 0:
+                time.sleep(delay)
             else:
-                try:
-                    ret, frame = self.camera.read()
-                    encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), 50]
-                    # encode_param = [int(cv2.IMWRITE_PNG_COMPRESSION), 1]
-                    buffer = cv2.imencode('.jpg', frame, encode_param)[1]
-                    # convert image to base64 before sending
-                    data = {"command": "FPV_CAM", "image": "data:image/jpg;base64," + base64.b64encode(buffer)}
-                    for index, client in enumerate(clients):
-                        client.sendMessage(json.dumps(data))
-                except:
-                    pass
-
+                next_capture = time.time()
+        self.source.release()
+        self.encoder.close()
         print("[TERMINATION] Closed FPVFeedThread")
 
     def close(self):
         self.quit = True
-        self.camera.release()
+
+class FPVEncoderThread(threading.Thread):
+    # Encodes the renditions of the frames captured by FPVFeedThread and sends them. The JPEG quality, then the
+    # resolution, is stepped down while the slowest FPV_CAM subscriber drops frames and back up once every subscriber
+    # has kept up for a while, the half and thumbnail renditions are never larger or of a higher quality than the full one.
+    # The capture, encode and send time of every frame is kept in frame_timings.
+    def __init__(self, server, slot, recorder=None, rendition_pool=None):
+        # server: The SimpleWebSocketServer the clients are connected to.
+        # slot: The FrameSlot that frames are captured into.
+        # recorder: The FrameRecorder that frames are recorded with, None to not record them.
+        # rendition_pool: The RenditionPool that renditions are encoded on, defaults to a pool of the thread's own.
+        threading.Thread.__init__(self)
+        self.quit = False
+        self.server = server
+        self.slot = slot
+        self.recorder = recorder
+        self.rendition_pool = rendition_pool if rendition_pool is not None else RenditionPool()
+        self.sequence = 0
+        self.quality = FPV_QUALITIES[0]
+        self.scale = FPV_SCALES[0]
+        self.drain = {} # [frames queued, frames sent] to each client since the last adaptation, guarded by server.lock
+        self.adapt_time = time.time()
+        self.kept_up = 0 # Adaptations in a row that every client kept up
+
+    def run(self):
+        while not self.quit:
+            captured = self.slot.take()
+            if captured is None:
+                continue
+            frame, capture_time, capture_seconds = captured
+            renditions = subscribed_renditions(VIDEO_STREAM_FPV)
+            if self.recorder is not None and RENDITION_FULL not in renditions:
+                renditions.insert(0, RENDITION_FULL)
+            if not renditions:
+                continue
+            try:
+                encode_start = time.time()
+                encoded = dict(zip(renditions, self.rendition_pool.map(lambda rendition: self.encode(frame, rendition),
+                                                                       renditions)))
+                send_start = time.time()
+                self.sequence += 1
+                queued = broadcast_video_frame(self.server, VIDEO_STREAM_FPV, self.sequence, capture_time,
+                                               dict((rendition, jpeg) for rendition, (jpeg, _, _) in encoded.items()),
+                                               onsend=self.frame_sent)
+                send_end = time.time()
+            except Exception as e:
+                print("[ERROR] Failed to send an FPV frame: " + str(e))
+                continue
+            if self.recorder is not None:
+                self.recorder.record(VIDEO_STREAM_COMMANDS[VIDEO_STREAM_FPV], capture_time, encoded[RENDITION_FULL][0])
+            with self.server.lock:
+                for client in queued:
+                    self.drain.setdefault(client, [0, 0])[0] += 1
+            frame_timings[VIDEO_STREAM_FPV].append({
+                "sequence": self.sequence,
+                "capture_ms": round(capture_seconds * 1000, 2),
+                "encode_ms": round((send_start - encode_start) * 1000, 2),
+                "send_ms": round((send_end - send_start) * 1000, 2),
+                "quality": self.quality,
+                "renditions": dict((rendition, {"width": width, "height": height, "bytes": len(jpeg)})
+                                   for rendition, (jpeg, width, height) in encoded.items()),
+            })
+            self.adapt(send_end)
+        print("[TERMINATION] Closed FPVEncoderThread")
+
+    def encode(self, frame, rendition):
+        # Returns (the JPEG, its width, its height) of a rendition of a frame, called on the rendition pool
+        scale, quality = RENDITION_SIZES[rendition]
+        return encode_frame(frame, min(scale, self.scale), min(quality, self.quality))
+
+    def frame_sent(self, client):
+        # onsend of every FPV frame, called with server.lock held once the frame is being sent to the client
+        self.drain.setdefault(client, [0, 0])[1] += 1
+
+    def adapt(self, now):
+        # Steps the quality and resolution once every FPV_ADAPT_INTERVAL, following the share of queued frames that
+        # the slowest client was sent
+        if now - self.adapt_time < FPV_ADAPT_INTERVAL:
+            return
+        self.adapt_time = now
+        with self.server.lock:
+            drain, self.drain = self.drain, {}
+        drained = [float(sent) / queued for queued, sent in drain.values() if queued]
+        if not drained:
+            return
+        slowest = min(drained)
+        quality_index = FPV_QUALITIES.index(self.quality)
+        scale_index = FPV_SCALES.index(self.scale)
+        if slowest < FPV_DRAIN_LOW:
+            self.kept_up = 0
+            if quality_index + 1 < len(FPV_QUALITIES):
+                self.quality = FPV_QUALITIES[quality_index + 1]
+            elif scale_index + 1 < len(FPV_SCALES):
+                self.scale = FPV_SCALES[scale_index + 1]
+            else:
+                return
+            print("[INFO] FPV clients are dropping frames, sending quality " + str(self.quality) + " at " + str(self.scale) + " scale.")
+        elif slowest >= FPV_DRAIN_HIGH:
+            self.kept_up += 1
+            if self.kept_up < FPV_STEP_UP_INTERVALS:
+                return
+            self.kept_up = 0
+            if scale_index > 0:
+                self.scale = FPV_SCALES[scale_index - 1]
+            elif quality_index > 0:
+                self.quality = FPV_QUALITIES[quality_index - 1]
+
+    def close(self):
+        self.quit = True
+        self.slot.close()
 
 class VisionFeedThread(threading.Thread):
-    # Sends Vision Feed Data taken from the WebSocket relay (Ask Vision) connection and to all self.clients connected via WebSockets.
-    def __init__(self, vision_websocket_url):
+    # Receives Vision Feed Data from the WebSocket relay (Ask Vision) connection into a FrameSlot, a
+    # VisionPublisherThread sends the newest frame to all self.clients connected via WebSockets. Failed connections are
+    # retried with exponential backoff, the state of the relay is sent to the clients in VISION_HEALTH messages.
+    def __init__(self, server, vision_websocket_url, recorder=None, rendition_pool=None):
+        # server: The SimpleWebSocketServer the clients are connected to.
+        # recorder: The FrameRecorder that frames are recorded with, None to not record them.
+        # rendition_pool: The RenditionPool that renditions are encoded on, defaults to a pool of the feed's own.
         threading.Thread.__init__(self)
         self.quit = False
+        self.server = server
         self.connected = False
         self.vision_websocket_url = vision_websocket_url
+        self.ws = None
+        self.slot = FrameSlot()
+        self.publisher = VisionPublisherThread(server, self.slot, recorder, rendition_pool)
+        self.quit_event = threading.Event() # Cuts a backoff short when the thread is closed
+        self.state = VISION_CONNECTING
+        self.failures = 0 # Failed connections since the relay last sent a frame
+        self.retry_time = None # When the next connection attempt is made while backing off
+        self.frames_received = 0
+        self.last_frame_time = None
+
+    def connect(self, timeout=None):
+        # Returns True once connected, the caller backs off otherwise
+        self.set_state(VISION_CONNECTING)
+        try:
+            self.ws = websocket.create_connection(self.vision_websocket_url, timeout=timeout)
+        except Exception as e:
+            self.ws = None
+            self.failures += 1
+            print("[VISION WebSocket] Failed to connect (" + str(e) + "), attempt " + str(self.failures) + ".")
+            return False
+        self.connected = True
+        self.set_state(VISION_CONNECTED)
+        print("[Vision WebSocket] Successfully Connected")
+        return True
 
-    def connect(self):
+    def disconnected(self):
+        # Closes a connection that failed, the caller backs off before reconnecting
         self.connected = False
-        while not self.connected and not self.quit:
-            try:
-                self.ws = websocket.create_connection(self.vision_websocket_url)
-                self.connected = True
-                print("[Vision WebSocket] Successfully Connected")
-                break
-            except Exception as e:
-                self.connected = False
-                print("[VISION WebSocket] Failed to connect, retrying...")
-            time.sleep(1)
+        self.failures += 1
+        try:
+            self.ws.close()
+        except:
+            pass
+        self.ws = None
+
+    def backoff(self):
+        # Returns how long to wait before the next connection attempt
+        delay = reconnect_delay(self.failures)
+        self.retry_time = time.time() + delay
+        self.set_state(VISION_BACKOFF)
+        return delay
+
+    def received(self, buffer):
+        # The relay does not send capture times, so the time the frame was received is used
+        self.failures = 0
+        self.frames_received += 1
+        self.last_frame_time = time.time()
+        self.slot.put((buffer, self.last_frame_time))
 
     def run(self):
-        
+        self.publisher.start()
+        self.server.callSoon(self.report_health)
         while not self.quit:
-            if not self.connected:
-                self.connect()
+            if self.ws is None:
+                if self.connect(timeout=VISION_RELAY_TIMEOUT):
+                    # The relay may not send anything for a long time when Vision is not running
+                    self.ws.settimeout(None)
+                else:
+                    self.quit_event.wait(self.backoff())
+                continue
             try:
-                buffer =  self.ws.recv()
-                # convert image to base64 before sending
-                data = {"command": "VISION_CAM", "image": "data:image/jpg;base64," + base64.b64encode(buffer)}
-                for index, client in enumerate(clients):
-                    client.sendMessage(json.dumps(data))
+                buffer = self.ws.recv()
+            except Exception as e:
+                if not self.quit:
+                    print("[VISION WebSocket] Connection lost (" + str(e) + "), reconnecting...")
+                    self.disconnected()
+                    self.quit_event.wait(self.backoff())
+                continue
+            if not buffer:
+                # recv returns an empty message once the relay closes the connection
+                print("[VISION WebSocket] The relay closed the connection, reconnecting...")
+                self.disconnected()
+                self.quit_event.wait(self.backoff())
+                continue
+            self.received(buffer)
+        if self.ws is not None:
+            self.ws.close()
+        self.set_state(VISION_CLOSED)
+        self.publisher.close()
+        print("[TERMINATION] Closed VisionFeedThread")
+
+    def run_on_loop(self):
+        # Single loop mode: a blocking receive of a whole frame would hold up every client on the loop, so the relay is
+        # still received on this thread and the publisher hands each encoded frame to the loop to be queued
+        self.publisher.on_loop = True
+        self.start()
+
+    def set_state(self, state):
+        if state != self.state:
+            self.state = state
+            self.send_health()
+
+    def health(self):
+        # Returns the VISION_HEALTH message
+        now = time.time()
+        state = self.state
+        last_frame_age = None if self.last_frame_time is None else round(now - self.last_frame_time, 1)
+        if state == VISION_CONNECTED and (last_frame_age is None or last_frame_age > VISION_STALL_TIMEOUT):
+            state = VISION_STALLED
+        retry_time = self.retry_time
+        return {
+            "command": "VISION_HEALTH",
+            "state": state,
+            "failures": self.failures,
+            "retry_in": round(max(0, retry_time - now), 1) if state == VISION_BACKOFF and retry_time else None,
+            "frames_received": self.frames_received,
+            "frames_replaced": self.slot.replaced,
+            "last_frame_age": last_frame_age,
+        }
+
+    def send_health(self):
+        # Health messages are a stream of their own, a client that cannot keep up only gets the latest one
+        vision_clients = [state.client for state in client_registry.subscribers(TOPIC_VISION_CAM)]
+        self.server.broadcast(json.dumps(self.health()), vision_clients, stream="VISION_HEALTH")
+
+    def report_health(self):
+        # Runs on the WebSocket server's loop every VISION_HEALTH_INTERVAL seconds, so that new clients learn the state
+        # of the relay and a relay that stopped sending frames is reported as stalled
+        if self.state == VISION_CLOSED:
+            return
+        self.send_health()
+        self.server.callLater(VISION_HEALTH_INTERVAL, self.report_health)
+
+    def close(self):
+        self.quit = True
+        self.quit_event.set()
+        ws = self.ws
+        if ws is not None:
+            try:
+                # Wakes up the thread blocked receiving from the relay
+                ws.abort()
             except:
                 pass
-        self.ws.close()
-        print("[TERMINATION] Closed VisionFeedThread")
+
+class VisionPublisherThread(threading.Thread):
+    # Sends the frames received by VisionFeedThread to the VISION_CAM subscribers. Clients are sent frames at their own
+    # pace: a frame that was not sent to a client yet is replaced by the next one, and a frame that was received while
+    # the previous one was being queued replaces it in the FrameSlot. The full rendition is the relay's JPEG, the
+    # others are decoded from it at a reduced size and encoded again.
+    def __init__(self, server, slot, recorder=None, rendition_pool=None):
+        # server: The SimpleWebSocketServer the clients are connected to.
+        # slot: The FrameSlot that frames are received into.
+        # recorder: The FrameRecorder that frames are recorded with, None to not record them.
+        # rendition_pool: The RenditionPool that renditions are encoded on, defaults to a pool of the thread's own.
+        threading.Thread.__init__(self)
+        self.quit = False
+        self.server = server
+        self.slot = slot
+        self.recorder = recorder
+        self.rendition_pool = rendition_pool if rendition_pool is not None else RenditionPool()
+        self.sequence = 0
+        self.on_loop = False # Queue frames on the WebSocket server's loop (single loop mode) instead of this thread
+
+    def run(self):
+        while not self.quit:
+            received = self.slot.take()
+            if received is not None:
+                self.publish(*received)
+        print("[TERMINATION] Closed VisionPublisherThread")
+
+    def publish(self, buffer, receive_time):
+        encode_start = time.time()
+        self.sequence += 1
+        sequence = self.sequence
+        try:
+            renditions = subscribed_renditions(VIDEO_STREAM_VISION)
+            encoded = dict(zip(renditions, self.rendition_pool.map(lambda rendition: self.encode(buffer, rendition),
+                                                                   renditions)))
+        except Exception as e:
+            print("[ERROR] Failed to encode a vision frame: " + str(e))
+            return
+        encode_end = time.time()
+        if self.on_loop:
+            self.server.callSoon(lambda: self.send(sequence, buffer, receive_time, encoded, encode_start, encode_end))
+        else:
+            self.send(sequence, buffer, receive_time, encoded, encode_start, encode_end)
+        if self.recorder is not None:
+            self.recorder.record(VIDEO_STREAM_COMMANDS[VIDEO_STREAM_VISION], receive_time, buffer)
+
+    def send(self, sequence, buffer, receive_time, encoded, encode_start, encode_end):
+        # Queues the renditions of a frame to the subscribers, on the WebSocket server's loop in single loop mode
+        send_start = time.time()
+        try:
+            broadcast_video_frame(self.server, VIDEO_STREAM_VISION, sequence, receive_time, encoded)
+        except Exception as e:
+            print("[ERROR] Failed to send a vision frame: " + str(e))
+            return
+        send_end = time.time()
+        frame_timings[VIDEO_STREAM_VISION].append({
+            "sequence": sequence,
+            "queue_ms": round((encode_start - receive_time) * 1000, 2),
+            "encode_ms": round((encode_end - encode_start) * 1000, 2),
+            "send_ms": round((send_end - send_start) * 1000, 2),
+            "bytes": len(buffer),
+            "renditions": dict((rendition, {"bytes": len(jpeg)}) for rendition, jpeg in encoded.items()),
+        })
+
+    @staticmethod
+    def encode(buffer, rendition):
+        # Returns the JPEG of a rendition of a frame, called on the rendition pool
+        if rendition == RENDITION_FULL:
+            return buffer
+        scale, quality = RENDITION_SIZES[rendition]
+        return reencode_jpeg(buffer, scale, quality)[0]
 
     def close(self):
         self.quit = True
-        
+        self.slot.close()
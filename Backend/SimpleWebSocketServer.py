@@ -20,11 +20,27 @@ import struct
 import ssl
 import errno
 import codecs
-from collections import deque
+import os
+import zlib
+import heapq
+import time
+import threading
+import traceback
+from collections import deque, OrderedDict
+import select as _select
 from select import select
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+
+# epoll is only available on Linux, use SimpleWebSocketServer elsewhere
+HAS_EPOLL = hasattr(_select, 'epoll') and fcntl is not None
 
 __all__ = ['WebSocket',
             'SimpleWebSocketServer',
+            'SimpleEpollWebSocketServer',
             'SimpleSSLWebSocketServer']
 
 def _check_unicode(val):
@@ -50,7 +66,8 @@ HANDSHAKE_STR = (
    "HTTP/1.1 101 Switching Protocols\r\n"
    "Upgrade: WebSocket\r\n"
    "Connection: Upgrade\r\n"
-   "Sec-WebSocket-Accept: %(acceptstr)s\r\n\r\n"
+   "Sec-WebSocket-Accept: %(acceptstr)s\r\n"
+   "%(extensions)s\r\n"
 )
 
 FAILED_HANDSHAKE_STR = (
@@ -71,16 +88,161 @@ CLOSE = 0x8
 PING = 0x9
 PONG = 0xA
 
-HEADERB1 = 1
-HEADERB2 = 3
-LENGTHSHORT = 4
-LENGTHLONG = 5
-MASK = 6
-PAYLOAD = 7
+_HEADER = struct.Struct('!BB')
+_LENGTHSHORT = struct.Struct('!H')
+_LENGTHLONG = struct.Struct('!Q')
+
+# the send path gathers up to GATHER_FRAMES / GATHER_BYTES of queued frames
+# per system call, without sendmsg only frames up to COALESCE_BYTES are copied
+# together
+GATHER_FRAMES = 64
+GATHER_BYTES = 262144
+COALESCE_BYTES = 16384
+_HAS_SENDMSG = hasattr(socket.socket, 'sendmsg')
+STAT_NAMES = ['sends', 'bytesSent', 'bytesCopied', 'partialSends', 'framesSent']
 
 MAXHEADER = 65536
 MAXPAYLOAD = 33554432
 
+# _XORTABLES[k] maps every byte b to b ^ k, for bytearray.translate
+_XORTABLES = [bytes(bytearray(b ^ k for b in range(256))) for k in range(256)]
+
+def _unmask(data, mask):
+    """
+        XOR a payload with a 4 byte mask, returns a bytearray.
+
+        Every 4th byte is XORed with the same mask byte, so each of the four
+        lanes is unmasked with one translate call instead of one interpreter
+        step per byte.
+    """
+    data = bytearray(data)
+    for i in range(4):
+       data[i::4] = data[i::4].translate(_XORTABLES[mask[i]])
+    return data
+
+# permessage-deflate (RFC 7692), a compressed message is sent without the
+# empty stored block that ends a sync flush
+DEFLATE_TAIL = b'\x00\x00\xff\xff'
+DEFLATE_LEVEL = 6
+
+def _toBytes(data):
+    """
+        Text is encoded as utf-8, bytes (a str on Python 2) are left as they
+        are and a bytearray is copied to immutable bytes.
+    """
+    if isinstance(data, bytes):
+       return data
+    if _check_unicode(data):
+       return data.encode('utf-8')
+    return bytes(data)
+
+def _deflate(data, compressor):
+    """
+        Compress a whole message, compressor keeps its window (context
+        takeover) when it is used for the next message too.
+    """
+    compressed = compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    if compressed.endswith(DEFLATE_TAIL):
+       compressed = compressed[:-4]
+    return compressed
+
+def _parseDeflateOffer(offers):
+    """
+        Pick the first permessage-deflate offer from a
+        Sec-WebSocket-Extensions header that can be accepted.
+
+        Returns (server window bits, server context takeover, client context
+        takeover, response header value) or None.
+    """
+    for offer in offers.split(','):
+       params = [param.strip() for param in offer.split(';')]
+       if params[0] != 'permessage-deflate':
+          continue
+       wbits = 15
+       servertakeover = True
+       clienttakeover = True
+       response = ['permessage-deflate']
+       accepted = True
+       for param in params[1:]:
+          name, _, value = param.partition('=')
+          name = name.strip()
+          value = value.strip().strip('"')
+          if name == 'server_no_context_takeover':
+             servertakeover = False
+             response.append(name)
+          elif name == 'client_no_context_takeover':
+             clienttakeover = False
+             response.append(name)
+          elif name == 'server_max_window_bits':
+             # zlib does not support a raw deflate window of 8 bits
+             if not value.isdigit() or not 9 <= int(value) <= 15:
+                accepted = False
+                break
+             wbits = int(value)
+             response.append('%s=%d' % (name, wbits))
+          elif name == 'client_max_window_bits':
+             # any window the client uses can be inflated with 15 bits
+             if value and (not value.isdigit() or not 8 <= int(value) <= 15):
+                accepted = False
+                break
+          else:
+             accepted = False
+             break
+       if accepted:
+          return wbits, servertakeover, clienttakeover, response
+    return None
+
+class _DeflateMessage(object):
+   """
+       A message to a client with server context takeover. The compressed
+       frame depends on every message sent before it, so it is only built
+       when the serving thread sends it (dropped frames never touch the
+       compressor).
+   """
+   __slots__ = ('opcode', 'data')
+
+   def __init__(self, opcode, data):
+      self.opcode = opcode
+      self.data = data
+
+def _buildFrame(fin, opcode, data, compressed = False):
+    """
+        Build a complete unmasked websocket frame (header and payload).
+
+        The frame is returned as immutable bytes so that the same object can be
+        queued to any number of clients without being copied.
+
+        compressed sets RSV1, data must already be deflated.
+
+        data may be a tuple of byte strings (e.g. a header and a JPEG), they
+        are joined with the frame header in a single copy.
+    """
+    b1 = 0
+    b2 = 0
+    if fin is False:
+       b1 |= 0x80
+    if compressed:
+       b1 |= 0x40
+    b1 |= opcode
+
+    if isinstance(data, tuple):
+       parts = data
+    else:
+       parts = (_toBytes(data),)
+
+    length = sum(len(part) for part in parts)
+
+    if length <= 125:
+       header = struct.pack("!BB", b1, b2 | length)
+
+    elif length >= 126 and length <= 65535:
+       header = struct.pack("!BBH", b1, b2 | 126, length)
+
+    else:
+       header = struct.pack("!BBQ", b1, b2 | 127, length)
+
+    return b''.join((header,) + parts)
+
 class WebSocket(object):
 
    def __init__(self, server, sock, address):
@@ -95,11 +257,8 @@ class WebSocket(object):
       self.fin = 0
       self.data = bytearray()
       self.opcode = 0
-      self.hasmask = 0
-      self.maskarray = None
-      self.length = 0
-      self.lengtharray = None
-      self.index = 0
+      # received bytes that do not make up a whole frame yet
+      self.recvbuffer = bytearray()
       self.request = None
       self.usingssl = False
 
@@ -108,9 +267,27 @@ class WebSocket(object):
       self.frag_buffer = None
       self.frag_decoder = codecs.getincrementaldecoder('utf-8')(errors='strict')
       self.closed = False
+      # the key of this client in server.connections (set by the epoll server)
+      self.fileno = None
+      # reliable frames, sent in order and never dropped
       self.sendq = deque()
-
-      self.state = HEADERB1
+      # latest frame wins: stream -> (opcode, frame, onsend), only the newest
+      # unsent frame of each stream is kept, oldest stream is sent first
+      self.latest = OrderedDict()
+      # stream -> number of frames replaced before they could be sent
+      self.dropped = {}
+
+      # permessage-deflate, set in the handshake if the client offers it
+      self.deflate = False
+      self.deflateWbits = 15
+      # server context takeover: messages are compressed with one
+      # compressor, at the time they are sent
+      self.compressor = None
+      # client context takeover: the decompressor is kept between messages
+      self.inflateTakeover = True
+      self.decompressor = None
+      # the message being received is compressed
+      self.inflating = False
 
       # restrict the size of header and payload for security reasons
       self.maxheader = MAXHEADER
@@ -268,6 +445,11 @@ class WebSocket(object):
 
             # indicates end of HTTP header
             if b'\r\n\r\n' in self.headerbuffer:
+               end = self.headerbuffer.index(b'\r\n\r\n') + 4
+               # frames sent straight after the handshake are parsed with
+               # the next data received
+               self.recvbuffer.extend(self.headerbuffer[end:])
+               del self.headerbuffer[end:]
                self.request = HTTPRequest(self.headerbuffer)
 
                # handshake rfc 6455
@@ -275,7 +457,11 @@ class WebSocket(object):
                   key = self.request.headers['Sec-WebSocket-Key']
                   k = key.encode('ascii') + GUID_STR.encode('ascii')
                   k_s = base64.b64encode(hashlib.sha1(k).digest()).decode('ascii')
-                  hStr = HANDSHAKE_STR % {'acceptstr': k_s}
+                  extensions = ''
+                  offers = self.request.headers.get('Sec-WebSocket-Extensions')
+                  if offers and self.server.deflate:
+                     extensions = self._negotiateDeflate(offers)
+                  hStr = HANDSHAKE_STR % {'acceptstr': k_s, 'extensions': extensions}
                   self.sendq.append((BINARY, hStr.encode('ascii')))
                   self.handshaked = True
                   self.handleConnected()
@@ -295,12 +481,8 @@ class WebSocket(object):
          if not data:
             raise Exception("remote socket closed")
 
-         if VER >= 3:
-             for d in data:
-                 self._parseMessage(d)
-         else:
-             for d in data:
-                 self._parseMessage(ord(d))
+         self.recvbuffer.extend(data)
+         self._parseFrames()
 
    def close(self, status = 1000, reason = u''):
        """
@@ -326,36 +508,87 @@ class WebSocket(object):
 
 
    def _sendBuffer(self, buff, send_all = False):
-      size = len(buff)
-      tosend = size
+      """
+          Send a buffer, returns None once it has all been sent or the part
+          that could not be sent yet. The remaining part is a memoryview of
+          buff, so partial sends never copy the frame.
+      """
+      view = memoryview(buff)
+      size = len(view)
       already_sent = 0
+      stats = self.server.stats
 
-      while tosend > 0:
+      while already_sent < size:
          try:
-            # i should be able to send a bytearray
-            sent = self.client.send(buff[already_sent:])
+            sent = self.client.send(view[already_sent:])
+            stats['sends'] += 1
             if sent == 0:
                raise RuntimeError('socket connection broken')
 
             already_sent += sent
-            tosend -= sent
+            stats['bytesSent'] += sent
 
          except (ssl.SSLWantReadError, ssl.SSLWantWriteError):
             # SSL socket not ready to send yet, wait and try again
             if send_all:
                continue
-            return buff[already_sent:]
+            break
 
          except socket.error as e:
             # if we have full buffers then wait for them to drain and try again
             if e.errno in [errno.EAGAIN, errno.EWOULDBLOCK]:
                if send_all:
                    continue
-               return buff[already_sent:]
+               break
             else:
                raise e
 
-      return None
+      if already_sent == size:
+         return None
+      stats['partialSends'] += 1
+      return view[already_sent:]
+
+   def _sendFrames(self, frames):
+      """
+          Send several queued frames with as few system calls as possible,
+          returns the number of bytes sent.
+
+          With sendmsg (Python 3, not over SSL) the frames are gathered into
+          one call without being copied. Otherwise small frames are copied
+          into one buffer, up to COALESCE_BYTES, and a large frame is sent on
+          its own.
+      """
+      stats = self.server.stats
+      if len(frames) > 1 and _HAS_SENDMSG and not self.usingssl:
+         try:
+            sent = self.client.sendmsg(frames)
+         except socket.error as e:
+            if e.errno in [errno.EAGAIN, errno.EWOULDBLOCK]:
+               return 0
+            raise e
+         stats['sends'] += 1
+         stats['bytesSent'] += sent
+         if sent < sum(len(frame) for frame in frames):
+            stats['partialSends'] += 1
+         return sent
+
+      buff = frames[0]
+      if len(frames) > 1 and len(buff) < COALESCE_BYTES:
+         count = 1
+         size = len(buff)
+         while count < len(frames) and size + len(frames[count]) <= COALESCE_BYTES:
+            size += len(frames[count])
+            count += 1
+         if count > 1:
+            # the rest of a partly sent frame is a memoryview, bytes() of a
+            # memoryview is its repr on Python 2
+            buff = b''.join(frame.tobytes() if isinstance(frame, memoryview) else frame
+                            for frame in frames[:count])
+            stats['bytesCopied'] += size
+      remaining = self._sendBuffer(buff)
+      if remaining is None:
+         return len(buff)
+      return len(buff) - len(remaining)
 
    def sendFragmentStart(self, data):
       """
@@ -365,6 +598,9 @@ class WebSocket(object):
 
           If data is a unicode object then the frame is sent as Text.
           If the data is a bytearray object then the frame is sent as Binary.
+          If the data is a tuple of bytes objects then they are sent as one
+          Binary frame, joined only when the frame is built (e.g. a header and
+          a JPEG, without copying the JPEG to put the header in front of it).
       """
       opcode = BINARY
       if _check_unicode(data):
@@ -377,6 +613,9 @@ class WebSocket(object):
 
           If data is a unicode object then the frame is sent as Text.
           If the data is a bytearray object then the frame is sent as Binary.
+          If the data is a tuple of bytes objects then they are sent as one
+          Binary frame, joined only when the frame is built (e.g. a header and
+          a JPEG, without copying the JPEG to put the header in front of it).
       """
       self._sendMessage(True, STREAM, data)
 
@@ -386,216 +625,195 @@ class WebSocket(object):
 
           If data is a unicode object then the frame is sent as Text.
           If the data is a bytearray object then the frame is sent as Binary.
+          If the data is a tuple of bytes objects then they are sent as one
+          Binary frame, joined only when the frame is built (e.g. a header and
+          a JPEG, without copying the JPEG to put the header in front of it).
       """
       self._sendMessage(False, STREAM, data)
 
-   def sendMessage(self, data):
+   def sendMessage(self, data, compress = None):
       """
           Send websocket data frame to the client.
 
           If data is a unicode object then the frame is sent as Text.
           If the data is a bytearray object then the frame is sent as Binary.
+          If the data is a tuple of bytes objects then they are sent as one
+          Binary frame, joined only when the frame is built (e.g. a header and
+          a JPEG, without copying the JPEG to put the header in front of it).
+
+          compress uses permessage-deflate if the client negotiated it,
+          defaults to compressing Text only.
       """
       opcode = BINARY
       if _check_unicode(data):
          opcode = TEXT
-      self._sendMessage(False, opcode, data)
-
-
-   def _sendMessage(self, fin, opcode, data):
-
-        payload = bytearray()
+      if compress is None:
+         compress = opcode == TEXT
+      self._sendMessage(False, opcode, data, compress)
 
-        b1 = 0
-        b2 = 0
-        if fin is False:
-           b1 |= 0x80
-        b1 |= opcode
-
-        if _check_unicode(data):
-           data = data.encode('utf-8')
-
-        length = len(data)
-        payload.append(b1)
-
-        if length <= 125:
-           b2 |= length
-           payload.append(b2)
-
-        elif length >= 126 and length <= 65535:
-           b2 |= 126
-           payload.append(b2)
-           payload.extend(struct.pack("!H", length))
 
+   def _negotiateDeflate(self, offers):
+      """
+          Accept a permessage-deflate offer, returns the response header line
+          or '' if no offer was accepted.
+      """
+      accepted = _parseDeflateOffer(offers)
+      if accepted is None:
+         return ''
+      wbits, servertakeover, clienttakeover, response = accepted
+      if not self.server.deflateContextTakeover and servertakeover:
+         servertakeover = False
+         response.append('server_no_context_takeover')
+      self.deflate = True
+      self.deflateWbits = wbits
+      if servertakeover:
+         self.compressor = zlib.compressobj(self.server.deflateLevel, zlib.DEFLATED, -wbits)
+      self.inflateTakeover = clienttakeover
+      self.decompressor = zlib.decompressobj(-15)
+      return 'Sec-WebSocket-Extensions: %s\r\n' % '; '.join(response)
+
+   def _inflate(self, data, final):
+      """
+          Decompress a frame of a compressed message.
+      """
+      if final:
+         data = bytes(data) + DEFLATE_TAIL
+      else:
+         data = bytes(data)
+      inflated = self.decompressor.decompress(data, self.maxpayload)
+      if self.decompressor.unconsumed_tail:
+         raise Exception('payload exceeded allowable size')
+      if final and not self.inflateTakeover:
+         self.decompressor = zlib.decompressobj(-15)
+      return bytearray(inflated)
+
+   def _deflateFrame(self, message):
+      """
+          Build the frame of a _DeflateMessage with this client's compressor.
+      """
+      return _buildFrame(False, message.opcode, _deflate(message.data, self.compressor), True)
+
+   def _sendMessage(self, fin, opcode, data, compress = False):
+        if compress and self.deflate and fin is False:
+           data = _toBytes(data)
+           if self.compressor is not None:
+              frame = _DeflateMessage(opcode, data)
+           else:
+              compressor = zlib.compressobj(self.server.deflateLevel, zlib.DEFLATED, -self.deflateWbits)
+              frame = _buildFrame(fin, opcode, _deflate(data, compressor), True)
         else:
-           b2 |= 127
-           payload.append(b2)
-           payload.extend(struct.pack("!Q", length))
-
-        if length > 0:
-           payload.extend(data)
-
-        self.sendq.append((opcode, payload))
-
-
-   def _parseMessage(self, byte):
-      # read in the header
-      if self.state == HEADERB1:
-
-         self.fin = byte & 0x80
-         self.opcode = byte & 0x0F
-         self.state = HEADERB2
+           frame = _buildFrame(fin, opcode, data)
+        self.sendq.append((opcode, frame))
+        self.server._clientQueued(self)
 
-         self.index = 0
-         self.length = 0
-         self.lengtharray = bytearray()
-         self.data = bytearray()
-
-         rsv = byte & 0x70
-         if rsv != 0:
-            raise Exception('RSV bit must be 0')
-
-      elif self.state == HEADERB2:
-         mask = byte & 0x80
-         length = byte & 0x7F
-
-         if self.opcode == PING and length > 125:
-             raise Exception('ping packet is too large')
-
-         if mask == 128:
-            self.hasmask = True
-         else:
-            self.hasmask = False
-
-         if length <= 125:
-            self.length = length
-
-            # if we have a mask we must read it
-            if self.hasmask is True:
-               self.maskarray = bytearray()
-               self.state = MASK
-            else:
-               # if there is no mask and no payload we are done
-               if self.length <= 0:
-                  try:
-                     self._handlePacket()
-                  finally:
-                     self.state = HEADERB1
-                     self.data = bytearray()
-
-               # we have no mask and some payload
-               else:
-                  #self.index = 0
-                  self.data = bytearray()
-                  self.state = PAYLOAD
-
-         elif length == 126:
-            self.lengtharray = bytearray()
-            self.state = LENGTHSHORT
-
-         elif length == 127:
-            self.lengtharray = bytearray()
-            self.state = LENGTHLONG
-
-
-      elif self.state == LENGTHSHORT:
-         self.lengtharray.append(byte)
-
-         if len(self.lengtharray) > 2:
-            raise Exception('short length exceeded allowable size')
-
-         if len(self.lengtharray) == 2:
-            self.length = struct.unpack_from('!H', self.lengtharray)[0]
-
-            if self.hasmask is True:
-               self.maskarray = bytearray()
-               self.state = MASK
-            else:
-               # if there is no mask and no payload we are done
-               if self.length <= 0:
-                  try:
-                     self._handlePacket()
-                  finally:
-                     self.state = HEADERB1
-                     self.data = bytearray()
-
-               # we have no mask and some payload
-               else:
-                  #self.index = 0
-                  self.data = bytearray()
-                  self.state = PAYLOAD
-
-      elif self.state == LENGTHLONG:
-
-         self.lengtharray.append(byte)
-
-         if len(self.lengtharray) > 8:
-            raise Exception('long length exceeded allowable size')
-
-         if len(self.lengtharray) == 8:
-            self.length = struct.unpack_from('!Q', self.lengtharray)[0]
+   def _queueLatest(self, stream, opcode, frame, onsend = None):
+      """
+          Queue a frame of a stream, replacing the frame of that stream that
+          has not been sent yet. Must be called with server.lock held.
+      """
+      if stream in self.latest:
+         del self.latest[stream]
+         self.dropped[stream] = self.dropped.get(stream, 0) + 1
+      self.latest[stream] = (opcode, frame, onsend)
 
-            if self.hasmask is True:
-               self.maskarray = bytearray()
-               self.state = MASK
-            else:
-               # if there is no mask and no payload we are done
-               if self.length <= 0:
-                  try:
-                     self._handlePacket()
-                  finally:
-                     self.state = HEADERB1
-                     self.data = bytearray()
+   def _popLatest(self):
+      """
+          Take the oldest queued stream frame to send it, returns
+          (opcode, frame) or None. onsend(client) is called once the frame
+          can no longer be replaced.
+      """
+      with self.server.lock:
+         if not self.latest:
+            return None
+         stream, (opcode, frame, onsend) = self.latest.popitem(last = False)
+         if onsend is not None:
+            onsend(self)
+      return opcode, frame
 
-               # we have no mask and some payload
-               else:
-                  #self.index = 0
-                  self.data = bytearray()
-                  self.state = PAYLOAD
 
-      # MASK STATE
-      elif self.state == MASK:
-         self.maskarray.append(byte)
+   def _parseFrames(self):
+      """
+          Handle every complete frame in recvbuffer, a partial frame is kept
+          until the rest of it is received.
+      """
+      buff = self.recvbuffer
+      offset = 0
+      size = len(buff)
 
-         if len(self.maskarray) > 4:
-            raise Exception('mask exceeded allowable size')
+      try:
+         while size - offset >= 2:
+            b1, b2 = _HEADER.unpack_from(buff, offset)
 
-         if len(self.maskarray) == 4:
-            # if there is no mask and no payload we are done
-            if self.length <= 0:
-               try:
-                  self._handlePacket()
-               finally:
-                  self.state = HEADERB1
-                  self.data = bytearray()
+            opcode = b1 & 0x0F
 
-            # we have no mask and some payload
+            rsv = b1 & 0x70
+            # RSV1 marks the first frame of a compressed message, self.inflating
+            # is only set once the whole frame has been received, a partial
+            # frame is parsed again with the next recv
+            compressed = False
+            if rsv == 0x40 and self.deflate and opcode in (TEXT, BINARY):
+               if self.inflating:
+                  raise Exception('fragmentation protocol error')
+               compressed = True
+            elif rsv != 0:
+               raise Exception('RSV bit must be 0')
+            hasmask = b2 & 0x80
+            length = b2 & 0x7F
+            headerlength = 2
+
+            if opcode == PING and length > 125:
+               raise Exception('ping packet is too large')
+
+            if length == 126:
+               if size - offset < 4:
+                  break
+               length = _LENGTHSHORT.unpack_from(buff, offset + 2)[0]
+               headerlength = 4
+            elif length == 127:
+               if size - offset < 10:
+                  break
+               length = _LENGTHLONG.unpack_from(buff, offset + 2)[0]
+               headerlength = 10
+
+            # if length exceeds allowable size then we except and remove the connection
+            if length >= self.maxpayload:
+               raise Exception('payload exceeded allowable size')
+
+            if hasmask:
+               headerlength += 4
+
+            end = offset + headerlength + length
+            if end > size:
+               break
+
+            if compressed:
+               self.inflating = True
+
+            if length == 0:
+               payload = bytearray()
+            elif hasmask:
+               mask = buff[offset + headerlength - 4:offset + headerlength]
+               payload = _unmask(buff[offset + headerlength:end], mask)
             else:
-               #self.index = 0
-               self.data = bytearray()
-               self.state = PAYLOAD
+               payload = buff[offset + headerlength:end]
 
-      # PAYLOAD STATE
-      elif self.state == PAYLOAD:
-         if self.hasmask is True:
-            self.data.append( byte ^ self.maskarray[self.index % 4] )
-         else:
-            self.data.append( byte )
-
-         # if length exceeds allowable size then we except and remove the connection
-         if len(self.data) >= self.maxpayload:
-            raise Exception('payload exceeded allowable size')
+            if self.inflating and opcode in (TEXT, BINARY, STREAM):
+               payload = self._inflate(payload, b1 & 0x80)
+               if b1 & 0x80:
+                  self.inflating = False
 
-         # check if we have processed length bytes; if so we are done
-         if (self.index+1) == self.length:
+            offset = end
+            self.fin = b1 & 0x80
+            self.opcode = opcode
+            self.data = payload
             try:
                self._handlePacket()
             finally:
-               #self.index = 0
-               self.state = HEADERB1
                self.data = bytearray()
-         else:
-            self.index += 1
+
+      finally:
+         if offset:
+            del buff[:offset]
 
 
 class SimpleWebSocketServer(object):
@@ -624,6 +842,90 @@ class SimpleWebSocketServer(object):
       self.selectInterval = selectInterval
       self.connections = {}
       self.listeners = [self.serversocket]
+      # guards the stream frames of every client, hold it to read delivery
+      # state (see broadcast onsend) and queue new frames atomically
+      self.lock = threading.RLock()
+      # accept permessage-deflate offers from clients
+      self.deflate = True
+      # keep the compression window between messages: smaller messages
+      # but each client's messages are compressed separately, when sent.
+      # Without it a broadcast is compressed once for every client.
+      self.deflateContextTakeover = True
+      self.deflateLevel = DEFLATE_LEVEL
+
+      # send path counters, see statsSnapshot()
+      self.stats = dict((name, 0) for name in STAT_NAMES)
+
+      # other sockets served by this loop: fileno -> (socket, callback)
+      self.readers = {}
+      # callLater timers, a heap of (time, sequence, callback)
+      self.timers = []
+      self.timersequence = 0
+      # callSoon callbacks, appended to by any thread
+      self.callbacks = deque()
+
+   def callSoon(self, callback):
+      """
+          Run callback() on the serving thread, can be called from any thread.
+      """
+      self.callbacks.append(callback)
+      self._wakeup()
+
+   def callLater(self, delay, callback):
+      """
+          Run callback() on the serving thread after delay seconds. Must be
+          called from the serving thread, other threads use callSoon.
+      """
+      self.timersequence += 1
+      heapq.heappush(self.timers, (time.time() + delay, self.timersequence, callback))
+
+   def addReader(self, sock, callback):
+      """
+          Call callback() on the serving thread whenever sock is readable.
+          Must be called from the serving thread.
+      """
+      self.readers[sock.fileno()] = (sock, callback)
+
+   def removeReader(self, sock):
+      """
+          Stop watching a socket added with addReader, returns its fileno or
+          None. The socket may already be closed.
+      """
+      for fileno, (reader, _) in list(self.readers.items()):
+         if reader is sock:
+            del self.readers[fileno]
+            return fileno
+      return None
+
+   def _wakeup(self):
+      """
+          Make the loop run callbacks without waiting out selectInterval. The
+          select loop has no way to be woken, so does nothing.
+      """
+      pass
+
+   def _timeout(self):
+      # how long the loop can wait for socket events
+      if self.callbacks:
+         return 0
+      if self.timers:
+         return max(0, min(self.selectInterval, self.timers[0][0] - time.time()))
+      return self.selectInterval
+
+   def _runCallback(self, callback):
+      try:
+         callback()
+      except Exception:
+         traceback.print_exc()
+
+   def _runCallbacks(self):
+      # only callbacks queued before now run, so a callback that queues
+      # another one cannot keep the loop from serving sockets
+      for _ in range(len(self.callbacks)):
+         self._runCallback(self.callbacks.popleft())
+      now = time.time()
+      while self.timers and self.timers[0][0] <= now:
+         self._runCallback(heapq.heappop(self.timers)[2])
 
    def _decorateSocket(self, sock):
       return sock
@@ -647,30 +949,76 @@ class SimpleWebSocketServer(object):
          except:
             pass
 
+   def _clientQueued(self, client):
+      """
+          Called whenever a frame is queued to a client, possibly from
+          another thread. The select loop polls the queues so does nothing.
+      """
+      pass
+
+   def _takeFrames(self, client):
+      """
+          Take the frames to send to a client next, reliable frames first.
+      """
+      frames = []
+      size = 0
+      while len(frames) < GATHER_FRAMES and size < GATHER_BYTES:
+         if client.sendq:
+            opcode, payload = client.sendq.popleft()
+         else:
+            queued = client._popLatest()
+            if queued is None:
+               break
+            opcode, payload = queued
+         if isinstance(payload, _DeflateMessage):
+            payload = client._deflateFrame(payload)
+         frames.append((opcode, payload))
+         size += len(payload)
+         if opcode == CLOSE:
+            break
+      return frames
+
+   def _sendQueued(self, client):
+      """
+          Send as much of a client's queued frames as the socket takes.
+          Returns True once everything queued has been sent.
+      """
+      while True:
+         frames = self._takeFrames(client)
+         if not frames:
+            return True
+         sent = client._sendFrames([payload for _, payload in frames])
+         for index, (opcode, payload) in enumerate(frames):
+            if sent >= len(payload):
+               sent -= len(payload)
+               self.stats['framesSent'] += 1
+               if opcode == CLOSE:
+                  raise Exception('received client close')
+               continue
+            # a partly sent frame goes back on the reliable queue, with the
+            # frames taken after it, so that it is finished before anything
+            # else is sent
+            if sent:
+               payload = memoryview(payload)[sent:]
+            unsent = [(opcode, payload)] + frames[index + 1:]
+            client.sendq.extendleft(reversed(unsent))
+            return False
+
    def serveonce(self):
       writers = []
       for fileno in self.listeners:
          if fileno == self.serversocket:
             continue
          client = self.connections[fileno]
-         if client.sendq:
+         if client.sendq or client.latest:
             writers.append(fileno)
 
-      rList, wList, xList = select(self.listeners, writers, self.listeners, self.selectInterval)
+      rList, wList, xList = select(self.listeners + list(self.readers), writers, self.listeners, self._timeout())
 
       for ready in wList:
          client = self.connections[ready]
          try:
-            while client.sendq:
-               opcode, payload = client.sendq.popleft()
-               remaining = client._sendBuffer(payload)
-               if remaining is not None:
-                   client.sendq.appendleft((opcode, remaining))
-                   break
-               else:
-                   if opcode == CLOSE:
-                      raise Exception('received client close')
-
+            self._sendQueued(client)
          except Exception as n:
             self._handleClose(client)
             del self.connections[ready]
@@ -689,6 +1037,8 @@ class SimpleWebSocketServer(object):
             except Exception as n:
                if sock is not None:
                   sock.close()
+         elif ready in self.readers:
+            self._runCallback(self.readers[ready][1])
          else:
             if ready not in self.connections:
                 continue
@@ -712,10 +1062,289 @@ class SimpleWebSocketServer(object):
             del self.connections[failed]
             self.listeners.remove(failed)
 
+      self._runCallbacks()
+
+   def broadcast(self, data, clients = None, stream = None, onsend = None, compress = None):
+      """
+          Send the same websocket data frame to many clients.
+
+          The frame is built once and the same buffer is queued to every
+          client, instead of encoding and framing the data per client.
+
+          If data is a unicode object then the frame is sent as Text.
+          If the data is a bytearray object then the frame is sent as Binary.
+          If the data is a tuple of bytes objects then they are sent as one
+          Binary frame, joined only when the frame is built (e.g. a header and
+          a JPEG, without copying the JPEG to put the header in front of it).
+
+          clients is an iterable of WebSocket objects to send to, defaults to
+          every client that has completed the handshake.
+
+          stream names the stream the frame belongs to (e.g. a video feed).
+          Only the newest unsent frame of a stream is kept per client, older
+          ones are dropped and counted in client.dropped. Without a stream the
+          frame is reliable and always sent.
+
+          onsend(client) is called by the serving thread when a stream frame
+          is taken to be sent to a client, dropped frames never call it.
+
+          compress uses permessage-deflate for the clients that negotiated
+          it, defaults to compressing Text only (already compressed data such
+          as JPEGs should be sent as Binary). Clients without context
+          takeover share one compressed frame per window size.
+      """
+      opcode = BINARY
+      if isinstance(data, tuple):
+         parts = tuple(_toBytes(part) for part in data)
+         data = None
+      else:
+         if _check_unicode(data):
+            opcode = TEXT
+         data = _toBytes(data)
+         parts = (data,)
+      if compress is None:
+         compress = opcode == TEXT
+
+      # every kind of frame is only built once, when a client needs it
+      frames = {}
+      def message():
+         # the parts are only joined for the clients that compress
+         if 'message' not in frames:
+            frames['message'] = data if data is not None else b''.join(parts)
+         return frames['message']
+      def frameFor(client):
+         if not (compress and client.deflate):
+            key = None
+         elif client.compressor is not None:
+            key = 'takeover'
+         else:
+            key = client.deflateWbits
+         if key not in frames:
+            if key is None:
+               frames[key] = _buildFrame(False, opcode, parts)
+            elif key == 'takeover':
+               frames[key] = _DeflateMessage(opcode, message())
+            else:
+               compressor = zlib.compressobj(self.deflateLevel, zlib.DEFLATED, -key)
+               frames[key] = _buildFrame(False, opcode, _deflate(message(), compressor), True)
+         return frames[key]
+
+      if clients is None:
+         # connections is changed by the serving thread, take a copy
+         clients = list(self.connections.values())
+
+      with self.lock:
+         for client in clients:
+            if client.handshaked and not client.closed:
+               frame = frameFor(client)
+               if stream is None:
+                  client.sendq.append((opcode, frame))
+               else:
+                  client._queueLatest(stream, opcode, frame, onsend)
+               self._clientQueued(client)
+
+   def statsSnapshot(self):
+      """
+          Returns a copy of the send path counters:
+          sends (send / sendmsg system calls), bytesSent, bytesCopied (bytes
+          copied to coalesce frames), partialSends (sends that left part of
+          a frame queued) and framesSent.
+      """
+      return dict(self.stats)
+
+   def droppedFrames(self):
+      """
+          Returns {client address: {stream: frames dropped}} for every client.
+      """
+      with self.lock:
+         return dict((client.address, dict(client.dropped))
+                     for client in list(self.connections.values()))
+
    def serveforever(self):
       while True:
          self.serveonce()
 
+class SimpleEpollWebSocketServer(SimpleWebSocketServer):
+   """
+       SimpleWebSocketServer on epoll (Linux only, see HAS_EPOLL).
+
+       Only sockets with events are visited, instead of every connection on
+       every iteration, and there is no FD_SETSIZE limit. Write interest is
+       registered only while a client has queued frames, and a wakeup pipe
+       makes the loop send frames queued by other threads straight away
+       instead of after selectInterval.
+   """
+   def __init__(self, host, port, websocketclass, selectInterval = 0.1):
+      SimpleWebSocketServer.__init__(self, host, port, websocketclass, selectInterval)
+      self.serversocket.setblocking(0)
+      self.epoll = _select.epoll()
+      self.epoll.register(self.serversocket.fileno(), _select.EPOLLIN)
+
+      self.wakeupread, self.wakeupwrite = os.pipe()
+      for fd in (self.wakeupread, self.wakeupwrite):
+         fcntl.fcntl(fd, fcntl.F_SETFL, fcntl.fcntl(fd, fcntl.F_GETFL) | os.O_NONBLOCK)
+      self.epoll.register(self.wakeupread, _select.EPOLLIN)
+
+      # clients that were queued to since the last iteration, appended to by
+      # any thread and only emptied by the serving thread
+      self.queuedclients = deque()
+      # filenos currently registered for write interest
+      self.writers = set()
+      # set once the wakeup pipe is written to and cleared when the loop
+      # drains it, so it is written to at most once per iteration
+      self._wakePending = False
+      # the thread running serveonce, which needs no wakeup
+      self._loopThread = None
+
+   def _clientQueued(self, client):
+      self.queuedclients.append(client)
+      self._wakeup()
+
+   def _wakeup(self):
+      # the loop thread sends to queued clients and runs callbacks before it
+      # waits again, only other threads have to wake it
+      if self._wakePending or threading.current_thread() is self._loopThread:
+         return
+      self._wakePending = True
+      try:
+         os.write(self.wakeupwrite, b'x')
+      except OSError as e:
+         # the pipe is full so the loop is already going to wake up
+         if e.errno not in [errno.EAGAIN, errno.EWOULDBLOCK]:
+            raise e
+
+   def addReader(self, sock, callback):
+      SimpleWebSocketServer.addReader(self, sock, callback)
+      self.epoll.register(sock.fileno(), _select.EPOLLIN)
+
+   def removeReader(self, sock):
+      fileno = SimpleWebSocketServer.removeReader(self, sock)
+      if fileno is not None:
+         try:
+            self.epoll.unregister(fileno)
+         except (IOError, OSError, ValueError):
+            pass
+      return fileno
+
+   def _setWriteInterest(self, fileno, writing):
+      if writing == (fileno in self.writers):
+         return
+      if writing:
+         self.writers.add(fileno)
+         self.epoll.modify(fileno, _select.EPOLLIN | _select.EPOLLOUT)
+      else:
+         self.writers.discard(fileno)
+         self.epoll.modify(fileno, _select.EPOLLIN)
+
+   def _removeClient(self, fileno):
+      client = self.connections.pop(fileno, None)
+      if client is None:
+         return
+      self.listeners.remove(fileno)
+      self.writers.discard(fileno)
+      try:
+         self.epoll.unregister(fileno)
+      except (IOError, OSError):
+         pass
+      self._handleClose(client)
+
+   def _accept(self):
+      while True:
+         sock = None
+         try:
+            sock, address = self.serversocket.accept()
+         except socket.error as e:
+            if e.errno in [errno.EAGAIN, errno.EWOULDBLOCK]:
+               return
+            raise e
+         try:
+            newsock = self._decorateSocket(sock)
+            newsock.setblocking(0)
+            fileno = newsock.fileno()
+            client = self._constructWebSocket(newsock, address)
+            client.fileno = fileno
+            self.connections[fileno] = client
+            self.listeners.append(fileno)
+            self.epoll.register(fileno, _select.EPOLLIN)
+         except Exception as n:
+            sock.close()
+
+   def _send(self, fileno):
+      client = self.connections.get(fileno)
+      if client is None:
+         return
+      try:
+         done = self._sendQueued(client)
+      except Exception as n:
+         self._removeClient(fileno)
+         return
+      self._setWriteInterest(fileno, not done)
+
+   def serveonce(self):
+      self._loopThread = threading.current_thread()
+      try:
+         events = self.epoll.poll(self._timeout())
+      except IOError as e:
+         if e.errno == errno.EINTR:
+            return
+         raise e
+
+      for fileno, event in events:
+         if fileno == self.serversocket.fileno():
+            if event & (_select.EPOLLERR | _select.EPOLLHUP):
+               self.close()
+               raise Exception('server socket failed')
+            self._accept()
+
+         elif fileno == self.wakeupread:
+            try:
+               while os.read(self.wakeupread, 4096):
+                  pass
+            except OSError as e:
+               if e.errno not in [errno.EAGAIN, errno.EWOULDBLOCK]:
+                  raise e
+            # cleared once the pipe is empty, whatever was queued without
+            # writing to it is sent and run later in this iteration
+            self._wakePending = False
+
+         elif fileno in self.connections:
+            if event & _select.EPOLLOUT:
+               self._send(fileno)
+            if event & (_select.EPOLLIN | _select.EPOLLHUP | _select.EPOLLERR) and fileno in self.connections:
+               client = self.connections[fileno]
+               try:
+                  client._handleData()
+               except Exception as n:
+                  self._removeClient(fileno)
+                  continue
+               # answering the handshake or a ping queues frames directly
+               if client.sendq:
+                  self._send(fileno)
+
+         elif fileno in self.readers:
+            self._runCallback(self.readers[fileno][1])
+
+      self._runCallbacks()
+
+      # try to send what other threads and the callbacks queued straight
+      # away, only clients that could not take everything get write interest
+      while self.queuedclients:
+         client = self.queuedclients.popleft()
+         fileno = client.fileno
+         if self.connections.get(fileno) is client and fileno not in self.writers:
+            self._send(fileno)
+
+   def close(self):
+      for fileno in list(self.connections.keys()):
+         try:
+            self.epoll.unregister(fileno)
+         except (IOError, OSError):
+            pass
+      SimpleWebSocketServer.close(self)
+      self.epoll.close()
+      os.close(self.wakeupread)
+      os.close(self.wakeupwrite)
+
 class SimpleSSLWebSocketServer(SimpleWebSocketServer):
 
    def __init__(self, host, port, websocketclass, certfile = None,
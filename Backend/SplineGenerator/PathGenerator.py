@@ -4,6 +4,11 @@ import FlyToCircleTarget as ftctPG
 import FlyToTargetPayload as fttpPG
 import math
 
+# Metres per degree of latitude, the same scale factor used by the path generators
+METRES_PER_DEGREE = 111320
+# Waypoint id (MAV_CMD_NAV_WAYPOINT) of the points produced by the path generators. Other commands are never removed.
+NAV_WAYPOINT_ID = 16
+
 class PathGenerationType:
     SEARCH_AREA = "saPG"
     POINT_TO_POINT = "ptpPG"
@@ -23,6 +28,7 @@ class PathGenerator:
         self.minimum_turn_radius = None  # Metres
         self.curve_resolution = None  # Waypoints per metre on a curve
         self.alt = None  # Altitude to print plots at
+        self.cross_track_error_ratio = 0.05  # Max distance the decimated path may stray from the generated path, as a fraction of the turn radius
 
         # Search area specific data
         self.search_area = None
@@ -53,17 +59,23 @@ class PathGenerator:
 
     def generate_path(self):
         # Check what type of path generation is desired
+        path_points = None
         if self.path_generation_type == "saPG":  # Search area path generation
-            return self.handle_search_area_PG()
+            path_points = self.handle_search_area_PG()
 
         if self.path_generation_type == "ptpPG":  # Point to point path generation
-            return self.handle_point_to_point_PG()
+            path_points = self.handle_point_to_point_PG()
 
         if self.path_generation_type == "ftctPG":  # Fly to circle target path generation
-            return self.handle_fly_to_circle_target_PG()
+            path_points = self.handle_fly_to_circle_target_PG()
 
         if self.path_generation_type == "fttpPG":  # Fly to target payload path generation
-            return self.handle_fly_to_target_payload_PG()
+            path_points = self.handle_fly_to_target_payload_PG()
+
+        # Remove the points that are not needed to follow the path before it is sent to Mission Planner
+        if path_points is not None and self.minimum_turn_radius is not None:
+            path_points = decimate_waypoints(path_points, self.cross_track_error_ratio * self.minimum_turn_radius)
+        return path_points
 
     def handle_search_area_PG(self):
         # Create class instance
@@ -171,4 +183,77 @@ class PathGenerator:
         path = path_generator.generate_path()
         if self.do_plot:
             fttpPG.plot_waypoints(points_dict=path, point1=path_generator.target_location)
-        return path_generator.get_waypoints()
\ No newline at end of file
+        return path_generator.get_waypoints()
+
+
+def decimate_waypoints(waypoints, max_cross_track_error):
+    """
+    Removes waypoints that are not needed to follow the path, using the Ramer-Douglas-Peucker algorithm.
+    A waypoint is only removed if the path without it stays within max_cross_track_error metres of the original path.
+    Waypoints that are not navigation waypoints (e.g. DO_VTOL_TRANSITION) and changes in altitude are always kept.
+
+    waypoints: A list of dictionaries with keys "lat", "long", "alt" and optionally "id", in order of flight
+    max_cross_track_error: The allowed distance in metres between the decimated path and the original path
+    Returns a new list of waypoint dictionaries.
+    """
+    n = len(waypoints)
+    if n < 3 or max_cross_track_error <= 0:
+        return waypoints
+
+    # Project onto a local flat plane in metres around the first navigation waypoint
+    origin = next((point for point in waypoints if point.get("id", NAV_WAYPOINT_ID) == NAV_WAYPOINT_ID), waypoints[0])
+    lat_0 = origin["lat"]
+    lon_scale = METRES_PER_DEGREE * math.cos(math.radians(lat_0))
+    xs = [(point["long"] - origin["long"]) * lon_scale for point in waypoints]
+    ys = [(point["lat"] - lat_0) * METRES_PER_DEGREE for point in waypoints]
+
+    # Only runs of navigation waypoints at the same altitude are decimated, the ends of each run are always kept
+    keep = [True] * n
+    sections = []
+    run_start = None
+    for index in range(n + 1):
+        in_run = index < n and waypoints[index].get("id", NAV_WAYPOINT_ID) == NAV_WAYPOINT_ID
+        if in_run and run_start is not None and waypoints[index]["alt"] != waypoints[run_start]["alt"]:
+            sections.append((run_start, index - 1))
+            run_start = index
+        elif in_run and run_start is None:
+            run_start = index
+        elif not in_run and run_start is not None:
+            sections.append((run_start, index - 1))
+            run_start = None
+    for start, end in sections:
+        for index in range(start + 1, end):
+            keep[index] = False
+
+    # Iterative Douglas-Peucker over each section (avoids recursion limits on long paths)
+    stack = list(sections)
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        dx = xs[end] - xs[start]
+        dy = ys[end] - ys[start]
+        length_squared = dx * dx + dy * dy
+        furthest_index = None
+        furthest_distance = max_cross_track_error
+        for index in range(start + 1, end):
+            px = xs[index] - xs[start]
+            py = ys[index] - ys[start]
+            if length_squared == 0:
+                distance = math.sqrt(px * px + py * py)
+            else:
+                # Distance to the closest point of the segment, not of the line through it, so that a waypoint
+                # beyond either end (e.g. the far end of an out-and-back leg) is kept
+                t = min(1.0, max(0.0, (px * dx + py * dy) / length_squared))
+                distance = math.sqrt((px - t * dx) ** 2 + (py - t * dy) ** 2)
+            if distance > furthest_distance:
+                furthest_distance = distance
+                furthest_index = index
+        if furthest_index is not None:
+            keep[furthest_index] = True
+            stack.append((start, furthest_index))
+            stack.append((furthest_index, end))
+
+    decimated = [waypoints[index] for index in range(n) if keep[index]]
+    print("[PATH] Decimated waypoints: " + str(n) + " in, " + str(len(decimated)) + " out (max cross-track error " + str(round(max_cross_track_error, 2)) + " m)")
+    return decimated
@@ -0,0 +1,109 @@
+import threading
+from collections import OrderedDict
+from CommunicationScript.mission_planner_registry import DEFAULT_VEHICLE_ID
+
+
+class ClientState:
+    """The state kept for one WebSocket client (dashboard) of the Dronelink WebSocket server.
+    """
+    def __init__(self, client, topics):
+        """Constructor
+
+        Args:
+            client (WebSocket): The connection of the client.
+            topics (List[str]): The topics the client starts out subscribed to.
+        """
+        self.client = client
+        self.vehicle_ids = [DEFAULT_VEHICLE_ID] # The vehicles the client receives live data for
+        self.messages_cursors = {} # The cursor into each vehicle's MessageLog, see MessageLog.since
+        self.binary_video = False # Send video as binary frames instead of base64 in JSON
+        self.renditions = {} # The rendition of each video topic the client receives, full size when not set
+        self.topics = set(topics) # The topics the client is subscribed to
+        self.live_data_rate = None # The LIVE_DATA rate (Hz) the client asked for, None for the full rate
+        self.next_live_data = {} # When the client is next due LIVE_DATA of each vehicle
+        self.frames_queued = dict((topic, 0) for topic in topics) # The frames of each topic queued to the client
+
+
+class ClientRegistry:
+    """The clients connected to the Dronelink WebSocket server, keyed by connection.
+
+    Joining and leaving are O(1) and thread-safe. Threads that send to the clients iterate over snapshot(), a tuple that
+    is never changed, so clients that join or leave while a frame is being broadcast are not skipped, sent to twice or
+    removed from under the sender. A client that left after the snapshot was taken is sent to as usual, its connection
+    drops the frame once it is closed.
+    """
+    def __init__(self, topics):
+        """Constructor
+
+        Args:
+            topics (List[str]): The topics new clients are subscribed to.
+        """
+        self.topics = topics
+        self.lock = threading.Lock() # Guards self.states and self.states_snapshot
+        self.states = OrderedDict() # The ClientState of each client, in the order they joined
+        self.states_snapshot = () # Rebuilt by snapshot() after clients join or leave, empty until then
+
+    def __len__(self):
+        return len(self.states)
+
+    def join(self, client):
+        """Adds a client.
+
+        Args:
+            client (WebSocket): The connection of the client.
+
+        Returns:
+            ClientState: The state of the new client.
+        """
+        state = ClientState(client, self.topics)
+        with self.lock:
+            self.states[client] = state
+            self.states_snapshot = None
+        return state
+
+    def leave(self, client):
+        """Removes a client.
+
+        Args:
+            client (WebSocket): The connection of the client.
+
+        Returns:
+            ClientState: The state of the client, or None if it had not joined.
+        """
+        with self.lock:
+            state = self.states.pop(client, None)
+            self.states_snapshot = None
+        return state
+
+    def get(self, client):
+        """Gets the state of a client.
+
+        Args:
+            client (WebSocket): The connection of the client.
+
+        Returns:
+            ClientState: The state of the client, or None if it has not joined.
+        """
+        return self.states.get(client)
+
+    def snapshot(self):
+        """Gets the state of every client, safe to iterate while clients join and leave.
+
+        Returns:
+            tuple: The ClientState of every client, in the order they joined.
+        """
+        with self.lock:
+            if self.states_snapshot is None:
+                self.states_snapshot = tuple(self.states.values())
+            return self.states_snapshot
+
+    def subscribers(self, topic):
+        """Gets the clients subscribed to a topic.
+
+        Args:
+            topic (str): The topic.
+
+        Returns:
+            List[ClientState]: The state of every subscribed client.
+        """
+        return [state for state in self.snapshot() if topic in state.topics]
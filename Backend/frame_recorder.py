@@ -0,0 +1,340 @@
+import os
+import math
+import mmap
+import struct
+import bisect
+import threading
+from Queue import Queue, Full
+
+# A recording is a directory per stream of segments. Each segment is a .frames file of the raw JPEGs one after the
+# other, and an .index file of one fixed size record per frame, so a frame is found by a binary search of the index.
+# Segments are named after the time of their first frame, so the segment of a time is found from the file names.
+INDEX_RECORD_FORMAT = "!QQIff" # capture time (ms since epoch), offset in the .frames file, length, latitude, longitude
+                               # (float32, about a metre, NaN when the position is not known)
+INDEX_RECORD_SIZE = struct.calcsize(INDEX_RECORD_FORMAT)
+FRAMES_EXTENSION = ".frames"
+INDEX_EXTENSION = ".index"
+SEGMENT_SECONDS = 60 # A new segment is started once a segment covers this long
+SEGMENT_BYTES = 64 * 1024 * 1024 # or holds this many bytes of frames
+RECORDER_QUEUE_SIZE = 64 # Frames waiting to be written, frames are dropped while the queue is full
+
+
+class FrameRecorder(threading.Thread):
+    """Records video frames to disk in segments, see INDEX_RECORD_FORMAT.
+
+    record() only puts the frame on a queue, the frames are written by this thread. When the disk cannot keep up the
+    queue fills up and frames are dropped from the recording, so recording never delays the live feeds.
+    """
+    def __init__(self, directory, position=None):
+        """Constructor
+
+        Args:
+            directory (str): The directory to record into, created if it does not exist.
+            position (function, optional): Returns the (latitude, longitude) of the vehicle, recorded with every frame.
+                Defaults to None (no position).
+        """
+        threading.Thread.__init__(self, name="frame_recorder_thread")
+        self.directory = directory
+        self.position = position
+        self.queue = Queue(RECORDER_QUEUE_SIZE)
+        self.segments = {} # The segment being written for each stream
+        self.frames_recorded = 0
+        self.frames_dropped = 0
+
+    def record(self, stream, capture_time, jpeg):
+        """Queues a frame to be recorded, can be called from any thread.
+
+        Args:
+            stream (str): The name of the stream, e.g. "VISION_CAM".
+            capture_time (float): Seconds since epoch of when the frame was captured.
+            jpeg (str): The JPEG encoded frame.
+        """
+        latitude, longitude = (None, None) if self.position is None else self.position()
+        try:
+            self.queue.put_nowait((stream, int(capture_time * 1000), jpeg, latitude, longitude))
+        except Full:
+            self.frames_dropped += 1
+
+    def run(self):
+        print("[INFO] Recording video frames to " + self.directory)
+        while True:
+            frame = self.queue.get()
+            if frame is None:
+                break
+            try:
+                self.write(*frame)
+                self.frames_recorded += 1
+            except Exception as e:
+                print("[ERROR] Failed to record a frame: " + str(e))
+        for segment in self.segments.values():
+            segment.close()
+        print("[TERMINATION] Closed FrameRecorder, " + str(self.frames_recorded) + " frames recorded, "
+              + str(self.frames_dropped) + " dropped.")
+
+    def write(self, stream, time_ms, jpeg, latitude, longitude):
+        segment = self.segments.get(stream)
+        if segment is not None and (time_ms - segment.start_ms >= SEGMENT_SECONDS * 1000
+                                    or segment.size + len(jpeg) > SEGMENT_BYTES):
+            segment.close()
+            segment = None
+        if segment is None:
+            if not os.path.isdir(os.path.join(self.directory, stream)):
+                os.makedirs(os.path.join(self.directory, stream))
+            segment = SegmentWriter(segment_path(self.directory, stream, time_ms), time_ms)
+            self.segments[stream] = segment
+        segment.append(time_ms, jpeg, latitude, longitude)
+
+    def close(self):
+        """Writes the frames that are queued, then stops the thread.
+        """
+        self.queue.put(None)
+
+
+class SegmentWriter:
+    """Appends frames to one segment of a recording.
+    """
+    def __init__(self, path, start_ms):
+        """Constructor
+
+        Args:
+            path (str): The path of the segment without an extension.
+            start_ms (int): The time of the first frame (ms since epoch).
+        """
+        self.start_ms = start_ms
+        self.last_ms = start_ms
+        self.frames = open(path + FRAMES_EXTENSION, "ab")
+        self.index = open(path + INDEX_EXTENSION, "ab")
+        self.size = self.frames.tell()
+
+    def append(self, time_ms, jpeg, latitude, longitude):
+        # The index is searched by time, so it has to stay sorted even if the clock steps back
+        time_ms = max(time_ms, self.last_ms)
+        self.last_ms = time_ms
+        self.frames.write(jpeg)
+        # The frame is flushed before its index record, so a reader never finds a record of a frame it cannot read
+        self.frames.flush()
+        self.index.write(struct.pack(INDEX_RECORD_FORMAT, time_ms, self.size, len(jpeg),
+                                     float("nan") if latitude is None else latitude,
+                                     float("nan") if longitude is None else longitude))
+        self.index.flush()
+        self.size += len(jpeg)
+
+    def close(self):
+        self.frames.close()
+        self.index.close()
+
+
+class RecordingReader:
+    """Reads the frames recorded by a FrameRecorder, while it is still recording too.
+    Files are memory-mapped and the index is binary searched, so seeking to any time only reads the pages needed.
+    """
+    def __init__(self, directory):
+        """Constructor
+
+        Args:
+            directory (str): The directory the FrameRecorder records into.
+        """
+        self.directory = directory
+
+    def streams(self):
+        """Gets the streams that have been recorded.
+
+        Returns:
+            List[str]: The names of the streams.
+        """
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(name for name in os.listdir(self.directory) if os.path.isdir(os.path.join(self.directory, name)))
+
+    def segments(self, stream):
+        """Gets the segments of a stream.
+
+        Args:
+            stream (str): The name of the stream.
+
+        Returns:
+            List[tuple]: (start time (ms since epoch), path without an extension) of every segment, oldest first.
+        """
+        if stream not in self.streams():
+            return []
+        stream_directory = os.path.join(self.directory, stream)
+        segments = []
+        for name in os.listdir(stream_directory):
+            start, extension = os.path.splitext(name)
+            if extension == INDEX_EXTENSION and start.isdigit():
+                segments.append((int(start), os.path.join(stream_directory, start)))
+        segments.sort()
+        return segments
+
+    def summary(self, stream):
+        """Gets the time span of a stream's recording.
+
+        Args:
+            stream (str): The name of the stream.
+
+        Returns:
+            dict: The "start" and "end" times (ms since epoch), number of "frames" and "segments", None if the stream
+                has no frames.
+        """
+        segments = [path for _, path in self.segments(stream)]
+        frames = sum(os.path.getsize(path + INDEX_EXTENSION) // INDEX_RECORD_SIZE for path in segments)
+        if not frames:
+            return None
+        first = RecordedSegment(segments[0])
+        last = RecordedSegment(segments[-1])
+        try:
+            start = first.record(0)[0] if len(first) else None
+            end = last.record(len(last) - 1)[0] if len(last) else None
+        finally:
+            first.close()
+            last.close()
+        return {"start": start, "end": end, "frames": frames, "segments": len(segments)}
+
+    def frame_at(self, stream, time_ms):
+        """Gets the frame that was showing at a time, i.e. the last frame captured at or before it (or the first frame).
+
+        Args:
+            stream (str): The name of the stream.
+            time_ms (int): The time (ms since epoch).
+
+        Returns:
+            tuple: (capture time (ms since epoch), latitude, longitude, JPEG), or None if there are no frames.
+        """
+        segments = self.segments(stream)
+        position = bisect.bisect_right([start for start, _ in segments], time_ms) - 1
+        # A segment without frames yet (it is being started) is skipped for the one before it
+        for _, path in reversed(segments[:max(position, 0) + 1]):
+            segment = RecordedSegment(path)
+            try:
+                if len(segment):
+                    return segment.frame(max(segment.find(time_ms), 0))
+            finally:
+                segment.close()
+        return None
+
+    def nearest(self, stream, latitude, longitude):
+        """Gets the frame captured closest to a position. Every index record is read, the frames are not.
+
+        Args:
+            stream (str): The name of the stream.
+            latitude (float): The latitude.
+            longitude (float): The longitude.
+
+        Returns:
+            tuple: (capture time (ms since epoch), latitude, longitude, JPEG), or None if no frame has a position.
+        """
+        longitude_scale = math.cos(math.radians(latitude)) ** 2
+        best = None
+        for _, path in self.segments(stream):
+            segment = RecordedSegment(path)
+            try:
+                for index in range(len(segment)):
+                    _, _, _, frame_latitude, frame_longitude = segment.record(index)
+                    distance = (frame_latitude - latitude) ** 2 + longitude_scale * (frame_longitude - longitude) ** 2
+                    if math.isnan(distance):
+                        continue # The position was not known
+                    if best is None or distance < best[0]:
+                        best = (distance, path, index)
+            finally:
+                segment.close()
+        if best is None:
+            return None
+        segment = RecordedSegment(best[1])
+        try:
+            return segment.frame(best[2])
+        finally:
+            segment.close()
+
+
+class RecordedSegment:
+    """A memory-mapped segment of a recording.
+    Only the frames that were complete when the segment was opened are visible.
+    """
+    def __init__(self, path):
+        """Constructor
+
+        Args:
+            path (str): The path of the segment without an extension.
+        """
+        self.files = []
+        # The index is mapped first, every frame it has a record of is already in the .frames file
+        self.index = self.map(path + INDEX_EXTENSION)
+        self.frames = self.map(path + FRAMES_EXTENSION)
+        self.count = len(self.index) // INDEX_RECORD_SIZE if self.index is not None else 0
+
+    def map(self, path):
+        # Empty files cannot be mapped
+        f = open(path, "rb")
+        self.files.append(f)
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return self.count
+
+    def record(self, index):
+        """Gets an index record.
+
+        Args:
+            index (int): The number of the frame in the segment.
+
+        Returns:
+            tuple: (capture time (ms since epoch), offset, length, latitude, longitude)
+        """
+        return struct.unpack_from(INDEX_RECORD_FORMAT, self.index, index * INDEX_RECORD_SIZE)
+
+    def find(self, time_ms):
+        """Binary searches for the last frame captured at or before a time.
+
+        Args:
+            time_ms (int): The time (ms since epoch).
+
+        Returns:
+            int: The number of the frame in the segment, -1 if every frame is later.
+        """
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.record(middle)[0] <= time_ms:
+                low = middle + 1
+            else:
+                high = middle
+        return low - 1
+
+    def frame(self, index):
+        """Reads a frame.
+
+        Args:
+            index (int): The number of the frame in the segment.
+
+        Returns:
+            tuple: (capture time (ms since epoch), latitude, longitude, JPEG), positions that were not known are None.
+        """
+        time_ms, offset, length, latitude, longitude = self.record(index)
+        return (time_ms,
+                None if math.isnan(latitude) else latitude,
+                None if math.isnan(longitude) else longitude,
+                self.frames[offset:offset + length])
+
+    def close(self):
+        for mapping in (self.index, self.frames):
+            if mapping is not None:
+                mapping.close()
+        for f in self.files:
+            f.close()
+
+
+def segment_path(directory, stream, start_ms):
+    """Gets the path of a segment, without an extension.
+
+    Args:
+        directory (str): The directory of the recording.
+        stream (str): The name of the stream.
+        start_ms (int): The time of the segment's first frame (ms since epoch).
+
+    Returns:
+        str: The path.
+    """
+    # Zero padded so that the names sort by time
+    return os.path.join(directory, stream, "%015d" % start_ms)
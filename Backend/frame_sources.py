@@ -0,0 +1,141 @@
+import os
+import time
+import cv2
+import numpy
+from sys import platform
+
+CAMERA_RETRY_INTERVAL = 2 # Seconds between attempts to open a camera that is not available
+
+
+class CameraSource:
+    """Reads frames from a camera with OpenCV. The camera is opened on the first read and reopened if it fails.
+    """
+    def __init__(self, index=0, width=640, height=480, fps=10):
+        """Constructor
+
+        Args:
+            index (int, optional): The OpenCV index of the camera. Defaults to 0.
+            width (int, optional): The capture width. Defaults to 640.
+            height (int, optional): The capture height. Defaults to 480.
+            fps (int, optional): The frame rate asked of the camera. Defaults to 10.
+        """
+        self.index = index
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.camera = None
+        self.open_time = 0 # When the camera was last opened
+
+    def read(self):
+        """Reads the next frame, blocking until the camera has one.
+
+        Returns:
+            numpy.ndarray: The BGR frame, or None if the camera is not available.
+        """
+        if self.camera is None:
+            if time.time() - self.open_time < CAMERA_RETRY_INTERVAL:
+                return None
+            self.open_time = time.time()
+            if platform == "win32":
+                self.camera = cv2.VideoCapture(self.index, cv2.CAP_DSHOW)
+            else:
+                self.camera = cv2.VideoCapture(self.index)
+            if not self.camera.isOpened():
+                self.release()
+                return None
+            # Set camera resolution
+            self.camera.set(cv2.CAP_PROP_FRAME_WIDTH, self.width) # 1920 / 1280
+            self.camera.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height) # 1080 / 720
+            self.camera.set(cv2.CAP_PROP_FPS, self.fps)
+        ret, frame = self.camera.read()
+        if not ret:
+            print("[ERROR] Failed to read from camera " + str(self.index) + ", reopening it.")
+            self.release()
+            return None
+        return frame
+
+    def release(self):
+        if self.camera is not None:
+            self.camera.release()
+            self.camera = None
+
+
+class FileSource:
+    """Reads frames from a video file or a directory of images, looping at the end.
+    Stands in for the camera in tests and benchmarks.
+    """
+    def __init__(self, path):
+        """Constructor
+
+        Args:
+            path (str): A video file, or a directory of images read in name order.
+        """
+        self.path = path
+        self.video = None
+        self.images = None
+        self.index = 0
+        if os.path.isdir(path):
+            self.images = [os.path.join(path, name) for name in sorted(os.listdir(path))]
+        else:
+            self.video = cv2.VideoCapture(path)
+
+    def read(self):
+        """Reads the next frame.
+
+        Returns:
+            numpy.ndarray: The BGR frame, or None if there is no frame to read.
+        """
+        if self.images is not None:
+            for _ in range(len(self.images)):
+                frame = cv2.imread(self.images[self.index])
+                self.index = (self.index + 1) % len(self.images)
+                if frame is not None:
+                    return frame
+            return None
+        ret, frame = self.video.read()
+        if not ret:
+            # Start again from the first frame
+            self.video.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self.video.read()
+        return frame if ret else None
+
+    def release(self):
+        if self.video is not None:
+            self.video.release()
+
+
+class SyntheticSource:
+    """Generates moving test frames, a gradient with a square and the frame number on it.
+    Stands in for the camera in tests and benchmarks.
+    """
+    def __init__(self, width=640, height=480):
+        """Constructor
+
+        Args:
+            width (int, optional): The frame width. Defaults to 640.
+            height (int, optional): The frame height. Defaults to 480.
+        """
+        self.width = width
+        self.height = height
+        self.count = 0
+        self.background = numpy.zeros((height, width, 3), numpy.uint8)
+        self.background[:, :, 0] = numpy.linspace(0, 255, width).astype(numpy.uint8)
+        self.background[:, :, 1] = numpy.linspace(0, 255, height).astype(numpy.uint8)[:, numpy.newaxis]
+
+    def read(self):
+        """Generates the next frame.
+
+        Returns:
+            numpy.ndarray: The BGR frame.
+        """
+        self.count += 1
+        frame = numpy.roll(self.background, self.count * 4, axis=1)
+        size = self.height // 4
+        x = (self.count * 8) % (self.width - size)
+        y = (self.count * 4) % (self.height - size)
+        frame[y:y + size, x:x + size] = (0, 0, 255)
+        cv2.putText(frame, str(self.count), (10, self.height - 10), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+        return frame
+
+    def release(self):
+        pass
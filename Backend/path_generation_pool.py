@@ -0,0 +1,100 @@
+import threading
+import multiprocessing
+import SplineGenerator.PathGenerator as path_generator
+import SplineGenerator.SearchPathGenerator as spliner
+
+PATH_GENERATION_PROCESSES = 2 # Paths that are generated at the same time
+PATH_GENERATION_QUEUE = 2 # Requests that may wait for a process, more are refused until one finishes
+PATH_GENERATION_TIMEOUT = 120 # Seconds a request waits for its path
+
+
+class PathGenerationBusy(Exception):
+    """Raised when every process is generating a path and PATH_GENERATION_QUEUE requests are already waiting."""
+
+
+class PathGenerationPool:
+    """Generates paths in worker processes, so that path generation never holds the GIL of the server that sends
+    commands to the vehicles.
+
+    The pool has to be created before any other thread is started, the processes are forked on Linux and a forked
+    process only inherits the thread that forked it.
+    """
+    def __init__(self, processes=PATH_GENERATION_PROCESSES, queue_size=PATH_GENERATION_QUEUE):
+        """Constructor
+
+        Args:
+            processes (int, optional): The number of worker processes. Defaults to PATH_GENERATION_PROCESSES.
+            queue_size (int, optional): The number of requests that may wait for a process. Defaults to
+                PATH_GENERATION_QUEUE.
+        """
+        self.pool = multiprocessing.Pool(processes)
+        self.slots = threading.BoundedSemaphore(processes + queue_size)
+
+    def run(self, function, *args):
+        """Calls a function in a worker process and waits for it, blocking only the calling thread.
+
+        Args:
+            function (function): A module level function, it is pickled along with its arguments.
+            *args: The arguments of the function.
+
+        Raises:
+            PathGenerationBusy: Too many paths are being generated already.
+            multiprocessing.TimeoutError: The path was not generated within PATH_GENERATION_TIMEOUT.
+
+        Returns:
+            What the function returned.
+        """
+        if not self.slots.acquire(False):
+            raise PathGenerationBusy("Too many paths are being generated, try again once one is done.")
+        try:
+            return self.pool.apply_async(function, args).get(PATH_GENERATION_TIMEOUT)
+        finally:
+            self.slots.release()
+
+    def close(self):
+        """Stops the worker processes, paths that are being generated are abandoned.
+        """
+        self.pool.terminate()
+        self.pool.join()
+
+
+def generate_path(path_gen):
+    """Generates a path in a worker process.
+
+    Args:
+        path_gen (PathGenerator): A copy of the path generator with its parameters set.
+
+    Returns:
+        List[dict]: The waypoints of the path, or None if no solution was found.
+    """
+    return path_gen.generate_path()
+
+
+def generate_search_area_waypoints(waypoints, start_point, minimum_turn_radius, layer_distance, alt, cross_track_error):
+    """Splines a search area for OVERRIDE_FLIGHTPLANNER in a worker process, distances are scaled to degrees.
+
+    Args:
+        waypoints (List[dict]): The corners of the search area with keys: lat and long.
+        start_point (Coord): Where the plane starts from.
+        minimum_turn_radius (float): The minimum turn radius of the plane in degrees.
+        layer_distance (float): The distance between layers of the search path in degrees.
+        alt (float): The altitude of the waypoints.
+        cross_track_error (float): The furthest (metres) the decimated path may stray from the generated path.
+
+    Returns:
+        List[dict]: The waypoints of the path with keys: lat, long and alt, in order of flight.
+    """
+    waypoint_spliner = spliner.SearchPathGenerator()
+    waypoint_spliner.set_search_area(waypoints)
+    waypoint_spliner.set_parameters(minimum_turn_radius=minimum_turn_radius,     # The minimum turn radius of the plane
+                                    layer_distance=layer_distance,           # Distance between layers on map. Use this or both focal length and sensor size, not all three
+                                    curve_resolution=1000,             # How many waypoints per metre for curves
+                                    start_point=start_point,               # Where the plane takes off from. Leave as None if not known
+                                    focal_length=None,              # Focal length of the camera on board the plane in mm
+                                    sensor_size=None,               # Sensor size of the camera on board the plane as (width, height) in mm
+                                    paint_overlap=0.2,               # The percentage of overlap desired for the camera to see on consecutive layers
+                                    alt=alt                          # Default Alt to set waypoints to
+                                    )
+    waypoint_spliner.generate_search_area_path(do_plot=False)
+    splined_waypoints = waypoint_spliner.get_waypoints()
+    return path_generator.decimate_waypoints(splined_waypoints, cross_track_error)
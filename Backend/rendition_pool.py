@@ -0,0 +1,135 @@
+import threading
+import cv2
+import numpy
+from Queue import Queue
+
+RENDITION_WORKERS = 2 # Threads that encode renditions, OpenCV releases the GIL while it resizes, decodes and encodes
+# JPEGs are decoded straight to a smaller size when the scale is one of these, which is much cheaper than a full decode
+# followed by a resize
+REDUCED_DECODE_FLAGS = {0.5: cv2.IMREAD_REDUCED_COLOR_2, 0.25: cv2.IMREAD_REDUCED_COLOR_4,
+                        0.125: cv2.IMREAD_REDUCED_COLOR_8}
+
+
+class RenditionPool:
+    """A pool of threads that encodes the renditions of a video frame side by side.
+
+    The thread that asks for the renditions encodes one of them itself, so a frame that only needs one rendition is
+    never handed to another thread. The pool can be shared by several feeds.
+    """
+    def __init__(self, workers=RENDITION_WORKERS):
+        """Constructor
+
+        Args:
+            workers (int, optional): The number of worker threads. Defaults to RENDITION_WORKERS.
+        """
+        self.jobs = Queue()
+        self.threads = [threading.Thread(target=self.work, name="rendition_worker_" + str(i)) for i in range(workers)]
+        for thread in self.threads:
+            thread.daemon = True
+            thread.start()
+
+    def map(self, function, items):
+        """Calls a function with every item, side by side, and waits for all of them.
+
+        Args:
+            function (function): Called with each item.
+            items (List): The items.
+
+        Raises:
+            Exception: The first exception raised by a call, once every call has finished.
+
+        Returns:
+            List: What the function returned for each item.
+        """
+        batch = Batch(len(items))
+        for index, item in enumerate(items[1:], 1):
+            self.jobs.put((batch, index, function, item))
+        if items:
+            batch.run(0, function, items[0])
+        return batch.wait()
+
+    def work(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            batch, index, function, item = job
+            batch.run(index, function, item)
+
+    def close(self):
+        """Stops the worker threads once the jobs that are queued are done.
+        """
+        for _ in self.threads:
+            self.jobs.put(None)
+
+
+class Batch:
+    """The calls of one RenditionPool.map.
+    """
+    def __init__(self, size):
+        self.condition = threading.Condition()
+        self.results = [None] * size
+        self.error = None
+        self.remaining = size
+
+    def run(self, index, function, item):
+        error = None
+        try:
+            self.results[index] = function(item)
+        except Exception as e:
+            error = e
+        with self.condition:
+            self.error = self.error or error
+            self.remaining -= 1
+            if not self.remaining:
+                self.condition.notify()
+
+    def wait(self):
+        # Waiting without a timeout blocks on a lock, a timed wait would poll on Python 2
+        with self.condition:
+            while self.remaining:
+                self.condition.wait()
+        if self.error is not None:
+            raise self.error
+        return self.results
+
+
+def encode_frame(frame, scale, quality):
+    """Encodes a frame as a JPEG.
+
+    Args:
+        frame (numpy.ndarray): The BGR frame.
+        scale (float): The size of the JPEG relative to the frame.
+        quality (int): The JPEG quality.
+
+    Returns:
+        tuple: (the JPEG, its width, its height)
+    """
+    if scale != 1:
+        frame = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    jpeg = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), quality])[1].tobytes()
+    return jpeg, frame.shape[1], frame.shape[0]
+
+
+def reencode_jpeg(jpeg, scale, quality):
+    """Encodes a smaller copy of a JPEG.
+
+    Args:
+        jpeg (str): The JPEG.
+        scale (float): The size of the copy relative to the JPEG, less than 1.
+        quality (int): The JPEG quality of the copy.
+
+    Returns:
+        tuple: (the JPEG, its width, its height)
+    """
+    data = numpy.frombuffer(jpeg, numpy.uint8)
+    reduced_flag = REDUCED_DECODE_FLAGS.get(scale)
+    if reduced_flag is not None:
+        frame = cv2.imdecode(data, reduced_flag)
+        if frame is not None:
+            return encode_frame(frame, 1, quality)
+    frame = cv2.imdecode(data, cv2.IMREAD_COLOR)
+    if frame is None:
+        raise ValueError("the frame is not a JPEG")
+    return encode_frame(frame, scale, quality)
+
@@ -0,0 +1,70 @@
+"""
+Tests for the ClientRegistry of the Dronelink WebSocket server.
+
+Usage (from the Backend directory):
+    py -2.7 -m unittest discover tests
+"""
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from client_registry import ClientRegistry
+
+TOPICS = ["LIVE_DATA", "VISION_CAM"]
+
+
+class Client(object):
+    """Stands in for a WebSocket connection, which is hashed by identity."""
+
+
+class ClientRegistryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = ClientRegistry(TOPICS)
+        self.clients = [Client() for _ in range(3)]
+
+    def test_join(self):
+        states = [self.registry.join(client) for client in self.clients]
+        self.assertEqual(len(self.registry), 3)
+        self.assertEqual(self.registry.snapshot(), tuple(states))
+        self.assertIs(self.registry.get(self.clients[1]), states[1])
+        self.assertIs(states[1].client, self.clients[1])
+        self.assertEqual(states[1].topics, set(TOPICS))
+
+    def test_leave(self):
+        states = [self.registry.join(client) for client in self.clients]
+        self.assertIs(self.registry.leave(self.clients[1]), states[1])
+        self.assertEqual(self.registry.snapshot(), (states[0], states[2]))
+        self.assertIsNone(self.registry.get(self.clients[1]))
+        self.assertIsNone(self.registry.leave(self.clients[1]))
+        self.assertEqual(len(self.registry), 2)
+
+    def test_snapshot_is_not_changed_by_joins_and_leaves(self):
+        first = self.registry.join(self.clients[0])
+        snapshot = self.registry.snapshot()
+        self.assertIs(self.registry.snapshot(), snapshot)
+        self.registry.join(self.clients[1])
+        self.registry.leave(self.clients[0])
+        self.assertEqual(snapshot, (first,))
+        self.assertEqual([state.client for state in self.registry.snapshot()], [self.clients[1]])
+
+    def test_empty_registry(self):
+        self.assertEqual(self.registry.snapshot(), ())
+        self.assertEqual(self.registry.subscribers("LIVE_DATA"), [])
+
+    def test_subscribers(self):
+        states = [self.registry.join(client) for client in self.clients]
+        states[0].topics.discard("VISION_CAM")
+        self.assertEqual(self.registry.subscribers("VISION_CAM"), states[1:])
+        self.assertEqual(self.registry.subscribers("LIVE_DATA"), states)
+
+    def test_each_client_gets_its_own_topics(self):
+        first, second = [self.registry.join(client) for client in self.clients[:2]]
+        first.topics.discard("LIVE_DATA")
+        self.assertEqual(second.topics, set(TOPICS))
+        self.assertEqual(self.registry.topics, TOPICS)
+
+
+if __name__ == '__main__':
+    unittest.main()
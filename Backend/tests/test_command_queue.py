@@ -0,0 +1,78 @@
+"""
+Tests for the two lane CommandQueue of the Mission Planner link.
+
+Usage (from the Backend directory):
+    py -2.7 -m unittest discover tests
+"""
+import os
+import sys
+import time
+import threading
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from CommunicationScript.command_queue import CommandQueue
+
+
+def telemetry(sequence, messages=None):
+    data = {"sequence": sequence}
+    if messages is not None:
+        data["messages"] = messages
+    return {"command": "LIVE_DRONE_DATA", "data": data}
+
+
+class CommandQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.queue = CommandQueue()
+
+    def test_control_commands_come_first_in_order(self):
+        self.queue.put_telemetry(telemetry(1))
+        self.queue.put_control({"command": "FIRST"})
+        self.queue.put_control({"command": "SECOND"})
+        self.assertEqual(len(self.queue), 3)
+        self.assertEqual(self.queue.get()["command"], "FIRST")
+        self.assertEqual(self.queue.get()["command"], "SECOND")
+        self.assertEqual(self.queue.get()["data"]["sequence"], 1)
+        self.assertEqual(len(self.queue), 0)
+
+    def test_latest_telemetry_wins(self):
+        for sequence in range(5):
+            self.queue.put_telemetry(telemetry(sequence))
+        self.assertEqual(len(self.queue), 1)
+        self.assertEqual(self.queue.get()["data"]["sequence"], 4)
+        self.assertEqual(self.queue.coalesced, 4)
+
+    def test_messages_of_replaced_telemetry_are_kept(self):
+        self.queue.put_telemetry(telemetry(1, ["armed"]))
+        self.queue.put_telemetry(telemetry(2))
+        self.queue.put_telemetry(telemetry(3, ["mode AUTO"]))
+        self.assertEqual(self.queue.get()["data"], {"sequence": 3, "messages": ["armed", "mode AUTO"]})
+
+    def test_get_times_out(self):
+        start = time.time()
+        self.assertIsNone(self.queue.get(timeout=0.05))
+        self.assertGreaterEqual(time.time() - start, 0.04)
+
+    def test_get_wakes_up_when_a_command_is_put(self):
+        received = []
+        getter = threading.Thread(target=lambda: received.append(self.queue.get()))
+        getter.start()
+        time.sleep(0.05)
+        self.queue.put_control({"command": "WAKE"})
+        getter.join(1)
+        self.assertEqual(received, [{"command": "WAKE"}])
+
+    def test_close_wakes_up_get(self):
+        received = []
+        getter = threading.Thread(target=lambda: received.append(self.queue.get()))
+        getter.start()
+        time.sleep(0.05)
+        self.queue.close()
+        getter.join(1)
+        self.assertFalse(getter.is_alive())
+        self.assertEqual(received, [None])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+"""
+Tests for the topic subscriptions of DronelinkWebSocketServer.
+
+Usage (from the Backend directory):
+    py -2.7 -m unittest discover tests
+"""
+import os
+import sys
+import json
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import DronelinkWebSocketServer
+from DronelinkWebSocketServer import WebSocketServer, TOPICS, TOPIC_LIVE_DATA, TOPIC_VISION_CAM, TOPIC_FPV_CAM
+from client_registry import ClientRegistry
+
+
+class RecordingClient(WebSocketServer):
+    def sendMessage(self, data):
+        self.sent.append(json.loads(data))
+
+
+class SubscriptionTest(unittest.TestCase):
+
+    def setUp(self):
+        DronelinkWebSocketServer.client_registry = ClientRegistry(TOPICS)
+        self.client = RecordingClient(None, None, ("127.0.0.1", 0))
+        self.client.sent = []
+        self.state = DronelinkWebSocketServer.client_registry.join(self.client)
+
+    def receive(self, message):
+        self.client.data = json.dumps(message)
+        self.client.handleMessage()
+
+    def subscription(self):
+        return set(self.state.topics), dict(self.state.renditions), self.state.live_data_rate
+
+    def test_subscribe(self):
+        self.receive({"command": "UNSUBSCRIBE"})
+        self.assertEqual(self.state.topics, set())
+        self.receive({"command": "SUBSCRIBE", "topics": [TOPIC_LIVE_DATA, TOPIC_VISION_CAM], "rendition": "thumb",
+                      "rate": 2})
+        self.assertEqual(self.subscription(), ({TOPIC_LIVE_DATA, TOPIC_VISION_CAM}, {TOPIC_VISION_CAM: "thumb"}, 2))
+        self.assertEqual(self.client.sent, [])
+
+    def test_unsubscribe(self):
+        self.receive({"command": "UNSUBSCRIBE", "topics": [TOPIC_FPV_CAM]})
+        self.assertEqual(self.state.topics, {TOPIC_LIVE_DATA, TOPIC_VISION_CAM})
+
+    def test_subscribe_without_rate_sends_full_rate(self):
+        self.receive({"command": "SUBSCRIBE", "topics": [TOPIC_LIVE_DATA], "rate": 2})
+        self.receive({"command": "SUBSCRIBE", "topics": [TOPIC_LIVE_DATA]})
+        self.assertIsNone(self.state.live_data_rate)
+
+    def test_invalid_messages_change_nothing(self):
+        self.receive({"command": "UNSUBSCRIBE", "topics": [TOPIC_VISION_CAM]})
+        before = self.subscription()
+        invalid = [{"rate": "10"}, {"rate": True}, {"rate": []}, {"rate": 0}, {"rate": 1000},
+                   {"rendition": "huge"}, {"topics": [TOPIC_VISION_CAM, "UNKNOWN"]}, {"topics": TOPIC_VISION_CAM}]
+        for fields in invalid:
+            message = {"command": "SUBSCRIBE", "topics": [TOPIC_LIVE_DATA, TOPIC_VISION_CAM], "rendition": "half",
+                       "rate": 5}
+            message.update(fields)
+            self.receive(message)
+            self.assertEqual(self.subscription(), before, fields)
+            self.assertEqual(self.client.sent.pop()["command"], "ERROR", fields)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+"""
+Tests for recording video frames with FrameRecorder and reading them back with RecordingReader.
+
+Usage (from the Backend directory):
+    py -2.7 -m unittest discover tests
+"""
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from frame_recorder import FrameRecorder, RecordingReader, SEGMENT_SECONDS
+
+START = 1700000000 # s since epoch
+STREAM = "VISION_CAM"
+
+
+def jpeg(second):
+    return ("jpeg of second %d" % second).encode("ascii")
+
+
+class FrameRecorderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.reader = RecordingReader(self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def record(self, frames, stream=STREAM):
+        """Records (second after START, latitude, longitude) frames, the JPEG of a frame is jpeg(second)."""
+        positions = [(latitude, longitude) for _, latitude, longitude in frames]
+        recorder = FrameRecorder(self.directory, position=lambda: positions.pop(0))
+        recorder.start()
+        for second, _, _ in frames:
+            recorder.record(stream, START + second, jpeg(second))
+        recorder.close()
+        recorder.join()
+        self.assertEqual(recorder.frames_dropped, 0)
+
+    def assertFrame(self, frame, second):
+        self.assertEqual((frame[0], frame[3]), ((START + second) * 1000, jpeg(second)))
+
+    def test_frame_at(self):
+        self.record([(second, None, None) for second in range(0, 50, 10)])
+        self.assertFrame(self.reader.frame_at(STREAM, (START + 25) * 1000), 20)
+        self.assertFrame(self.reader.frame_at(STREAM, (START + 30) * 1000), 30)
+        # Before the first frame the first frame is shown, after the last frame the last one
+        self.assertFrame(self.reader.frame_at(STREAM, (START - 5) * 1000), 0)
+        self.assertFrame(self.reader.frame_at(STREAM, (START + 500) * 1000), 40)
+        self.assertEqual(self.reader.frame_at(STREAM, (START + 25) * 1000)[1:3], (None, None))
+
+    def test_frame_at_across_segments(self):
+        seconds = range(0, 3 * SEGMENT_SECONDS, 10)
+        self.record([(second, None, None) for second in seconds])
+        self.assertEqual(len(self.reader.segments(STREAM)), 3)
+        self.assertFrame(self.reader.frame_at(STREAM, (START + SEGMENT_SECONDS) * 1000 - 1), SEGMENT_SECONDS - 10)
+        self.assertFrame(self.reader.frame_at(STREAM, (START + SEGMENT_SECONDS + 5) * 1000), SEGMENT_SECONDS)
+        for second in seconds:
+            self.assertFrame(self.reader.frame_at(STREAM, (START + second) * 1000), second)
+
+    def test_summary(self):
+        self.record([(second, None, None) for second in range(0, 2 * SEGMENT_SECONDS, 15)])
+        self.assertEqual(self.reader.streams(), [STREAM])
+        self.assertEqual(self.reader.summary(STREAM), {"start": START * 1000, "end": (START + 105) * 1000,
+                                                      "frames": 8, "segments": 2})
+        self.assertIsNone(self.reader.summary("FPV_CAM"))
+        self.assertIsNone(self.reader.frame_at("FPV_CAM", START * 1000))
+
+    def test_nearest(self):
+        self.record([(0, -38.40, 144.88), (10, None, None), (20, -38.41, 144.89),
+                     (SEGMENT_SECONDS + 10, -38.42, 144.90)])
+        frame = self.reader.nearest(STREAM, -38.411, 144.891)
+        self.assertFrame(frame, 20)
+        self.assertAlmostEqual(frame[1], -38.41, places=5)
+        self.assertAlmostEqual(frame[2], 144.89, places=5)
+        self.assertFrame(self.reader.nearest(STREAM, -38.43, 144.91), SEGMENT_SECONDS + 10)
+
+    def test_nearest_without_positions(self):
+        self.record([(0, None, None), (10, None, None)])
+        self.assertIsNone(self.reader.nearest(STREAM, -38.4, 144.88))
+
+    def test_clock_stepping_back_keeps_the_index_sorted(self):
+        self.record([(10, None, None), (5, None, None), (20, None, None)])
+        frame = self.reader.frame_at(STREAM, (START + 15) * 1000)
+        self.assertEqual(frame[3], jpeg(5))
+        self.assertEqual(frame[0], (START + 10) * 1000)
+
+
+if __name__ == '__main__':
+    unittest.main()
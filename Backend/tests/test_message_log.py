@@ -0,0 +1,51 @@
+"""
+Tests for the MessageLog ring buffer of the Mission Planner status messages.
+
+Usage (from the Backend directory):
+    py -2.7 -m unittest discover tests
+"""
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from CommunicationScript.message_log import MessageLog
+
+
+def messages(first, count):
+    return [{"time": str(seq), "message": "message " + str(seq)} for seq in range(first, first + count)]
+
+
+class MessageLogTest(unittest.TestCase):
+
+    def setUp(self):
+        self.log = MessageLog(capacity=5)
+
+    def test_cursor_only_returns_new_messages(self):
+        self.log.extend(messages(0, 3))
+        received, cursor = self.log.since(0)
+        self.assertEqual((received, cursor), (messages(0, 3), 3))
+        self.assertEqual(self.log.since(cursor), ([], 3))
+        self.log.extend(messages(3, 2))
+        self.assertEqual(self.log.since(cursor), (messages(3, 2), 5))
+
+    def test_oldest_messages_are_dropped_when_full(self):
+        self.log.extend(messages(0, 4))
+        self.log.extend(messages(4, 4))
+        self.assertEqual(len(self.log), 5)
+        # A reader that fell behind gets the messages that are still kept
+        self.assertEqual(self.log.since(0), (messages(3, 5), 8))
+        self.assertEqual(self.log.since(6), (messages(6, 2), 8))
+
+    def test_limit_returns_the_latest_messages(self):
+        self.log.extend(messages(0, 5))
+        self.assertEqual(self.log.since(0, limit=2), (messages(3, 2), 5))
+        self.assertEqual(self.log.since(4, limit=2), (messages(4, 1), 5))
+
+    def test_cursor_ahead_of_the_log(self):
+        self.log.extend(messages(0, 2))
+        self.assertEqual(self.log.since(10), ([], 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
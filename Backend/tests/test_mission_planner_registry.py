@@ -0,0 +1,118 @@
+"""
+Tests for the routing of commands and telemetry between the vehicles of a MissionPlannerRegistry.
+
+Local sockets stand in for the Communication Script of each vehicle.
+
+Usage (from the Backend directory):
+    py -2.7 -m unittest discover tests
+"""
+import os
+import sys
+import json
+import socket
+import threading
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from CommunicationScript.mission_planner_registry import MissionPlannerRegistry, DEFAULT_VEHICLE_ID
+from CommunicationScript.framing import FrameBuffer, encode_frame, FRAME_JSON
+
+
+class CommunicationScriptStandIn:
+    """Accepts the link of one vehicle and exchanges JSON frames with it."""
+    def __init__(self):
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.bind(("127.0.0.1", 0))
+        self.server.listen(1)
+        self.port = self.server.getsockname()[1]
+        self.connection = None
+        self.frame_buffer = FrameBuffer()
+        self.received = []
+
+    def accept(self):
+        self.connection, _ = self.server.accept()
+        self.connection.settimeout(2)
+
+    def receive(self):
+        """Returns the next command the backend sent."""
+        while not self.received:
+            self.frame_buffer.feed(self.connection.recv(4096))
+            self.received.extend(json.loads(data) for frame_type, data in self.frame_buffer.frames()
+                                 if frame_type == FRAME_JSON and data != b"quit")
+        return self.received.pop(0)
+
+    def send(self, command):
+        self.connection.sendall(encode_frame(json.dumps(command).encode("utf-8")))
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+        self.server.close()
+
+
+class MissionPlannerRegistryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.stand_ins = {}
+        self.registry = MissionPlannerRegistry(0)
+
+    def tearDown(self):
+        self.registry.close()
+        for stand_in in self.stand_ins.values():
+            stand_in.close()
+
+    def connect(self, vehicle_id):
+        stand_in = CommunicationScriptStandIn()
+        self.stand_ins[vehicle_id] = stand_in
+        self.assertTrue(self.registry.connect("127.0.0.1", vehicle_id=vehicle_id, port=stand_in.port))
+        stand_in.accept()
+        self.assertEqual(stand_in.receive()["command"], "HELLO")
+        return stand_in
+
+    def test_default_vehicle(self):
+        self.assertIs(self.registry.get(), self.registry.get(DEFAULT_VEHICLE_ID))
+        self.assertIsNone(self.registry.get("unknown"))
+
+    def test_commands_are_routed_to_their_vehicle(self):
+        first = self.connect("first")
+        second = self.connect("second")
+        self.registry.get("second").set_telemetry_rate(5)
+        self.registry.get("first").set_telemetry_rate(10)
+        self.assertEqual(first.receive(), {"command": "SET_TELEMETRY_RATE", "rate": 10})
+        self.assertEqual(second.receive(), {"command": "SET_TELEMETRY_RATE", "rate": 5})
+        self.assertEqual(sorted(vehicle_id for vehicle_id, _ in self.registry.snapshot()),
+                         sorted([DEFAULT_VEHICLE_ID, "first", "second"]))
+
+    def test_telemetry_is_published_with_its_vehicle_id(self):
+        published = []
+        received = threading.Event()
+        def listener(vehicle_id, snapshot):
+            published.append((vehicle_id, snapshot.data["alt"]))
+            received.set()
+        self.registry.add_telemetry_listener(listener)
+        self.connect("first")
+        second = self.connect("second")
+        second.send({"command": "LIVE_DRONE_DATA", "data": {"alt": 120, "lifeline_status": 200, "messages": []}})
+        self.assertTrue(received.wait(2))
+        self.assertEqual(published, [("second", 120)])
+        self.assertEqual(self.registry.get("second").telemetry.data["alt"], 120)
+        self.assertEqual(self.registry.get("first").telemetry.data, {})
+
+    def test_vehicle_that_failed_to_connect_is_not_kept(self):
+        stand_in = CommunicationScriptStandIn()
+        port = stand_in.port
+        stand_in.close()
+        self.assertFalse(self.registry.connect("127.0.0.1", vehicle_id="first", port=port))
+        self.assertIsNone(self.registry.get("first"))
+        self.assertFalse(self.registry.connect("127.0.0.1", port=port))
+        self.assertIsNotNone(self.registry.get())
+
+    def test_connected_vehicle_cannot_connect_again(self):
+        stand_in = self.connect("first")
+        link = self.registry.get("first")
+        self.assertFalse(self.registry.connect("127.0.0.1", vehicle_id="first", port=stand_in.port))
+        self.assertIs(self.registry.get("first"), link)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+"""
+Tests for the waypoint decimation of SplineGenerator.PathGenerator.
+
+Usage (from the Backend directory):
+    py -2.7 -m unittest discover tests
+"""
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from SplineGenerator.PathGenerator import decimate_waypoints
+
+
+def waypoints(*coordinates):
+    return [{"lat": lat, "long": lng, "alt": 100, "id": 16} for lat, lng in coordinates]
+
+
+class DecimateWaypointsTest(unittest.TestCase):
+
+    def test_straight_line_is_decimated(self):
+        path = waypoints((0, 0), (0, 0.0001), (0, 0.0002), (0, 0.0003))
+        self.assertEqual(decimate_waypoints(path, 5), [path[0], path[-1]])
+
+    def test_corner_is_kept(self):
+        path = waypoints((0, 0), (0, 0.001), (0.001, 0.001))
+        self.assertEqual(decimate_waypoints(path, 5), path)
+
+    def test_reversal_is_kept(self):
+        # Out to 0.001 degrees (about 111 m) and back to 0.0005, the turn is about 55 m beyond the end of the
+        # decimated leg even though it is on the line through it
+        path = waypoints((0, 0), (0, 0.001), (0, 0.0005))
+        self.assertEqual(decimate_waypoints(path, 5), path)
+
+    def test_loop_back_to_start_is_kept(self):
+        path = waypoints((0, 0), (0, 0.001), (0, 0))
+        self.assertEqual(decimate_waypoints(path, 5), path)
+
+    def test_other_commands_are_kept(self):
+        path = waypoints((0, 0), (0, 0.0001), (0, 0.0002))
+        path.insert(2, {"lat": 0, "long": 0, "alt": 0, "id": 3000})
+        self.assertEqual(decimate_waypoints(path, 5), path)
+
+
+if __name__ == '__main__':
+    unittest.main()
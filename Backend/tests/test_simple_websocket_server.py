@@ -0,0 +1,324 @@
+"""
+Tests for SimpleWebSocketServer: parsing and building frames, broadcast, latest frame wins streams, the send path
+and the epoll loop.
+
+Usage (from the Backend directory):
+    py -2.7 -m unittest discover tests
+"""
+import os
+import sys
+import zlib
+import errno
+import socket
+import random
+import struct
+import threading
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import SimpleWebSocketServer as sws
+from SimpleWebSocketServer import SimpleWebSocketServer, WebSocket, HAS_EPOLL, TEXT, BINARY, DEFLATE_TAIL, _buildFrame
+
+
+class RecordingWebSocket(WebSocket):
+   def handleMessage(self):
+      self.messages.append(self.data)
+
+
+def compressed_frame(message):
+   """A masked permessage-deflate text frame, as a client sends it."""
+   compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+   payload = compressor.compress(message.encode('utf-8')) + compressor.flush(zlib.Z_SYNC_FLUSH)
+   assert payload.endswith(DEFLATE_TAIL)
+   payload = bytearray(payload[:-len(DEFLATE_TAIL)])
+   if len(payload) < 126:
+      header = struct.pack('!BB', 0x80 | 0x40 | TEXT, 0x80 | len(payload))
+   elif len(payload) < 65536:
+      header = struct.pack('!BBH', 0x80 | 0x40 | TEXT, 0x80 | 126, len(payload))
+   else:
+      header = struct.pack('!BBQ', 0x80 | 0x40 | TEXT, 0x80 | 127, len(payload))
+   mask = bytearray(os.urandom(4))
+   masked = bytearray(b ^ mask[i % 4] for i, b in enumerate(payload))
+   return bytearray(header) + mask + masked
+
+
+def random_text(length):
+   # Random letters barely compress, so the compressed frame is about as long as the message
+   generator = random.Random(length)
+   return u''.join(generator.choice(u'abcdefghijklmnopqrstuvwxyz0123456789') for _ in range(length))
+
+
+def handshaked_client(server, port):
+   client = WebSocket(server, None, ('127.0.0.1', port))
+   client.handshaked = True
+   return client
+
+
+def parse_frame(frame):
+   """The first byte and the payload of an unmasked frame, as the server sends it."""
+   frame = bytearray(frame)
+   length, offset = frame[1] & 0x7F, 2
+   if length == 126:
+      length, offset = struct.unpack('!H', bytes(frame[2:4]))[0], 4
+   elif length == 127:
+      length, offset = struct.unpack('!Q', bytes(frame[2:10]))[0], 10
+   assert len(frame) == offset + length
+   return frame[0], bytes(frame[offset:])
+
+
+class CompressedFrameTest(unittest.TestCase):
+
+   def setUp(self):
+      self.websocket = RecordingWebSocket(None, None, ('127.0.0.1', 0))
+      self.websocket.messages = []
+      self.websocket.deflate = True
+      self.websocket.decompressor = zlib.decompressobj(-15)
+
+   def receive(self, *chunks):
+      for chunk in chunks:
+         self.websocket.recvbuffer.extend(chunk)
+         self.websocket._parseFrames()
+
+   def assertReceivedInParts(self, message, split):
+      frame = compressed_frame(message)
+      self.receive(frame[:split], frame[split:])
+      self.assertEqual(self.websocket.messages, [message])
+      self.assertFalse(self.websocket.inflating)
+
+   def test_split_in_payload(self):
+      self.assertReceivedInParts(u'hello ' * 10, 8)
+
+   def test_split_in_16_bit_length(self):
+      message = random_text(1000)
+      self.assertEqual(compressed_frame(message)[1] & 0x7F, 126)
+      self.assertReceivedInParts(message, 3)
+
+   def test_split_in_64_bit_length(self):
+      message = random_text(120000)
+      self.assertEqual(compressed_frame(message)[1] & 0x7F, 127)
+      self.assertReceivedInParts(message, 6)
+
+   def test_split_after_extended_length(self):
+      self.assertReceivedInParts(random_text(1000), 8)
+
+   def test_messages_after_split_frame(self):
+      first = compressed_frame(random_text(1000))
+      second = compressed_frame(u'second')
+      self.receive(first[:3], first[3:] + second[:1], second[1:])
+      self.assertEqual(self.websocket.messages, [random_text(1000), u'second'])
+
+
+class BuildFrameTest(unittest.TestCase):
+
+   def test_parts_are_framed_as_one_payload(self):
+      header = struct.pack('!BIQ', 0, 7, 1234)
+      for length in (100, 1000, 70000):
+         body = os.urandom(length)
+         self.assertEqual(_buildFrame(False, BINARY, (header, body)), _buildFrame(False, BINARY, header + body))
+
+
+class BroadcastTest(unittest.TestCase):
+
+   def setUp(self):
+      self.server = SimpleWebSocketServer('127.0.0.1', 0, WebSocket)
+      self.clients = [handshaked_client(self.server, port) for port in range(3)]
+
+   def tearDown(self):
+      self.server.close()
+
+   def queued(self):
+      return [client.sendq.popleft() for client in self.clients]
+
+   def test_frame_is_built_once_for_every_client(self):
+      self.server.broadcast(u'hello', self.clients)
+      queued = self.queued()
+      self.assertEqual(queued[0], (TEXT, _buildFrame(False, TEXT, u'hello')))
+      for opcode, frame in queued[1:]:
+         self.assertIs(frame, queued[0][1])
+
+   def test_opcode(self):
+      self.server.broadcast(u'text', self.clients)
+      self.server.broadcast(bytearray(b'binary'), self.clients)
+      self.server.broadcast((b'head', b'body'), self.clients)
+      client = self.clients[0]
+      self.assertEqual([(opcode, parse_frame(frame)) for opcode, frame in client.sendq],
+                       [(TEXT, (0x80 | TEXT, b'text')), (BINARY, (0x80 | BINARY, b'binary')),
+                        (BINARY, (0x80 | BINARY, b'headbody'))])
+
+   def test_only_open_handshaked_clients_are_sent_to(self):
+      self.clients[1].handshaked = False
+      self.clients[2].closed = True
+      self.server.broadcast(u'hello')
+      self.assertEqual(self.server.connections, {})
+      self.server.broadcast(u'hello', self.clients)
+      self.assertEqual([len(client.sendq) for client in self.clients], [1, 0, 0])
+
+   def test_clients_without_context_takeover_share_a_compressed_frame(self):
+      for client, wbits in zip(self.clients, (15, 15, 12)):
+         client.deflate = True
+         client.deflateWbits = wbits
+      message = random_text(100) * 10
+      self.server.broadcast(message, self.clients)
+      queued = self.queued()
+      self.assertIs(queued[0][1], queued[1][1])
+      self.assertIsNot(queued[0][1], queued[2][1])
+      for (opcode, frame), wbits in zip(queued, (15, 15, 12)):
+         b1, payload = parse_frame(frame)
+         self.assertEqual(b1, 0x80 | 0x40 | TEXT)
+         self.assertLess(len(payload), len(message))
+         self.assertEqual(zlib.decompressobj(-wbits).decompress(payload + DEFLATE_TAIL), message.encode('utf-8'))
+
+   def test_context_takeover_compresses_each_client_when_sent(self):
+      client = self.clients[0]
+      client.deflate = True
+      client.compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+      self.server.broadcast(u'hello', [client])
+      self.assertIsInstance(client.sendq[0][1], sws._DeflateMessage)
+      [(opcode, frame)] = self.server._takeFrames(client)
+      b1, payload = parse_frame(frame)
+      self.assertEqual(b1, 0x80 | 0x40 | TEXT)
+      self.assertEqual(zlib.decompressobj(-15).decompress(payload + DEFLATE_TAIL), b'hello')
+
+   def test_binary_is_not_compressed_by_default(self):
+      for client in self.clients:
+         client.deflate = True
+      self.server.broadcast(bytearray(b'jpeg'), self.clients)
+      self.server.broadcast(u'no compression', self.clients, compress=False)
+      client = self.clients[0]
+      self.assertEqual([parse_frame(frame)[0] for opcode, frame in client.sendq], [0x80 | BINARY, 0x80 | TEXT])
+
+
+class PartialSocket(object):
+   """Takes the first sends in the given sizes (0 for a full buffer), then everything."""
+   def __init__(self, *accepts):
+      self.accepts = list(accepts)
+      self.received = b''
+
+   def send(self, data):
+      data = data.tobytes() if isinstance(data, memoryview) else bytes(data)
+      if self.accepts:
+         accept = self.accepts.pop(0)
+         if not accept:
+            raise socket.error(errno.EAGAIN, 'would block')
+         data = data[:accept]
+      self.received += data
+      return len(data)
+
+
+class PartialSendTest(unittest.TestCase):
+
+   def setUp(self):
+      self.server = SimpleWebSocketServer('127.0.0.1', 0, WebSocket)
+      # coalesce by copying, as on Python 2
+      self.hasSendmsg = sws._HAS_SENDMSG
+      sws._HAS_SENDMSG = False
+
+   def tearDown(self):
+      sws._HAS_SENDMSG = self.hasSendmsg
+      self.server.close()
+
+   def test_rest_of_partial_frame_coalesced_with_next_frames(self):
+      sock = PartialSocket(5, 0)
+      client = WebSocket(self.server, sock, ('127.0.0.1', 0))
+      client.handshaked = True
+      messages = [u'hello world 1', u'hello world 2', u'hello world 3']
+      for message in messages:
+         self.server.broadcast(message, [client], compress=False)
+
+      self.assertFalse(self.server._sendQueued(client))
+      self.assertEqual(len(sock.received), 5)
+      self.assertTrue(self.server._sendQueued(client))
+      self.assertEqual(sock.received, b''.join(_buildFrame(False, TEXT, message) for message in messages))
+      self.assertEqual(self.server.statsSnapshot()['framesSent'], 3)
+
+
+class LatestFrameTest(unittest.TestCase):
+
+   def setUp(self):
+      self.server = SimpleWebSocketServer('127.0.0.1', 0, WebSocket)
+      self.client = handshaked_client(self.server, 1)
+      self.server.connections[1] = self.client
+
+   def tearDown(self):
+      self.server.connections.clear()
+      self.server.close()
+
+   def sent(self):
+      return [parse_frame(frame)[1] for opcode, frame in self.server._takeFrames(self.client)]
+
+   def test_newest_frame_of_a_stream_wins(self):
+      for frame in (u'frame 1', u'frame 2', u'frame 3'):
+         self.server.broadcast(frame, stream='video')
+      self.assertEqual(self.sent(), [b'frame 3'])
+      self.assertEqual(self.client.dropped, {'video': 2})
+      self.assertEqual(self.server.droppedFrames(), {('127.0.0.1', 1): {'video': 2}})
+
+   def test_reliable_frames_are_never_dropped_and_sent_first(self):
+      self.server.broadcast(u'video 1', stream='video')
+      self.server.broadcast(u'chat 1')
+      self.server.broadcast(u'video 2', stream='video')
+      self.server.broadcast(u'chat 2')
+      self.assertEqual(self.sent(), [b'chat 1', b'chat 2', b'video 2'])
+      self.assertEqual(self.client.dropped, {'video': 1})
+
+   def test_streams_are_sent_oldest_first(self):
+      self.server.broadcast(u'video 1', stream='video')
+      self.server.broadcast(u'health 1', stream='health')
+      self.server.broadcast(u'video 2', stream='video')
+      self.assertEqual(self.sent(), [b'health 1', b'video 2'])
+
+   def test_onsend_is_only_called_for_frames_that_are_sent(self):
+      sent = []
+      for frame in (u'frame 1', u'frame 2'):
+         self.server.broadcast(frame, stream='video', onsend=lambda client, frame=frame: sent.append(frame))
+      self.assertEqual(sent, [])
+      self.sent()
+      self.assertEqual(sent, [u'frame 2'])
+      self.assertEqual(self.sent(), [])
+
+
+@unittest.skipUnless(HAS_EPOLL, 'epoll is only available on Linux')
+class EpollWakeupTest(unittest.TestCase):
+
+   def setUp(self):
+      self.server = sws.SimpleEpollWebSocketServer('127.0.0.1', 0, WebSocket)
+      self.clients = []
+      for port in range(100):
+         client = WebSocket(self.server, None, ('127.0.0.1', port))
+         client.handshaked = True
+         client.fileno = -1
+         self.clients.append(client)
+
+   def tearDown(self):
+      self.server.close()
+
+   def wakeups(self):
+      try:
+         return len(os.read(self.server.wakeupread, 4096))
+      except OSError as e:
+         self.assertEqual(e.errno, errno.EAGAIN)
+         return 0
+
+   def test_broadcast_wakes_loop_once(self):
+      self.server.broadcast(u'one', self.clients)
+      self.server.broadcast(u'two', self.clients)
+      self.assertEqual(self.wakeups(), 1)
+
+   def test_loop_wakes_again_once_it_drained_the_pipe(self):
+      self.server.broadcast(u'one', self.clients)
+      self.server.serveonce()
+      # from another thread than the one that ran the loop
+      broadcaster = threading.Thread(target=self.server.broadcast, args=(u'two', self.clients))
+      broadcaster.start()
+      broadcaster.join()
+      self.assertEqual(self.wakeups(), 1)
+
+   def test_broadcast_on_loop_thread_does_not_wake_loop(self):
+      self.server.serveonce()
+      self.server.broadcast(u'one', self.clients)
+      self.server.callSoon(lambda: None)
+      self.assertEqual(self.wakeups(), 0)
+
+
+if __name__ == '__main__':
+   unittest.main()
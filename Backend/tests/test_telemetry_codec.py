@@ -0,0 +1,64 @@
+"""
+Tests for the binary LIVE_DRONE_DATA record of CommunicationScript.telemetry_codec.
+
+Usage (from the Backend directory):
+    py -2.7 -m unittest discover tests
+"""
+import os
+import sys
+import time
+import struct
+import datetime
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from CommunicationScript.telemetry_codec import encode_telemetry, decode_telemetry, TIMESTAMP_FORMAT, FIXED_SIZE
+
+
+def sample_telemetry(messages):
+    # Single precision fields hold values that a float represents exactly, so they survive the round trip unchanged
+    return {
+        "lat": -38.383944, "lng": 144.880181, "alt": 120.5,
+        "distTraveled": 1500.25, "DistToHome": 320.75, "airspeed": 18.5, "groundspeed": 17.25, "verticalspeed": -0.5,
+        "battery_voltage": 24.5, "battery_remaining": 87.0, "propulsion_battery": 23.75, "avionics_battery": 12.5,
+        "armed": True, "drone_connected": True, "weather_vaning": False,
+        "sonarrange": 2.5,
+        "messages": messages,
+        "lifeline_status": 3, "lifeline_distance": 4.5, "lifeline_velocity": 0.25,
+        "vision_geotag_gps": {"x": -38.4, "y": 144.9, "z": 10.5},
+        "vision_geotag_box": {"x": 1.5, "y": 2.5, "z": 3.5},
+    }
+
+
+class TelemetryCodecTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        timestamp = time.time()
+        data = sample_telemetry([{"time": u"10:15:00", "message": u"Armed"},
+                                 {"time": u"10:15:02", "message": u"Mode AUTO \u2013 waypoint 3"}])
+        decoded = decode_telemetry(encode_telemetry(data, timestamp))
+        self.assertEqual(decoded.pop("timestamp"),
+                         datetime.datetime.fromtimestamp(int(timestamp)).strftime(TIMESTAMP_FORMAT))
+        self.assertEqual(decoded, data)
+
+    def test_round_trip_without_messages(self):
+        data = sample_telemetry([])
+        payload = encode_telemetry(data, time.time())
+        self.assertEqual(len(payload), FIXED_SIZE)
+        self.assertEqual(decode_telemetry(payload)["messages"], [])
+
+    def test_flags(self):
+        for armed, connected, weather_vaning in [(False, False, False), (True, False, True), (False, True, False)]:
+            data = sample_telemetry([])
+            data.update(armed=armed, drone_connected=connected, weather_vaning=weather_vaning)
+            decoded = decode_telemetry(encode_telemetry(data, time.time()))
+            self.assertEqual((decoded["armed"], decoded["drone_connected"], decoded["weather_vaning"]),
+                             (armed, connected, weather_vaning))
+
+    def test_unknown_version_is_rejected(self):
+        payload = encode_telemetry(sample_telemetry([]), time.time())
+        self.assertRaises(ValueError, decode_telemetry, struct.pack("!B", 99) + payload[1:])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+"""
+A local stand-in for the vision relay (wss://relay.uas.unexceptional.dev/relay/images/outbound), for testing the vision
+feed without Vision running. Every connected client is sent a JPEG as a binary WebSocket message at the given rate.
+
+The frames are a JPEG file, or generated frames (see frame_sources.SyntheticSource) when no file is given.
+--close-every drops every connection after that many seconds and --refuse-for refuses connections for a while after
+that, to exercise the backend's reconnection backoff.
+
+Usage (from the Backend directory):
+    py -2.7 ./vision_relay_standin.py [--port 8090] [--fps 10] [--image frame.jpg] [--close-every 30] [--refuse-for 10]
+    py -2.7 ./DronelinkServer.py --vision-url ws://127.0.0.1:8090
+"""
+from __future__ import print_function, division
+import time
+import argparse
+from SimpleWebSocketServer import SimpleWebSocketServer, WebSocket
+
+
+class RelayClient(WebSocket):
+    def handleConnected(self):
+        print("[RELAY] " + str(self.address) + " connected")
+        self.connected_time = time.time()
+
+    def handleClose(self):
+        print("[RELAY] " + str(self.address) + " closed")
+
+
+class VisionRelayStandIn:
+    """Sends frames to the connected clients from the server's loop."""
+    def __init__(self, server, fps, next_frame, close_every=None, refuse_for=0):
+        """Constructor
+
+        Args:
+            server (SimpleWebSocketServer): The server the clients connect to.
+            fps (float): The frames sent per second.
+            next_frame (function): Returns the next JPEG to send.
+            close_every (float, optional): Seconds after which a connection is closed. Defaults to None (never).
+            refuse_for (float, optional): Seconds that connections are refused for after they are closed. Defaults to 0.
+        """
+        self.server = server
+        self.period = 1.0 / fps
+        self.next_frame = next_frame
+        self.close_every = close_every
+        self.refuse_for = refuse_for
+        self.refuse_until = 0
+        self.frames_sent = 0
+
+    def start(self):
+        self.next_send = time.time()
+        self.server.callSoon(self.send)
+
+    def send(self):
+        now = time.time()
+        clients = [client for client in list(self.server.connections.values()) if client.handshaked]
+        if now < self.refuse_until:
+            for client in clients:
+                client.close()
+            clients = []
+        elif self.close_every is not None:
+            for client in clients:
+                if now - client.connected_time >= self.close_every:
+                    print("[RELAY] Closing " + str(client.address) + ", refusing connections for " + str(self.refuse_for) + " s")
+                    client.close()
+                    self.refuse_until = now + self.refuse_for
+            clients = [client for client in clients if not client.closed]
+        if clients:
+            self.server.broadcast(bytearray(self.next_frame()), clients, stream="vision")
+            self.frames_sent += 1
+        self.next_send = max(self.next_send + self.period, now)
+        self.server.callLater(self.next_send - now, self.send)
+
+
+def synthetic_frames():
+    import cv2
+    from frame_sources import SyntheticSource
+    source = SyntheticSource()
+    return lambda: cv2.imencode('.jpg', source.read(), [int(cv2.IMWRITE_JPEG_QUALITY), 50])[1].tobytes()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stand-in for the vision relay.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--fps", type=float, default=10)
+    parser.add_argument("--image", help="A JPEG sent as every frame, generated frames are sent without one.")
+    parser.add_argument("--close-every", type=float, help="Close every connection after this many seconds.")
+    parser.add_argument("--refuse-for", type=float, default=0,
+                        help="Refuse connections for this many seconds after closing one.")
+    args = parser.parse_args()
+
+    if args.image:
+        with open(args.image, "rb") as image:
+            jpeg = image.read()
+        next_frame = lambda: jpeg
+    else:
+        next_frame = synthetic_frames()
+    server = SimpleWebSocketServer(args.host, args.port, RelayClient)
+    server.deflate = False
+    VisionRelayStandIn(server, args.fps, next_frame, args.close_every, args.refuse_for).start()
+    print("[RELAY] Sending frames at " + str(args.fps) + " fps on ws://" + args.host + ":" + str(args.port))
+    try:
+        server.serveforever()
+    except KeyboardInterrupt:
+        server.close()
@@ -31,6 +31,9 @@ export const store = reactive({
 export const fpv_cam = ref();
 export const fpv_cam_framerate = ref(0);
 export const vision_cam = ref();
+export const vision_health = ref(); // The last VISION_HEALTH message, the state of the vision relay
+// The rendition ("full", "half" or "thumb") of each video topic that is received, set by the component showing it
+export const video_renditions = reactive({ FPV_CAM: "full", VISION_CAM: "full" });
 export const menuClosed = ref(false);
 export const toggleSettingsMenu = () => (menuClosed.value = !menuClosed.value);
 export const MENU_WIDTH = 400;